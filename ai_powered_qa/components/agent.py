@@ -1,13 +1,19 @@
+import asyncio
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import json
-from typing import Any
+import time
+from typing import Any, Callable
 
 from dotenv import load_dotenv
-from openai import OpenAI
-from pydantic import BaseModel, Field
-import yaml
+from openai import AsyncOpenAI, OpenAI
+from pydantic import BaseModel, Field, PrivateAttr, TypeAdapter, computed_field
 from langsmith import wrappers, traceable
 
+from ai_powered_qa.components.completion_cache import with_completion_cache
 from ai_powered_qa.components.constants import MODEL_TOKEN_LIMITS
+from ai_powered_qa.components.history_window import HistoryTokenIndex
 from ai_powered_qa.components.interaction import Interaction
 from ai_powered_qa.components.plugin import Plugin
 from ai_powered_qa.config import TEMPERATURE_DEFAULT
@@ -19,58 +25,162 @@ load_dotenv()
 
 AVAILABLE_MODELS = ["gpt-3.5-turbo-1106", "gpt-4-1106-preview"]
 
+PLUGINS_ADAPTER = TypeAdapter(dict[str, Plugin])
+
 
 def get_openai_client():
-    return wrappers.wrap_openai(OpenAI())
+    return with_completion_cache(wrappers.wrap_openai(OpenAI()))
+
+
+def get_async_openai_client():
+    return with_completion_cache(wrappers.wrap_openai(AsyncOpenAI()), is_async=True)
 
 
 class Agent(BaseModel, validate_assignment=True, extra="ignore"):
-    # Agent identifiers
+    # Agent identifiers (version and hash are computed lazily, see below)
     agent_name: str
-    version: int = 0
-    hash: str = ""
 
     # OpenAI API
     client: Any = Field(default_factory=get_openai_client, exclude=True)
+    async_client: Any = Field(default_factory=get_async_openai_client, exclude=True)
     model: str = Field(default="gpt-3.5-turbo-1106")
 
     # Agent configuration
     system_message: str = Field(default="You are a helpful assistant.")
     plugins: dict[str, Plugin] = Field(default_factory=dict)
+    # Run independent tool calls of one interaction concurrently
+    concurrent_tool_calls: bool = Field(default=False)
+    # Keep the context message of each committed interaction in the history,
+    # needed by plugins sending only the changes since the previous one
+    persist_context_message: bool = Field(default=False)
 
     # Agent state
     history_name: str = Field(default_factory=generate_short_id, exclude=True)
     history: list = Field(default=[], exclude=True)
+    # Token counts of the history messages, one index per model
+    _token_indexes: dict[str, HistoryTokenIndex] = PrivateAttr(default_factory=dict)
+    # tool name -> (plugin, method) for all tools of all plugins
+    _tool_registry: dict[str, tuple[Plugin, Callable]] = PrivateAttr(
+        default_factory=dict
+    )
+    _tools: list[dict] = PrivateAttr(default_factory=list)
+    # The plugins and their configuration revisions `_tools` was built from
+    _tools_key: tuple = PrivateAttr(default=())
+    _version: int = PrivateAttr(default=0)
+    _hash: str = PrivateAttr(default="")
+    # Set when the configuration changes, the hash is recomputed on next read
+    _config_dirty: bool = PrivateAttr(default=False)
 
     def __init__(self, **data):
+        version = data.pop("version", 0)
+        data.pop("hash", None)
         super().__init__(**data)
-        self.hash = self._compute_hash()
+        self._build_tool_registry(self.plugins.values())
+        for p in self.plugins.values():
+            p.check_agent(self)
+        self._version = version
+        self._hash = self._compute_hash()
 
     def __setattr__(self, name, value):
-        """Override the default __setattr__ method to update the hash and version when the agent's configuration changes."""
-        super().__setattr__(name, value)
-        if name not in ["hash", "version"]:
-            self._maybe_increment_version()
+        """Override the default __setattr__ method to mark the agent's configuration as changed."""
+        if name == "plugins":
+            # Fails before the plugins are replaced if their tools collide
+            self._build_tool_registry(value.values())
+            try:
+                super().__setattr__(name, value)
+            finally:
+                self._build_tool_registry(self.plugins.values())
+        else:
+            super().__setattr__(name, value)
+        if name.startswith("_") or name in ["hash", "version"]:
+            return
+        if name == "history":
+            self._token_indexes = {}
+        if name in ["plugins", "persist_context_message"]:
+            for p in self.plugins.values():
+                p.check_agent(self)
+        if not self.model_fields[name].exclude:
+            self._config_dirty = True
+
+    @computed_field
+    @property
+    def version(self) -> int:
+        self._maybe_increment_version()
+        return self._version
+
+    @version.setter
+    def version(self, value: int):
+        self._version = value
+
+    @computed_field
+    @property
+    def hash(self) -> str:
+        self._maybe_increment_version()
+        return self._hash
+
+    def mark_config_dirty(self):
+        """
+        Makes the next read of `version` or `hash` check for configuration
+        changes. Needed only after changing a plugin's configuration in place.
+        """
+        self._config_dirty = True
 
     def _compute_hash(self):
-        return md5(self.model_dump_json(exclude=["hash", "version"]))
+        # Serialized by pydantic-core, with the plugins sorted by name, so the
+        # hash doesn't depend on the order in which they were added
+        config = self.model_dump_json(exclude={"hash", "version", "plugins"})
+        plugins = PLUGINS_ADAPTER.dump_json(dict(sorted(self.plugins.items())))
+        return md5(config + plugins.decode())
 
     def _maybe_increment_version(self):
+        if not self._config_dirty:
+            return
+        self._config_dirty = False
         new_hash = self._compute_hash()
-        if self.hash != new_hash:
-            self.version += 1
-            self.hash = new_hash
+        if self._hash != new_hash:
+            self._version += 1
+            self._hash = new_hash
 
     def add_plugin(self, plugin: Plugin):
+        plugin.check_agent(self)
+        other_plugins = [p for p in self.plugins.values() if p.name != plugin.name]
+        # Fails before the plugin is added if its tools collide with others
+        self._build_tool_registry(other_plugins + [plugin])
         self.plugins[plugin.name] = plugin
-        self._maybe_increment_version()
+        self._config_dirty = True
 
-    def get_tools_from_plugins(self) -> list[dict]:
+    def _build_tool_registry(self, plugins):
+        tool_registry = {}
         tools = []
         p: Plugin
-        for p in self.plugins.values():
+        for p in plugins:
+            for tool_name, method in p.callable_tools.items():
+                if tool_name in tool_registry:
+                    other_plugin = tool_registry[tool_name][0]
+                    raise ValueError(
+                        f"Tool {tool_name} of plugin {p.name} is already provided "
+                        f"by plugin {other_plugin.name}"
+                    )
+                tool_registry[tool_name] = (p, method)
             tools.extend(p.tools)
-        return tools
+        self._tool_registry = tool_registry
+        self._tools = tools
+        self._tools_key = self._get_tools_key(plugins)
+
+    @staticmethod
+    def _get_tools_key(plugins) -> tuple:
+        return tuple((id(p), p.config_revision) for p in plugins)
+
+    def get_tools_from_plugins(self) -> list[dict]:
+        """
+        Returns the tools of all plugins. The list is built when plugins are
+        added or their configuration changes, so it shouldn't be modified.
+        """
+        plugins = list(self.plugins.values())
+        if self._get_tools_key(plugins) != self._tools_key:
+            self._tools = [tool for p in plugins for tool in p.tools]
+            self._tools_key = self._get_tools_key(plugins)
+        return self._tools
 
     @traceable(run_type="chain", name="generate_interaction", tags=["Agent"])
     def generate_interaction(
@@ -80,10 +190,84 @@ class Agent(BaseModel, validate_assignment=True, extra="ignore"):
         tool_choice: str = "auto",
         max_response_tokens=1000,
     ) -> Interaction:
+        context_message = self._generate_context_message()
+        context_message = self._fit_context_message(
+            context_message, user_prompt, model, max_response_tokens
+        )
+        request_params = self._get_request_params(
+            user_prompt, model, tool_choice, max_response_tokens, context_message
+        )
+        completion = self.client.chat.completions.create(**request_params)
+
+        return Interaction(
+            request_params=request_params,
+            user_prompt=user_prompt,
+            context_message=context_message,
+            agent_response=completion.choices[0].message,
+        )
+
+    @traceable(run_type="chain", name="generate_interaction", tags=["Agent"])
+    async def agenerate_interaction(
+        self,
+        user_prompt: str = None,
+        model=None,
+        tool_choice: str = "auto",
+        max_response_tokens=1000,
+    ) -> Interaction:
+        """
+        Coroutine version of `generate_interaction`. Runs on the caller's event
+        loop, so many agents can generate interactions concurrently.
+        """
+        context_message = await self._agenerate_context_message()
+        context_message = self._fit_context_message(
+            context_message, user_prompt, model, max_response_tokens
+        )
+        request_params = self._get_request_params(
+            user_prompt, model, tool_choice, max_response_tokens, context_message
+        )
+        completion = await self.async_client.chat.completions.create(**request_params)
+
+        return Interaction(
+            request_params=request_params,
+            user_prompt=user_prompt,
+            context_message=context_message,
+            agent_response=completion.choices[0].message,
+        )
+
+    def _fit_context_message(
+        self,
+        context_message: str,
+        user_prompt: str | None,
+        model: str | None,
+        max_response_tokens: int,
+    ) -> str:
+        """
+        Lets the plugins replace their part of the context message if it
+        refers to history that won't fit in the completion request, e.g. a
+        diff of the page whose full snapshot is too old.
+        """
+        model = model or self.model
+        max_history_tokens = MODEL_TOKEN_LIMITS[model] - max_response_tokens
+        window_start = self._history_window_start(
+            user_prompt, model, max_history_tokens, context_message
+        )
+        history = self.history[window_start:]
+        for p in self.plugins.values():
+            context_message = p.fit_context_message(context_message, history)
+        return context_message
+
+    def _get_request_params(
+        self,
+        user_prompt: str | None,
+        model: str | None,
+        tool_choice: str,
+        max_response_tokens: int,
+        context_message: str,
+    ) -> dict:
         model = model or self.model
         max_history_tokens = MODEL_TOKEN_LIMITS[model] - max_response_tokens
         messages = self._get_messages_for_completion(
-            user_prompt, model, max_history_tokens
+            user_prompt, model, max_history_tokens, context_message
         )
         request_params = {
             "model": model,
@@ -99,17 +283,51 @@ class Agent(BaseModel, validate_assignment=True, extra="ignore"):
                 if tool_choice in ["auto", "none"]
                 else {"type": "function", "function": {"name": tool_choice}}
             )
-        completion = self.client.chat.completions.create(**request_params)
-
-        return Interaction(
-            request_params=request_params,
-            user_prompt=user_prompt,
-            agent_response=completion.choices[0].message,
-        )
+        return request_params
 
     @traceable(run_type="chain", name="commit_interaction", tags=["Agent"])
     def commit_interaction(self, interaction: Interaction) -> Interaction:
+        self._add_interaction_to_history(interaction)
+
+        tool_calls = interaction.agent_response.tool_calls
+        if tool_calls:
+            if self.concurrent_tool_calls and len(tool_calls) > 1:
+                results = self._call_tools_concurrently(tool_calls)
+            else:
+                results = [self._call_tool(tool_call) for tool_call in tool_calls]
+            self._add_tool_responses_to_history(interaction, results)
+
+        self._update_token_indexes()
+        for p in self.plugins.values():
+            p.on_commit(interaction)
+        return interaction
+
+    @traceable(run_type="chain", name="commit_interaction", tags=["Agent"])
+    async def acommit_interaction(self, interaction: Interaction) -> Interaction:
+        """Coroutine version of `commit_interaction`."""
+        self._add_interaction_to_history(interaction)
+
+        tool_calls = interaction.agent_response.tool_calls
+        if tool_calls:
+            if self.concurrent_tool_calls and len(tool_calls) > 1:
+                results = await self._acall_tools_concurrently(tool_calls)
+            else:
+                results = [
+                    await self._acall_tool(tool_call) for tool_call in tool_calls
+                ]
+            self._add_tool_responses_to_history(interaction, results)
+
+        self._update_token_indexes()
+        for p in self.plugins.values():
+            p.on_commit(interaction)
+        return interaction
+
+    def _add_interaction_to_history(self, interaction: Interaction):
         interaction.committed = True
+        if self.persist_context_message and interaction.context_message:
+            self.history.append(
+                {"role": "user", "content": interaction.context_message}
+            )
         user_prompt = interaction.user_prompt
         if user_prompt:
             self.history.append({"role": "user", "content": user_prompt})
@@ -118,32 +336,94 @@ class Agent(BaseModel, validate_assignment=True, extra="ignore"):
 
         self.history.append(agent_response.model_dump(exclude_unset=True))
 
-        if agent_response.tool_calls:
-            tool_responses = []
-            for tool_call in agent_response.tool_calls:
-                p: Plugin
-                for p in self.plugins.values():
-                    # iterate all plugins until the plugin with correct tool is found
-                    result = p.call_tool(
-                        tool_call.function.name,
-                        **json.loads(tool_call.function.arguments),
-                    )
-                    if result is not None:
-                        break
-                else:
-                    raise Exception(
-                        f"Tool {tool_call.function.name} not found in any plugin!"
-                    )
-                tool_responses.append(
-                    {
-                        "role": "tool",
-                        "content": str(result),
-                        "tool_call_id": tool_call.id,
-                    }
-                )
-            interaction.tool_responses = tool_responses
-            self.history.extend(tool_responses)
-        return interaction
+    def _add_tool_responses_to_history(self, interaction: Interaction, results: list):
+        tool_responses = [
+            {
+                "role": "tool",
+                "content": str(result),
+                "tool_call_id": tool_call.id,
+            }
+            for tool_call, result in zip(interaction.agent_response.tool_calls, results)
+        ]
+        interaction.tool_responses = tool_responses
+        self.history.extend(tool_responses)
+
+    def _update_token_indexes(self):
+        # Count the tokens of the new messages right away for all models that
+        # have been used so far
+        for token_index in self._token_indexes.values():
+            token_index.update(self.history)
+
+    def _group_tool_calls(self, tool_calls) -> list[list[int]]:
+        """
+        Splits tool calls into lanes that can run concurrently. Calls of serial
+        tools share one lane per plugin and keep their original order, every
+        other call gets a lane of its own.
+        """
+        lanes = []
+        serial_lanes = {}
+        for index, tool_call in enumerate(tool_calls):
+            tool_name = tool_call.function.name
+            plugin, _ = self._tool_registry.get(tool_name, (None, None))
+            if plugin is not None and plugin.is_serial_tool(tool_name):
+                if plugin.name not in serial_lanes:
+                    serial_lanes[plugin.name] = []
+                    lanes.append(serial_lanes[plugin.name])
+                serial_lanes[plugin.name].append(index)
+            else:
+                lanes.append([index])
+        return lanes
+
+    def _call_tools_concurrently(self, tool_calls) -> list:
+        results = [None] * len(tool_calls)
+
+        def run_lane(lane):
+            for index in lane:
+                results[index] = self._call_tool(tool_calls[index])
+
+        lanes = self._group_tool_calls(tool_calls)
+        with ThreadPoolExecutor(max_workers=len(lanes)) as executor:
+            # Copy the context, so the tool calls are traced as our children
+            futures = [
+                executor.submit(contextvars.copy_context().run, run_lane, lane)
+                for lane in lanes
+            ]
+            for future in futures:
+                future.result()
+        return results
+
+    async def _acall_tools_concurrently(self, tool_calls) -> list:
+        results = [None] * len(tool_calls)
+
+        async def run_lane(lane):
+            for index in lane:
+                results[index] = await self._acall_tool(tool_calls[index])
+
+        lanes = self._group_tool_calls(tool_calls)
+        await asyncio.gather(*(run_lane(lane) for lane in lanes))
+        return results
+
+    def _call_tool(self, tool_call):
+        tool_name = tool_call.function.name
+        if tool_name not in self._tool_registry:
+            raise Exception(f"Tool {tool_name} not found in any plugin!")
+        plugin, _ = self._tool_registry[tool_name]
+        # Through the plugin, so it knows its tools ran
+        return plugin.call_tool(tool_name, **json.loads(tool_call.function.arguments))
+
+    async def _acall_tool(self, tool_call):
+        tool_name = tool_call.function.name
+        if tool_name not in self._tool_registry:
+            raise Exception(f"Tool {tool_name} not found in any plugin!")
+        plugin, _ = self._tool_registry[tool_name]
+        return await plugin.acall_tool(
+            tool_name, **json.loads(tool_call.function.arguments)
+        )
+
+    def warm_up(self):
+        """Starts the background initialization of all plugins."""
+        for p in self.plugins.values():
+            p.warm_up()
 
     def reset_history(self, history: list = [], history_name: str = None):
         self.history = history
@@ -153,36 +433,20 @@ class Agent(BaseModel, validate_assignment=True, extra="ignore"):
             p.reset_history(self.history)
 
     def _get_messages_for_completion(
-        self, user_prompt: str | None, model: str, max_tokens: int
+        self,
+        user_prompt: str | None,
+        model: str,
+        max_tokens: int,
+        context_message: str | None = None,
     ) -> list[dict]:
         messages = [{"role": "system", "content": self.system_message}]
-        context_message = self._generate_context_message()
-
-        total_tokens = count_tokens(self.system_message, model)
-        total_tokens += count_tokens(context_message, model)
-        if user_prompt:
-            total_tokens += count_tokens(user_prompt, model)
+        if context_message is None:
+            context_message = self._generate_context_message()
 
-        messages_to_add = []
-        i = 0
-
-        while i < len(self.history):
-            history_item = self.history[-i - 1]
-            messages_to_add.insert(0, history_item)
-            content_length = count_tokens(yaml.dump(history_item), model)
-
-            while history_item["role"] == "tool":
-                i += 1
-                history_item = self.history[-i - 1]
-                messages_to_add.insert(0, history_item)
-                content_length += count_tokens(yaml.dump(history_item), model)
-
-            if content_length + total_tokens > max_tokens:
-                break
-            total_tokens += content_length
-            messages[1:1] = messages_to_add
-            messages_to_add = []
-            i += 1
+        window_start = self._history_window_start(
+            user_prompt, model, max_tokens, context_message
+        )
+        messages.extend(self.history[window_start:])
 
         messages.append({"role": "user", "content": context_message})
         if user_prompt:
@@ -190,6 +454,85 @@ class Agent(BaseModel, validate_assignment=True, extra="ignore"):
 
         return messages
 
+    def _history_window_start(
+        self,
+        user_prompt: str | None,
+        model: str,
+        max_tokens: int,
+        context_message: str,
+    ) -> int:
+        """
+        Returns the index of the oldest history message sent along with the
+        system message, the context message and the user prompt.
+        """
+        total_tokens = count_tokens(self.system_message, model)
+        total_tokens += count_tokens(context_message, model)
+        if user_prompt:
+            total_tokens += count_tokens(user_prompt, model)
+        token_index = self._get_token_index(model)
+        return token_index.window_start(max_tokens - total_tokens)
+
+    def _get_token_index(self, model: str) -> HistoryTokenIndex:
+        if model not in self._token_indexes:
+            self._token_indexes[model] = HistoryTokenIndex(model)
+        token_index = self._token_indexes[model]
+        token_index.update(self.history)
+        return token_index
+
     def _generate_context_message(self):
-        contexts = [p.context_message for p in self.plugins.values()]
+        plugins = list(self.plugins.values())
+        if len(plugins) > 1 or any(p.context_timeout is not None for p in plugins):
+            contexts = self._gather_context_messages(plugins)
+        else:
+            contexts = [p.memoized_context_message() for p in plugins]
+        return "=== CONTEXT MESSAGE ===\n\n".join(contexts)
+
+    def _gather_context_messages(self, plugins: list[Plugin]) -> list[str]:
+        """
+        Reads the context messages of the plugins concurrently, each in a
+        thread of its own, so the slowest plugin sets the latency. A plugin
+        that isn't done within its `context_timeout` gets its fallback context
+        message.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(plugins))
+        start = time.monotonic()
+        # Copy the context, so the plugins are traced as our children
+        futures = [
+            executor.submit(contextvars.copy_context().run, p.memoized_context_message)
+            for p in plugins
+        ]
+        contexts = []
+        try:
+            for p, future in zip(plugins, futures):
+                timeout = None
+                if p.context_timeout is not None:
+                    timeout = max(p.context_timeout - (time.monotonic() - start), 0)
+                try:
+                    contexts.append(future.result(timeout=timeout))
+                except concurrent.futures.TimeoutError:
+                    contexts.append(self._context_timed_out(p))
+        finally:
+            # Doesn't wait for the plugins that timed out
+            executor.shutdown(wait=False)
+        return contexts
+
+    async def _agenerate_context_message(self):
+        contexts = await asyncio.gather(
+            *(self._acontext_message(p) for p in self.plugins.values())
+        )
         return "=== CONTEXT MESSAGE ===\n\n".join(contexts)
+
+    async def _acontext_message(self, plugin: Plugin) -> str:
+        try:
+            return await asyncio.wait_for(
+                plugin.amemoized_context_message(), plugin.context_timeout
+            )
+        except asyncio.TimeoutError:
+            return self._context_timed_out(plugin)
+
+    def _context_timed_out(self, plugin: Plugin) -> str:
+        logging.warning(
+            f"Context message of plugin {plugin.name} timed out after "
+            f"{plugin.context_timeout}s"
+        )
+        return plugin.fallback_context_message()
@@ -0,0 +1,122 @@
+from functools import lru_cache
+import hashlib
+import json
+import os
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel
+
+from .lru_store import SqliteLruStore
+
+# Look up cached completions, call the API and store the completion on a miss
+MODE_RECORD = "record"
+# Only look up cached completions, a miss raises CompletionCacheMiss
+MODE_REPLAY = "replay"
+# Always call the API, don't touch the cache
+MODE_PASSTHROUGH = "passthrough"
+MODES = [MODE_RECORD, MODE_REPLAY, MODE_PASSTHROUGH]
+
+# Request params that don't influence the completion
+IGNORED_PARAMS = ["langsmith_extra"]
+
+
+class CompletionCacheMiss(Exception):
+    pass
+
+
+def _jsonable(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(exclude_unset=True)
+    raise TypeError(f"Cannot serialize {type(value)} in request params")
+
+
+def request_key(request_params: dict) -> str:
+    """Canonical hash of the params of a chat completion request."""
+    params = {k: v for k, v in request_params.items() if k not in IGNORED_PARAMS}
+    serialized = json.dumps(
+        params, sort_keys=True, separators=(",", ":"), default=_jsonable
+    )
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+class CachedCompletions:
+    """Drop-in replacement for `client.chat.completions` using the cache."""
+
+    def __init__(self, completions, store: SqliteLruStore, mode: str):
+        self._completions = completions
+        self._store = store
+        self._mode = mode
+
+    def create(self, **request_params):
+        key = request_key(request_params)
+        cached = self._store.get(key)
+        if cached is not None:
+            return ChatCompletion.model_validate_json(cached)
+        if self._mode == MODE_REPLAY:
+            raise CompletionCacheMiss(f"No cached completion for request {key}")
+
+        completion = self._completions.create(**request_params)
+        self._store.put(key, completion.model_dump_json())
+        return completion
+
+
+class AsyncCachedCompletions(CachedCompletions):
+    """Drop-in replacement for `async_client.chat.completions`."""
+
+    async def create(self, **request_params):
+        key = request_key(request_params)
+        cached = self._store.get(key)
+        if cached is not None:
+            return ChatCompletion.model_validate_json(cached)
+        if self._mode == MODE_REPLAY:
+            raise CompletionCacheMiss(f"No cached completion for request {key}")
+
+        completion = await self._completions.create(**request_params)
+        self._store.put(key, completion.model_dump_json())
+        return completion
+
+
+class CachedClient:
+    """
+    Wraps an OpenAI client (sync or async), so that chat completions go
+    through the cache. Everything else is delegated to the wrapped client.
+    """
+
+    def __init__(self, client, store: SqliteLruStore, mode: str, is_async=False):
+        completions_class = AsyncCachedCompletions if is_async else CachedCompletions
+        self._client = client
+        self.chat = SimpleNamespace(
+            completions=completions_class(client.chat.completions, store, mode)
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+@lru_cache(maxsize=None)
+def get_completion_store(path: str, max_size_bytes: int) -> SqliteLruStore:
+    return SqliteLruStore(path, max_size_bytes)
+
+
+def with_completion_cache(client, is_async: bool = False):
+    """
+    Wraps the client with the completion cache configured by environment
+    variables:
+
+    - COMPLETION_CACHE_MODE: one of "record", "replay" or "passthrough"
+      (default)
+    - COMPLETION_CACHE_PATH: the SQLite file the completions are stored in
+    - COMPLETION_CACHE_MAX_BYTES: the size at which old completions get evicted
+    """
+    mode = os.getenv("COMPLETION_CACHE_MODE", MODE_PASSTHROUGH)
+    if mode not in MODES:
+        raise ValueError(f"Invalid completion cache mode: {mode}")
+    if mode == MODE_PASSTHROUGH:
+        return client
+
+    store = get_completion_store(
+        os.getenv("COMPLETION_CACHE_PATH", "cache/completions.sqlite3"),
+        int(os.getenv("COMPLETION_CACHE_MAX_BYTES", 512 * 2**20)),
+    )
+    return CachedClient(client, store, mode, is_async=is_async)
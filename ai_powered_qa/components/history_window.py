@@ -0,0 +1,59 @@
+from bisect import bisect_left
+
+import yaml
+
+from .utils import count_tokens
+
+
+class HistoryTokenIndex:
+    """
+    Caches the token count of every history message for a single model and
+    keeps prefix sums over them, so the part of the history that fits into the
+    context window can be found with a binary search instead of re-counting
+    the whole history on every completion.
+
+    Messages are grouped the same way the agent always grouped them: a tool
+    response is never separated from the message that precedes it.
+    """
+
+    def __init__(self, model: str):
+        self._model = model
+        # _prefix_sums[i] is the number of tokens in the first i messages
+        self._prefix_sums = [0]
+        # Indices of the messages a history window is allowed to start at
+        self._group_starts = []
+
+    def __len__(self):
+        return len(self._prefix_sums) - 1
+
+    def update(self, history: list):
+        """
+        Counts the tokens of messages appended to the history since the last
+        update. Messages that were already counted are never counted again.
+        """
+        if len(history) < len(self):
+            # The history was truncated, start over
+            self._prefix_sums = [0]
+            self._group_starts = []
+
+        for index in range(len(self), len(history)):
+            message = history[index]
+            message_tokens = count_tokens(yaml.dump(message), self._model)
+            self._prefix_sums.append(self._prefix_sums[-1] + message_tokens)
+            if message["role"] != "tool":
+                self._group_starts.append(index)
+
+    def window_start(self, max_tokens: int) -> int:
+        """
+        Returns the index of the oldest message of the longest history suffix
+        that fits into `max_tokens` and doesn't split a tool call group.
+        Returns the length of the history if not even the last group fits.
+        """
+        total_tokens = self._prefix_sums[-1]
+        # The suffix starting at index i has total_tokens - _prefix_sums[i]
+        # tokens, so it fits if _prefix_sums[i] >= total_tokens - max_tokens
+        first_fitting = bisect_left(self._prefix_sums, total_tokens - max_tokens)
+        group = bisect_left(self._group_starts, first_fitting)
+        if group == len(self._group_starts):
+            return len(self)
+        return self._group_starts[group]
@@ -9,5 +9,8 @@ class Interaction(BaseModel):
     committed: bool = False
     request_params: dict
     user_prompt: str | None
+    # The context message of the request, kept in the history on commit if
+    # the agent persists context messages
+    context_message: str | None = None
     agent_response: ChatCompletionMessage
     tool_responses: list[dict] | None = None
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SqliteLruStore:
+    """
+    A string key-value store in a local SQLite file. When the total size of
+    the stored values exceeds `max_size_bytes`, the least recently used
+    entries are evicted. Safe to share between threads.
+    """
+
+    def __init__(self, path: str, max_size_bytes: int = 512 * 2**20):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._max_size_bytes = max_size_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used INTEGER NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)"
+            )
+
+    def get(self, key: str) -> str | None:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE entries SET last_used = ? WHERE key = ?", (time.time_ns(), key)
+            )
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode())
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time_ns()),
+            )
+            self._evict()
+
+    def size(self) -> int:
+        """Total size of the stored values in bytes."""
+        with self._lock:
+            return self._total_size()
+
+    def __len__(self):
+        with self._lock:
+            row = self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()
+            return row[0]
+
+    def close(self):
+        self._connection.close()
+
+    def _total_size(self) -> int:
+        return self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+
+    def _evict(self):
+        excess = self._total_size() - self._max_size_bytes
+        if excess <= 0:
+            return
+        keys_to_delete = []
+        rows = self._connection.execute(
+            "SELECT key, size FROM entries ORDER BY last_used ASC"
+        )
+        for key, size in rows:
+            if excess <= 0:
+                break
+            keys_to_delete.append((key,))
+            excess -= size
+        self._connection.executemany(
+            "DELETE FROM entries WHERE key = ?", keys_to_delete
+        )
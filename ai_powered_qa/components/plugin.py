@@ -1,6 +1,8 @@
+import asyncio
 import inspect
 import json
 import random
+import time
 from abc import ABC
 from typing import Any
 
@@ -15,10 +17,21 @@ TYPE_MAP = {
 }
 
 
-def tool(method):
-    """Decorator to mark a method as a tool."""
-    method.__tool__ = True
-    return method
+def tool(method=None, *, serial: bool = False):
+    """
+    Decorator to mark a method as a tool. Tools marked as `serial` never run
+    concurrently with other serial tools of the same plugin, e.g. because
+    they share a browser page.
+    """
+
+    def decorator(method):
+        method.__tool__ = True
+        method.__tool_serial__ = serial
+        return method
+
+    if method is None:
+        return decorator
+    return decorator(method)
 
 
 def predicate_for_tools(attr):
@@ -27,15 +40,39 @@ def predicate_for_tools(attr):
 
 class Plugin(BaseModel, ABC):
     name: str
+    # Seconds the agent waits for the context message before using
+    # `fallback_context_message` instead, None to wait as long as it takes
+    context_timeout: float | None = None
+    # Seconds the context message is reused for, as long as none of the
+    # plugin's tools runs and `context_state` doesn't change, None to compute
+    # it every time
+    context_ttl: float | None = None
 
     _tools: list = PrivateAttr(default_factory=list)
     # dict of "tool_name" : method that agent can call
     _callable_tools: dict[str, Any] = PrivateAttr(default_factory=dict)
+    # names of tools that must not run concurrently with each other
+    _serial_tools: set[str] = PrivateAttr(default_factory=set)
+    # Incremented whenever a field changes, what `tools` returns may depend on
+    # the configuration
+    _config_revision: int = PrivateAttr(default=0)
+    # (time it was computed, context state, context message)
+    _context_memo: tuple[float, Any, str] | None = PrivateAttr(default=None)
 
     def __init__(self, **data):
         super().__init__(**data)
         self._register_tools()
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            self._config_revision += 1
+
+    @property
+    def config_revision(self) -> int:
+        """Changes whenever the configuration of the plugin changes."""
+        return self._config_revision
+
     @property
     def context_message(self) -> str:
         return ""
@@ -44,6 +81,108 @@ class Plugin(BaseModel, ABC):
     def system_message(self) -> str:
         return ""
 
+    async def acontext_message(self) -> str:
+        """
+        Coroutine version of the `context_message` property. By default the
+        property is evaluated in a worker thread, plugins doing I/O can override
+        this with a native coroutine.
+        """
+        return await asyncio.to_thread(lambda: self.context_message)
+
+    def fallback_context_message(self) -> str:
+        """The context message used when the plugin's one isn't ready in time."""
+        return (
+            f"The context of the {self.name} plugin is not available, it took "
+            f"longer than {self.context_timeout}s."
+        )
+
+    def context_state(self):
+        """
+        Returns a value that changes whenever the context message may have
+        changed other than through the plugin's tools, e.g. the page in a
+        browser navigated. Memoized context messages are reused only while it
+        stays the same. Returns None by default.
+        """
+        return None
+
+    async def acontext_state(self):
+        """Coroutine version of `context_state`."""
+        return self.context_state()
+
+    def memoized_context_message(self) -> str:
+        """
+        Returns the context message, reusing the last one if it's younger
+        than `context_ttl` and nothing has changed since.
+        """
+        if self.context_ttl is None:
+            return self.context_message
+        state = self.context_state()
+        if not self._is_context_memo_valid(state):
+            self._context_memo = self._compute_context_memo(state)
+        return self._context_memo[2]
+
+    async def amemoized_context_message(self) -> str:
+        """Coroutine version of `memoized_context_message`."""
+        if self.context_ttl is None:
+            return await self.acontext_message()
+        state = await self.acontext_state()
+        if not self._is_context_memo_valid(state):
+            self._context_memo = await self._acompute_context_memo(state)
+        return self._context_memo[2]
+
+    def _compute_context_memo(self, state) -> tuple[float, Any, str]:
+        """
+        Computes the context message to memoize, `state` being the current
+        context state. Plugins that prepared the context message in advance
+        return it with the state and the time it was captured at instead.
+        """
+        started = time.monotonic()
+        return (started, state, self.context_message)
+
+    async def _acompute_context_memo(self, state) -> tuple[float, Any, str]:
+        """Coroutine version of `_compute_context_memo`."""
+        started = time.monotonic()
+        return (started, state, await self.acontext_message())
+
+    def _is_context_memo_valid(self, state) -> bool:
+        if self._context_memo is None:
+            return False
+        started, memo_state, _ = self._context_memo
+        return time.monotonic() - started < self.context_ttl and memo_state == state
+
+    def invalidate_context_message(self):
+        """Makes the next memoized context message be computed anew."""
+        self._context_memo = None
+
+    def check_agent(self, agent):
+        """
+        Raises ValueError if the plugin can't work with the configuration of
+        the agent. Called when the plugin is added to an agent and when the
+        agent's plugins or `persist_context_message` change.
+        """
+
+    def fit_context_message(self, context_message: str, history: list[dict]) -> str:
+        """
+        Called with the context message about to be sent (of all plugins of
+        the agent) and the history messages sent along with it. Returns the
+        context message, with the plugin's part replaced if it refers to
+        messages that aren't in the history. Returns it unchanged by default.
+        """
+        return context_message
+
+    def warm_up(self):
+        """
+        Starts slow initialization (e.g. launching a browser) in the
+        background, so it's done by the time the plugin is first used. Does
+        nothing by default.
+        """
+
+    def on_commit(self, interaction):
+        """
+        Called when an interaction generated with this plugin's context message
+        is committed to the agent's history. Does nothing by default.
+        """
+
     @property
     def tools(self):
         return self._tools
@@ -60,14 +199,35 @@ class Plugin(BaseModel, ABC):
                     tool["function"]["description"] = description
                 break
 
+    @property
+    def callable_tools(self) -> dict[str, Any]:
+        return dict(self._callable_tools)
+
+    def has_tool(self, tool_name: str) -> bool:
+        return tool_name in self._callable_tools
+
+    def is_serial_tool(self, tool_name: str) -> bool:
+        return tool_name in self._serial_tools
+
     def call_tool(self, tool_name: str, **kwargs):
         if tool_name not in self._callable_tools:
             return None
+        self.invalidate_context_message()
         return self._callable_tools[tool_name](**kwargs)
 
+    async def acall_tool(self, tool_name: str, **kwargs):
+        """
+        Coroutine version of `call_tool`. By default the tool runs in a worker
+        thread, so it doesn't block the event loop.
+        """
+        if tool_name not in self._callable_tools:
+            return None
+        self.invalidate_context_message()
+        return await asyncio.to_thread(self._callable_tools[tool_name], **kwargs)
+
     def _register_tools(self):
         # Deny-list of member names to skip
-        deny_list = ["context_message", "system_message", "tools"]
+        deny_list = ["context_message", "system_message", "tools", "callable_tools"]
 
         # Iterate through all member names
         for member_name in dir(self):
@@ -99,8 +259,11 @@ class Plugin(BaseModel, ABC):
                             },
                         },
                     }
+                tool_name = tool_description["function"]["name"]
                 self._tools.append(tool_description)
-                self._callable_tools[tool_description["function"]["name"]] = member
+                self._callable_tools[tool_name] = member
+                if member.__tool_serial__:
+                    self._serial_tools.add(tool_name)
 
     def _build_param_object(self, params):
         param_object = {}
@@ -124,6 +287,8 @@ class Plugin(BaseModel, ABC):
             if not "tool_calls" in message:
                 continue
             for tool_call in message["tool_calls"]:
+                if not self.has_tool(tool_call["function"]["name"]):
+                    continue
                 self.call_tool(
                     tool_call["function"]["name"],
                     **json.loads(tool_call["function"]["arguments"]),
@@ -1,3 +1,4 @@
+from functools import lru_cache
 import hashlib
 import random
 import string
@@ -14,11 +15,17 @@ def md5(input_string: str) -> str:
     return hashlib.md5(input_string.encode()).hexdigest()
 
 
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """Looks up the tiktoken encoding for a model only once per process."""
+    return tiktoken.encoding_for_model(model)
+
+
 def count_tokens(text: str, model: str) -> int:
     """
     We use this mainly when pruning history to ensure that we don't go over the
     token limit
     """
-    enc = tiktoken.encoding_for_model(model)
+    enc = get_encoding(model)
     text_encoded = enc.encode(text)
     return len(text_encoded)
@@ -1,3 +1,10 @@
 MODEL_DEFAULT = "gpt-3.5-turbo-0125"
 TEMPERATURE_DEFAULT = 0.2
 PLAYWRIGHT_TIMEOUT = 5_000
+HTML_PARSER = "html.parser"
+BROWSER_POOL_MAX_BROWSERS = 4
+BROWSER_POOL_WARM_BROWSERS = 1
+BROWSER_POOL_MAX_CONTEXTS = 8
+BROWSER_POOL_MAX_SESSIONS = 50
+BROWSER_POOL_IDLE_TIMEOUT = 300
+CONTEXT_MESSAGE_TTL = 60
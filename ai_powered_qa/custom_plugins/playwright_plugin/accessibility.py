@@ -0,0 +1,103 @@
+"""
+Prints the accessibility tree of a page (`page.accessibility.snapshot()`)
+compactly, one node per line indented by its depth: the role, the name, the
+value and the states of the node.
+
+    document "Sign up"
+     heading "Sign up" level=1
+     textbox "Email" value="a@b.cz" focused
+     combobox "Country" value="Czechia" haspopup="menu"
+     checkbox "I agree" checked=false
+     button "Send" disabled
+
+The tree is computed by the browser, so it's the same for the same page,
+unlike an LLM description of the HTML.
+"""
+
+import json
+
+# Printed as the name when true, as name=false when false
+TRISTATE_PROPERTIES = ("checked", "pressed", "expanded", "selected")
+
+# Printed as the name when true
+BOOLEAN_PROPERTIES = (
+    "focused",
+    "disabled",
+    "readonly",
+    "required",
+    "invalid",
+    "modal",
+    "multiline",
+    "multiselectable",
+)
+
+# Printed as name=value
+VALUE_PROPERTIES = (
+    "value",
+    "valuetext",
+    "level",
+    "valuemin",
+    "valuemax",
+    "haspopup",
+    "autocomplete",
+    "orientation",
+    "keyshortcuts",
+    "description",
+)
+
+ROOT_ROLES = frozenset(["WebArea", "RootWebArea"])
+
+# Nodes with these roles and no name only group their children, the
+# children are printed in their place
+GENERIC_ROLES = frozenset(["generic", "none", "presentation", "group"])
+
+TEXT_ROLES = frozenset(["text", "StaticText"])
+
+
+def _format_node(node: dict) -> str | None:
+    role = node.get("role", "")
+    name = node.get("name", "")
+    if role in TEXT_ROLES:
+        return json.dumps(name) if name else None
+    if role in GENERIC_ROLES and not name:
+        return None
+    line = "document" if role in ROOT_ROLES else role
+    if name:
+        line += " " + json.dumps(name)
+    for key in VALUE_PROPERTIES:
+        value = node.get(key)
+        if value not in (None, ""):
+            line += f" {key}={json.dumps(value)}"
+    for key in TRISTATE_PROPERTIES:
+        value = node.get(key)
+        if value is True:
+            line += f" {key}"
+        elif value is False:
+            line += f" {key}=false"
+        elif value is not None:
+            line += f" {key}={value}"
+    for key in BOOLEAN_PROPERTIES:
+        if node.get(key):
+            line += f" {key}"
+    return line
+
+
+def format_accessibility_tree(snapshot: dict | None) -> str:
+    """Returns the accessibility tree, one node per line."""
+    if not snapshot:
+        return "The page has no accessible content."
+    lines = []
+    stack = [(iter([snapshot]), 0)]
+    while stack:
+        node = next(stack[-1][0], None)
+        depth = stack[-1][1]
+        if node is None:
+            stack.pop()
+            continue
+        line = _format_node(node)
+        if line is not None:
+            lines.append(" " * depth + line)
+        children = node.get("children")
+        if children:
+            stack.append((iter(children), depth if line is None else depth + 1))
+    return "\n".join(lines)
@@ -1,20 +1,35 @@
 import asyncio
 import base64
-from inspect import cleandoc
+from collections import OrderedDict
+import concurrent.futures
+from inspect import cleandoc, iscoroutinefunction
 import json
-from typing import Any
+import logging
+import time
+from typing import Any, ClassVar, Literal
 
 from anthropic import Anthropic
-from bs4 import BeautifulSoup
 from openai import OpenAI
 import playwright.async_api
-from pydantic import Field
+from playwright.async_api import Error
+from pydantic import Field, model_validator
 from langsmith import wrappers, traceable
 
 from ai_powered_qa import config
+from ai_powered_qa.components.completion_cache import with_completion_cache
 from ai_powered_qa.components.plugin import Plugin, tool
 
-from . import clean_html
+from .clean_html import ALLOWED_ATTRIBUTES
+from .html_cleaner import clean_html
+from .browser_pool import get_browser_pool
+from .browser_profile import BrowserProfile
+from .description_cache import DescriptionCache, get_description_cache
+from .accessibility import format_accessibility_tree
+from .dom_diff import diff_html
+from .html_folding import fold_html
+from .pipeline import Stage, run_pipeline
+from .runtime import PlaywrightRuntime, get_runtime
+from .settle import PageSettler, SettleOptions, evaluate, settle_after
 
 
 class PageNotLoadedException(Exception):
@@ -75,6 +90,63 @@ CONTEXT_TEMPLATE = cleandoc(
     ```
     """
 )
+DIFF_CONTEXT_TEMPLATE = cleandoc(
+    """
+    Here are the changes of the HTML of the current page since the last HTML
+    you were given, one per line: `+` for added elements (with the path of
+    their parent), `-` for removed ones and `~` for changed text and
+    attributes:
+
+    ```text
+    {diff}
+    ```
+
+    And here is a description of the page:
+    ```text
+    {description}
+    ```
+    """
+)
+
+ELEMENT_IDS_SYSTEM_MESSAGE = cleandoc(
+    """
+    Interactive elements in the HTML content have a `data-playwright-id`
+    attribute. To act on them, use the tools ending with `_by_id` with that ID
+    instead of writing a selector.
+    """
+)
+
+ACCESSIBILITY_CONTEXT_TEMPLATE = cleandoc(
+    """
+    Here is the accessibility tree of the current page, one node per line
+    with its role, name, value and states:
+
+    ```text
+    {tree}
+    ```
+    """
+)
+
+# Context messages generated in diff mode waiting to be committed
+MAX_PENDING_SNAPSHOTS = 8
+
+# The stage of the observation pipeline of each describer, in the order the
+# descriptions are joined
+DESCRIBER_STAGES = {
+    "html": "description",
+    "anthropic": "anthropic_description",
+    "screenshot": "screenshot_description",
+}
+
+FOLDING_SYSTEM_MESSAGE = cleandoc(
+    """
+    Long runs of repeated elements in the HTML content are folded: the first
+    few are shown and the rest is summarized in a line like "... 47 more <li>
+    like the above (fold 2)". Use the `expand_folded_elements` tool to see the
+    folded elements.
+    """
+)
+
 
 GENERATE_SELECTOR_SCRIPT = cleandoc(
     """
@@ -117,8 +189,106 @@ GENERATE_SELECTOR_SCRIPT = cleandoc(
 )
 
 
+def build_observe_script(prepare: str = "") -> str:
+    """
+    A script returning the HTML of the page (the same `page.content()`
+    returns) and the viewport size in a single round-trip. The `prepare`
+    statements run first, e.g. to update data attributes.
+    """
+    return cleandoc(
+        f"""
+        () => {{
+            {prepare}
+            let html = '';
+            if (document.doctype) {{
+                html = new XMLSerializer().serializeToString(document.doctype);
+            }}
+            if (document.documentElement) {{
+                html += document.documentElement.outerHTML;
+            }}
+            const viewport = {{ width: window.innerWidth, height: window.innerHeight }};
+            return {{ html, viewport }};
+        }}
+        """
+    )
+
+
+VIEWPORT_SCRIPT = "() => ({ width: window.innerWidth, height: window.innerHeight })"
+
+ELEMENT_ID_ATTRIBUTE = "data-playwright-id"
+
+# Tags the interactive elements with short IDs, keeping the IDs of elements
+# tagged in earlier observations of the page. Returns the tag name of each
+# element by ID.
+ASSIGN_ELEMENT_IDS_SCRIPT = cleandoc(
+    """
+    () => {
+        const selector = [
+            'a[href]', 'button', 'input', 'select', 'textarea', 'summary',
+            '[contenteditable=""]', '[contenteditable="true"]', '[onclick]',
+            '[tabindex]:not([tabindex="-1"])', '[role=button]', '[role=link]',
+            '[role=checkbox]', '[role=radio]', '[role=switch]', '[role=tab]',
+            '[role=menuitem]', '[role=option]', '[role=combobox]', '[role=textbox]',
+        ].join(',');
+        const state = window.__playwrightElementIds ||= { next: 1 };
+        const ids = {};
+        for (const element of document.querySelectorAll(selector)) {
+            let id = element.getAttribute('data-playwright-id');
+            // A copied element keeps the ID of the original
+            if (!id || id in ids) {
+                id = String(state.next++);
+                element.setAttribute('data-playwright-id', id);
+            }
+            ids[id] = element.tagName.toLowerCase();
+        }
+        return ids;
+    }
+    """
+)
+
+
+def with_element_ids(observe_script: str) -> str:
+    """
+    Wraps an observe script to tag the interactive elements first, in the same
+    round-trip. The IDs are returned as `ids`.
+    """
+    return (
+        f"() => {{ const ids = ({ASSIGN_ELEMENT_IDS_SCRIPT})();"
+        f" return {{ ...({observe_script})(), ids }}; }}"
+    )
+
+
+# Counts the changes of the document an observation could show: DOM mutations
+# other than our own data attributes, input, focus and scrolling. Run in every
+# page, a memoized context message is reused only while the count is the same.
+CHANGE_COUNTER_SCRIPT = cleandoc(
+    """
+    (() => {
+        window.__playwrightChanges = 0;
+        const count = () => { window.__playwrightChanges++; };
+        new MutationObserver(records => {
+            for (const record of records) {
+                if (record.type !== 'attributes'
+                    || !record.attributeName.startsWith('data-playwright-')) {
+                    count();
+                    return;
+                }
+            }
+        }).observe(document, {
+            subtree: true, childList: true, attributes: true, characterData: true,
+        });
+        for (const type of ['input', 'change', 'focusin', 'scroll']) {
+            document.addEventListener(type, count, { capture: true, passive: true });
+        }
+    })();
+    """
+)
+
+CHANGE_COUNT_SCRIPT = "() => window.__playwrightChanges ?? -1"
+
+
 def get_openai_client():
-    return wrappers.wrap_openai(OpenAI())
+    return with_completion_cache(wrappers.wrap_openai(OpenAI()))
 
 
 def get_anthropic_client():
@@ -129,56 +299,537 @@ class PlaywrightPlugin(Plugin):
     name: str = "PlaywrightPlugin"
     client: Any = Field(default_factory=get_openai_client, exclude=True)
     anthropic_client: Any = Field(default_factory=get_anthropic_client, exclude=True)
-
-    _playwright: playwright.async_api.Playwright | None
-    _browser: playwright.async_api.Browser | None
+    browser_profile: BrowserProfile = Field(default_factory=BrowserProfile)
+    # Start the browser in the background as soon as the plugin is created
+    prewarm: bool = False
+    # Start the next context message in the background once an interaction
+    # is committed and its tools have run
+    prefetch_context: bool = False
+    # Reuse the context message (e.g. when an interaction is regenerated)
+    # while no tool ran, the page didn't navigate or change and it's younger
+    # than this many seconds
+    context_ttl: float | None = config.CONTEXT_MESSAGE_TTL
+    # What to wait for after every action before the page is observed
+    settle_options: SettleOptions = Field(default_factory=SettleOptions)
+    # "diff" sends only the changes of the HTML since the last committed
+    # context message, the agent has to have persist_context_message set.
+    # Needs the HTML observation mode and an HTML format (pretty or minified)
+    context_mode: Literal["full", "diff"] = "full"
+    # In diff mode, send the whole HTML at least every this many turns
+    keyframe_interval: int = 10
+    # In diff mode, send the whole HTML if the diff is longer than this share
+    # of it
+    max_diff_ratio: float = 0.5
+    # Fold runs of repeated siblings in the HTML, keeping the first few. Works
+    # on the pretty-printed HTML only (html_format="pretty")
+    fold_repeated: bool = False
+    fold_keep: int = 3
+    # "accessibility" observes the page through the accessibility tree of the
+    # browser instead of the HTML and its LLM description
+    observation_mode: Literal["html", "accessibility"] = "html"
+    # Tag interactive elements with IDs the agent acts on with the `*_by_id`
+    # tools, instead of writing selectors
+    element_ids: bool = False
+    # Take a screenshot of every observation, for a UI to show (`buffer`)
+    take_screenshot: bool = True
+    # What describes the page in the context message: "html" (an OpenAI
+    # model reading the HTML), "anthropic" (a Claude model reading the HTML)
+    # and "screenshot" (a vision model looking at the screenshot). Several
+    # describers run concurrently.
+    describers: tuple[Literal["html", "anthropic", "screenshot"], ...] = ("html",)
+    # How the cleaned HTML is printed, see `html_cleaner.OUTPUT_FORMATS`
+    html_format: Literal["pretty", "minified", "outline", "markdown"] = "pretty"
+
+    observe_script: ClassVar[str] = build_observe_script()
+    # Scripts run in every page of the browser context
+    init_scripts: ClassVar[tuple[str, ...]] = ()
+
+    _browser_context: playwright.async_api.BrowserContext | None
     _page: playwright.async_api.Page | None
+    _settler: PageSettler | None
+    _settle_timings: dict[str, float]
     _buffer: bytes | None
+    _description_cache: DescriptionCache
+    _runtime: PlaywrightRuntime
+    _viewport: dict | None
+    _timings: dict[str, float]
+    _page_lock: asyncio.Lock
+    _ready: concurrent.futures.Future | None
+    _session_start: float
+    _time_to_first_observation: float | None
+    # (url, html) of the last committed context message, in diff mode
+    _snapshot: tuple[str, str] | None
+    _turns_since_keyframe: int
+    # The committed context message with the whole HTML the diffs since are
+    # based on, in diff mode
+    _keyframe_message: str | None
+    # context message -> (url, html, description, whether it's a keyframe)
+    _pending_snapshots: OrderedDict[str, tuple[str, str, str, bool]]
+    # Folded HTML of the last context message by fold number
+    _folds: dict[int, str]
+    # Tag names of the elements tagged with IDs in the last observation by ID
+    _element_handles: dict[int, str]
+    # The context message being prefetched (as a memo, see `_aprefetch`), with
+    # the number of tool calls and the URL when it was started
+    _prefetched: tuple[int, str | None, concurrent.futures.Future] | None
+    _tool_calls: int
+    # Navigations of the main frame of the page
+    _navigations: int
 
     def __init__(self, **data):
         super().__init__(**data)
-        self._playwright = None
-        self._browser = None
+        self._browser_context = None
         self._page = None
+        self._settler = None
+        self._settle_timings = {}
         self._buffer = None
-        self._loop = asyncio.new_event_loop()
+        self._viewport = None
+        self._timings = {}
+        self._runtime = get_runtime()
+        self._description_cache = get_description_cache()
+        self._page_lock = asyncio.Lock()
+        self._ready = None
+        self._session_start = time.perf_counter()
+        self._time_to_first_observation = None
+        self._snapshot = None
+        self._turns_since_keyframe = 0
+        self._keyframe_message = None
+        self._pending_snapshots = OrderedDict()
+        self._folds = {}
+        self._element_handles = {}
+        self._prefetched = None
+        self._tool_calls = 0
+        self._navigations = 0
+        if self.prewarm:
+            self.warm_up()
+
+    @model_validator(mode="after")
+    def _check_context_mode(self):
+        if self.context_mode != "diff":
+            return self
+        if self.observation_mode != "html":
+            raise ValueError(
+                "context_mode='diff' diffs the HTML of the page, it doesn't "
+                f"work with observation_mode={self.observation_mode!r}"
+            )
+        if self.html_format not in ("pretty", "minified"):
+            raise ValueError(
+                "context_mode='diff' diffs the HTML of the page, it doesn't "
+                f"work with html_format={self.html_format!r}"
+            )
+        return self
+
+    @model_validator(mode="after")
+    def _check_fold_repeated(self):
+        if self.fold_repeated and self.html_format != "pretty":
+            raise ValueError(
+                "fold_repeated folds the lines of the pretty-printed HTML, it "
+                f"doesn't work with html_format={self.html_format!r}"
+            )
+        return self
+
+    def warm_up(self) -> concurrent.futures.Future:
+        """
+        Opens the page (starting the browser if needed) in the background.
+        Returns a future done when the page is ready, also available as
+        `ready`.
+        """
+        if self._ready is None:
+            self._ready = self._runtime.submit(self._ensure_page())
+        return self._ready
+
+    @property
+    def ready(self) -> concurrent.futures.Future | None:
+        return self._ready
 
     @property
     def system_message(self) -> str:
-        return cleandoc(
+        if self.observation_mode == "accessibility":
+            return cleandoc(
+                """
+                You can use Playwright to interact with web pages. You always
+                get the accessibility tree of the current page
+                """
+            )
+        system_message = cleandoc(
             """
             You can use Playwright to interact with web pages. You always get 
             the HTML content of the current page
             """
         )
+        if self.fold_repeated:
+            system_message += "\n\n" + FOLDING_SYSTEM_MESSAGE
+        if self.element_ids:
+            system_message += "\n\n" + ELEMENT_IDS_SYSTEM_MESSAGE
+        return system_message
+
+    @property
+    def tools(self):
+        return [tool for tool in self._tools if self._is_tool_enabled(tool)]
+
+    def _is_tool_enabled(self, tool: dict) -> bool:
+        """Whether the tool works with the configuration of the plugin."""
+        name = tool["function"]["name"]
+        if name.endswith("_by_id"):
+            return self.element_ids
+        if name == "expand_folded_elements":
+            return self.fold_repeated
+        return True
 
     @property
     def context_message(self) -> str:
         return self.get_context_message()
 
-    @traceable(run_type="chain", name="get_context_message", tags=["PlaywrightPlugin"])
     def get_context_message(self):
-        self._run_async(self._screenshot())
+        if self._prefetched is not None:
+            memo = self._use_prefetched(self.context_state())
+            if memo is not None:
+                return memo[2]
+        return self._run_async(self._aget_context_message())
+
+    async def acontext_message(self) -> str:
+        if self._prefetched is not None:
+            memo = await self._ause_prefetched(await self.acontext_state())
+            if memo is not None:
+                return memo[2]
+        return await self._runtime.arun(self._aget_context_message())
+
+    def _compute_context_memo(self, state):
+        memo = self._use_prefetched(state)
+        if memo is not None:
+            return memo
+        return super()._compute_context_memo(state)
+
+    async def _acompute_context_memo(self, state):
+        memo = await self._ause_prefetched(state)
+        if memo is not None:
+            return memo
+        return await super()._acompute_context_memo(state)
+
+    def context_state(self):
+        return self._run_async(self._context_state())
+
+    async def acontext_state(self):
+        return await self._runtime.arun(self._context_state())
+
+    async def _context_state(self):
+        page = await self._ensure_page()
         try:
-            html = self._run_async(self._get_page_content())
-        except PageNotLoadedException:
-            html = "No page loaded yet."
-            description = "The browser is empty"
-        else:
-            # anthropic_description = self._get_anthropic_description(html)
-            # description = anthropic_description
-            description = self._get_html_description(
-                html, langsmith_extra={"metadata": {"url": self._page.url}}
+            changes = await page.evaluate(CHANGE_COUNT_SCRIPT)
+        except Error:
+            # The page is navigating, what it will show is unknown
+            return object()
+        return (page.url, self._navigations, changes)
+
+    def _prefetch(self):
+        self._discard_prefetched()
+        # The prefetched context message is newer than the memoized one
+        self.invalidate_context_message()
+        url = self._page.url if self._page else None
+        future = self._runtime.submit(self._aprefetch())
+        self._prefetched = (self._tool_calls, url, future)
+
+    async def _aprefetch(self) -> tuple[float, Any, str]:
+        """
+        Returns the context message with the time and the context state it was
+        captured at, the way it's memoized.
+        """
+        started = time.monotonic()
+        state = await self._context_state()
+        return (started, state, await self._aget_context_message())
+
+    def _use_prefetched(self, state) -> tuple[float, Any, str] | None:
+        """
+        Waits for the prefetched context message and returns it as a memo,
+        unless the current context `state` isn't the one it was captured at.
+        """
+        prefetched = self._take_prefetched()
+        if prefetched is None:
+            return None
+        start = time.perf_counter()
+        try:
+            memo = prefetched.result()
+        except Exception as e:
+            logging.warning(f"Failed to prefetch the context message: {e}")
+            return None
+        return self._check_prefetched(memo, state, start)
+
+    async def _ause_prefetched(self, state) -> tuple[float, Any, str] | None:
+        """Coroutine version of `_use_prefetched`."""
+        prefetched = self._take_prefetched()
+        if prefetched is None:
+            return None
+        start = time.perf_counter()
+        try:
+            memo = await asyncio.wrap_future(prefetched)
+        except Exception as e:
+            logging.warning(f"Failed to prefetch the context message: {e}")
+            return None
+        return self._check_prefetched(memo, state, start)
+
+    def _check_prefetched(
+        self, memo: tuple[float, Any, str], state, start: float
+    ) -> tuple[float, Any, str] | None:
+        if memo[1] != state:
+            # The page changed while the context message was prefetched
+            return None
+        self._timings["prefetch_wait"] = time.perf_counter() - start
+        return memo
+
+    def _take_prefetched(self) -> concurrent.futures.Future | None:
+        """
+        Returns the prefetch, unless a tool was called or the page navigated
+        since it was started. It's used only once.
+        """
+        if self._prefetched is None:
+            return None
+        tool_calls, url, future = self._prefetched
+        current_url = self._page.url if self._page else None
+        if tool_calls != self._tool_calls or current_url != url:
+            self._discard_prefetched()
+            return None
+        self._prefetched = None
+        return future
+
+    def _discard_prefetched(self):
+        """
+        Cancels the prefetch, so that it doesn't overwrite the state of the
+        plugin (e.g. the element IDs) once a newer observation has started.
+        """
+        if self._prefetched is not None:
+            self._prefetched[2].cancel()
+            self._prefetched = None
+
+    def call_tool(self, tool_name: str, **kwargs):
+        # The tool may change the page, the prefetch would be discarded anyway
+        self._discard_prefetched()
+        self._tool_calls += 1
+        return super().call_tool(tool_name, **kwargs)
+
+    @traceable(run_type="chain", name="get_context_message", tags=["PlaywrightPlugin"])
+    async def _aget_context_message(self):
+        self._timings = {}
+        start = time.perf_counter()
+        page = await self._ensure_page()
+        results = await run_pipeline(self._observation_stages(), self._timings)
+        self._timings["total"] = time.perf_counter() - start
+        if self._time_to_first_observation is None:
+            self._time_to_first_observation = time.perf_counter() - self._session_start
+        if self.observation_mode == "accessibility":
+            return ACCESSIBILITY_CONTEXT_TEMPLATE.format(
+                tree=results["accessibility_tree"]
+            )
+        html = results["page_content"]
+        if html is None:
+            return self._format_context_message(
+                "No page loaded yet.", "The browser is empty"
             )
-            # screenshot_description = self._get_screenshot_description(
-            #     langsmith_extra={"metadata": {"url": self._page.url}}
-            # )
-            # print(screenshot_description)
+        description = "\n\n".join(
+            results[stage] for stage in DESCRIBER_STAGES.values() if results.get(stage)
+        )
+        if self.context_mode == "diff":
+            return self._format_diff_context_message(page.url, html, description)
         return self._format_context_message(html, description)
 
+    def _observation_stages(self) -> dict[str, Stage]:
+        """
+        The stages of the observation of the page and what they depend on.
+        Stages that aren't needed are left out: the screenshot when neither a
+        UI (`take_screenshot`) nor a describer needs it, and the describers
+        that aren't in `describers`.
+        """
+        stages = {}
+        if self.take_screenshot or "screenshot" in self.describers:
+            stages["screenshot"] = Stage(self._screenshot)
+        if self.observation_mode == "accessibility":
+            stages["accessibility_tree"] = Stage(self._get_accessibility_tree)
+            return stages
+        stages["page_content"] = Stage(self._get_folded_page_content)
+        if "html" in self.describers:
+            stages["description"] = Stage(self._describe_html, ("page_content",))
+        if "anthropic" in self.describers:
+            stages["anthropic_description"] = Stage(
+                self._describe_html_with_anthropic, ("page_content",)
+            )
+        if "screenshot" in self.describers:
+            stages["screenshot_description"] = Stage(
+                self._describe_screenshot, ("page_content", "screenshot")
+            )
+        return stages
+
+    async def _get_folded_page_content(self) -> str | None:
+        """The cleaned and folded HTML, None if no page is loaded."""
+        try:
+            html = await self._get_page_content()
+        except PageNotLoadedException:
+            return None
+        return self._fold(html)
+
+    async def _describe_html(self, page_content: str | None) -> str | None:
+        if page_content is None:
+            return None
+        return await asyncio.to_thread(
+            self._get_html_description,
+            page_content,
+            langsmith_extra={"metadata": {"url": self._page.url}},
+        )
+
+    async def _describe_html_with_anthropic(
+        self, page_content: str | None
+    ) -> str | None:
+        if page_content is None:
+            return None
+        return await asyncio.to_thread(self._get_anthropic_description, page_content)
+
+    async def _describe_screenshot(
+        self, page_content: str | None, screenshot=None
+    ) -> str | None:
+        # The screenshot stage leaves the screenshot in `_buffer`
+        if page_content is None:
+            return None
+        return await asyncio.to_thread(
+            self._get_screenshot_description,
+            langsmith_extra={"metadata": {"url": self._page.url}},
+        )
+
+    async def _get_accessibility_tree(self) -> str:
+        page = await self._ensure_page()
+        if page.url == "about:blank":
+            return "No page loaded yet."
+        snapshot = await page.accessibility.snapshot()
+        return format_accessibility_tree(snapshot)
+
+    @property
+    def observation_timings(self) -> dict[str, float]:
+        """
+        Seconds spent in each step of the last context message, waiting for
+        the page to settle after the last action, and from the start of the
+        session to the end of its first context message. `prefetch_wait` is
+        the time the last context message was waited for, if it was
+        prefetched.
+        """
+        timings = dict(self._settle_timings, **self._timings)
+        if self._time_to_first_observation is not None:
+            timings["time_to_first_observation"] = self._time_to_first_observation
+        return timings
+
+    async def _timed(self, name: str, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self._timings[name] = time.perf_counter() - start
+
+    async def acall_tool(self, tool_name: str, **kwargs):
+        """
+        Awaits the coroutine implementing the tool (the tool name prefixed with
+        an underscore) on the runtime loop, without blocking a worker thread.
+        """
+        self._discard_prefetched()
+        self._tool_calls += 1
+        self.invalidate_context_message()
+        coroutine_function = getattr(self, f"_{tool_name}", None)
+        if tool_name in self._callable_tools and iscoroutinefunction(
+            coroutine_function
+        ):
+            return await self._runtime.arun(coroutine_function(**kwargs))
+        return await super().acall_tool(tool_name, **kwargs)
+
     def _format_context_message(self, html, description):
         return CONTEXT_TEMPLATE.format(html=html, description=description)
 
+    def _format_diff_context_message(self, url, html, description):
+        diff = self._get_diff(url, html)
+        if diff is None:
+            context_message = self._format_context_message(html, description)
+        else:
+            context_message = DIFF_CONTEXT_TEMPLATE.format(
+                diff=diff, description=description
+            )
+        # The snapshot becomes the base of the next diff once committed
+        self._pending_snapshots[context_message] = (
+            url,
+            html,
+            description,
+            diff is None,
+        )
+        while len(self._pending_snapshots) > MAX_PENDING_SNAPSHOTS:
+            self._pending_snapshots.popitem(last=False)
+        return context_message
+
+    def _get_diff(self, url, html) -> str | None:
+        """
+        Returns the changes since the committed snapshot, or None if the whole
+        HTML should be sent: after a navigation, every `keyframe_interval`
+        turns, or when the diff isn't much shorter.
+        """
+        if (
+            self._snapshot is None
+            or self._snapshot[0] != url
+            or self._turns_since_keyframe + 1 >= self.keyframe_interval
+        ):
+            return None
+        diff = "\n".join(diff_html(self._snapshot[1], html)) or "No changes"
+        if len(diff) > self.max_diff_ratio * len(html):
+            return None
+        return diff
+
+    def check_agent(self, agent):
+        if self.context_mode == "diff" and not agent.persist_context_message:
+            raise ValueError(
+                f"Plugin {self.name} sends only the changes of the page "
+                "(context_mode='diff'), the agent has to keep the context "
+                "messages in its history (persist_context_message=True)"
+            )
+
+    def fit_context_message(self, context_message: str, history: list[dict]) -> str:
+        """
+        Replaces a diff with the whole HTML if the context message with the
+        whole HTML it's based on isn't in the history sent along.
+        """
+        if self.context_mode != "diff" or self._keyframe_message is None:
+            return context_message
+        if any(
+            self._keyframe_message in message["content"]
+            for message in history
+            if message["role"] == "user" and isinstance(message["content"], str)
+        ):
+            return context_message
+        for message, (url, html, description, keyframe) in list(
+            self._pending_snapshots.items()
+        ):
+            if keyframe or message not in context_message:
+                continue
+            full_message = self._format_context_message(html, description)
+            self._pending_snapshots[full_message] = (url, html, description, True)
+            return context_message.replace(message, full_message)
+        return context_message
+
+    def on_commit(self, interaction):
+        context_message = interaction.context_message or ""
+        for message, (url, html, _, keyframe) in self._pending_snapshots.items():
+            if message in context_message:
+                self._snapshot = (url, html)
+                if keyframe:
+                    self._keyframe_message = message
+                    self._turns_since_keyframe = 0
+                else:
+                    self._turns_since_keyframe += 1
+                break
+        self._pending_snapshots.clear()
+        if self.context_mode == "diff":
+            # The diff is from the snapshot that has just been replaced
+            self.invalidate_context_message()
+        if self.prefetch_context:
+            # The tools of the interaction have run, the page is what the
+            # next context message will show
+            self._prefetch()
+
+    @property
+    def description_cache_stats(self) -> dict:
+        """Hit and miss counts of the page description cache."""
+        return self._description_cache.stats
+
     @property
     def buffer(self) -> bytes:
         return bytes(self._buffer) if self._buffer else b""
@@ -200,7 +851,7 @@ class PlaywrightPlugin(Plugin):
         count = await page.locator(selector).count()
         return count
 
-    @tool
+    @tool(serial=True)
     def navigate_to_url(self, url: str):
         """
         Navigates to a URL
@@ -209,6 +860,7 @@ class PlaywrightPlugin(Plugin):
         """
         return self._run_async(self._navigate_to_url(url))
 
+    @settle_after
     async def _navigate_to_url(self, url: str):
         page = await self._ensure_page()
         try:
@@ -220,7 +872,7 @@ class PlaywrightPlugin(Plugin):
         status = response.status if response else "unknown"
         return f"Navigating to {url} returned status code {status}"
 
-    @tool
+    @tool(serial=True)
     def click_element(self, selector: str) -> str:
         """
         Click on an element with the given CSS selector.
@@ -229,6 +881,7 @@ class PlaywrightPlugin(Plugin):
         """
         return self._run_async(self._click_element(selector))
 
+    @settle_after
     async def _click_element(self, selector: str) -> str:
         timeout = config.PLAYWRIGHT_TIMEOUT
         page = await self._ensure_page()
@@ -257,7 +910,7 @@ class PlaywrightPlugin(Plugin):
 
         return f"Element clicked successfully."
 
-    @tool
+    @tool(serial=True)
     def fill_element(self, selector: str, text: str):
         """
         Fill a text input element with a specific text
@@ -268,6 +921,7 @@ class PlaywrightPlugin(Plugin):
 
         return self._run_async(self._fill_element(selector, text))
 
+    @settle_after
     async def _fill_element(self, selector: str, text: str):
         page = await self._ensure_page()
         try:
@@ -279,7 +933,7 @@ class PlaywrightPlugin(Plugin):
             return f"Unable to fill element. {e}"
         return f"Text input was successfully performed."
 
-    @tool
+    @tool(serial=True)
     def select_option(self, selector: str, value: str):
         """
         Select an option from a dropdown element identified by its text content.
@@ -289,6 +943,7 @@ class PlaywrightPlugin(Plugin):
         """
         return self._run_async(self._select_option(selector, value))
 
+    @settle_after
     async def _select_option(self, selector: str, value: str):
         page = await self._ensure_page()
         try:
@@ -297,7 +952,85 @@ class PlaywrightPlugin(Plugin):
             return f"Unable to select option '{value}' on element '{selector}'."
         return f"Option '{value}' was successfully selected."
 
-    @tool
+    @tool(serial=True)
+    def click_element_by_id(self, element_id: int) -> str:
+        """
+        Click on the interactive element with the given ID
+
+        :param int element_id: The `data-playwright-id` of the element.
+        """
+        return self._run_async(self._click_element_by_id(element_id))
+
+    @settle_after
+    async def _click_element_by_id(self, element_id: int) -> str:
+        locator = await self._locate_element(element_id)
+        if locator is None:
+            return f"There is no element with ID {element_id} on the page."
+        timeout = config.PLAYWRIGHT_TIMEOUT
+        try:
+            await locator.click(timeout=timeout)
+        except playwright.async_api.TimeoutError:
+            return f"Element {element_id} did not become clickable within {timeout}ms. It might be obscured by another element."
+        except Error as e:
+            return f"Unable to click on element {element_id}. {e.message}"
+        return "Element clicked successfully."
+
+    @tool(serial=True)
+    def fill_element_by_id(self, element_id: int, text: str):
+        """
+        Fill the text input element with the given ID with a specific text
+
+        :param int element_id: The `data-playwright-id` of the input element.
+        :param str text: Text you want to fill in.
+        """
+        return self._run_async(self._fill_element_by_id(element_id, text))
+
+    @settle_after
+    async def _fill_element_by_id(self, element_id: int, text: str):
+        locator = await self._locate_element(element_id)
+        if locator is None:
+            return f"There is no element with ID {element_id} on the page."
+        try:
+            await locator.fill(text, timeout=config.PLAYWRIGHT_TIMEOUT)
+        except Error as e:
+            return f"Unable to fill element {element_id}. {e.message}"
+        return "Text input was successfully performed."
+
+    @tool(serial=True)
+    def select_option_by_id(self, element_id: int, value: str):
+        """
+        Select an option from the dropdown element with the given ID.
+
+        :param int element_id: The `data-playwright-id` of the dropdown element.
+        :param str value: Text content of the option to select.
+        """
+        return self._run_async(self._select_option_by_id(element_id, value))
+
+    @settle_after
+    async def _select_option_by_id(self, element_id: int, value: str):
+        locator = await self._locate_element(element_id)
+        if locator is None:
+            return f"There is no element with ID {element_id} on the page."
+        try:
+            await locator.select_option(value, timeout=config.PLAYWRIGHT_TIMEOUT)
+        except Error:
+            return f"Unable to select option '{value}' on element {element_id}."
+        return f"Option '{value}' was successfully selected."
+
+    async def _locate_element(
+        self, element_id: int
+    ) -> playwright.async_api.Locator | None:
+        """
+        Returns the locator of the element tagged with the ID in the last
+        observation, or None if there's no such element. The IDs are unique,
+        so the matches don't have to be counted.
+        """
+        if element_id not in self._element_handles:
+            return None
+        page = await self._ensure_page()
+        return page.locator(f'[{ELEMENT_ID_ATTRIBUTE}="{element_id}"]')
+
+    @tool(serial=True)
     def press_enter(self):
         """
         Press the Enter key. This can be useful for submitting forms that
@@ -305,6 +1038,7 @@ class PlaywrightPlugin(Plugin):
         """
         return self._run_async(self._press_enter())
 
+    @settle_after
     async def _press_enter(self):
         page = await self._ensure_page()
         try:
@@ -314,7 +1048,7 @@ class PlaywrightPlugin(Plugin):
             return f"Unable to press Enter. {e}"
         return "Enter key was successfully pressed."
 
-    @tool
+    @tool(serial=True)
     def assert_that(self, selector: str, action: str, value: str | None = None):
         """
         {
@@ -364,47 +1098,122 @@ class PlaywrightPlugin(Plugin):
             return "Action not implemented"
         return f"Action '{action}' was successfully performed: {result_message}"
 
+    @tool(serial=True)
+    def expand_folded_elements(self, fold: int):
+        """
+        Shows the HTML of repeated elements folded in the HTML content
+
+        :param int fold: Number of the fold, as in "(fold 2)"
+        """
+        if fold not in self._folds:
+            return f"There is no fold {fold} in the current HTML content."
+        return self._folds[fold]
+
     def close(self):
+        self._discard_prefetched()
+        self.invalidate_context_message()
         self._run_async(self._close())
 
     async def _close(self):
         if self._page:
             await self._page.close()
-        if self._browser:
-            await self._browser.close()
-        if self._playwright:
-            await self._playwright.stop()
+        if self._browser_context:
+            pool = get_browser_pool(self.browser_profile.headless)
+            await pool.release(self._browser_context)
 
     def reset_history(self, history):
         self.close()
-        self._playwright = None
-        self._browser = None
+        self._browser_context = None
         self._page = None
+        self._ready = None
+        self._session_start = time.perf_counter()
+        self._time_to_first_observation = None
+        self._snapshot = None
+        self._keyframe_message = None
+        self._pending_snapshots.clear()
+        self._folds = {}
+        self._element_handles = {}
+        self._navigations = 0
+        self.invalidate_context_message()
+        if self.prewarm:
+            self.warm_up()
         super().reset_history(history)
 
     async def _get_page_content(self):
         page = await self._ensure_page()
         if page.url == "about:blank":
             raise PageNotLoadedException("No page loaded yet.")
-        html = await page.content()
-        html_clean = self._clean_html(
-            html, langsmith_extra={"metadata": {"url": page.url}}
+        observation = await self._observe(page)
+        return await self._aclean_html(
+            observation["html"],
+            **self._clean_options(),
+            langsmith_extra={"metadata": {"url": page.url}},
+        )
+
+    async def _observe(self, page: playwright.async_api.Page) -> dict:
+        """
+        Runs `observe_script`, returning the HTML and the viewport size of the
+        page. With `element_ids`, the interactive elements are tagged first.
+        """
+        if self.element_ids:
+            observation = await evaluate(page, with_element_ids(self.observe_script))
+            self._set_element_handles(observation["ids"])
+        else:
+            observation = await evaluate(page, self.observe_script)
+        self._viewport = observation["viewport"]
+        return observation
+
+    async def _assign_element_ids(self, page: playwright.async_api.Page):
+        """Tags the interactive elements with IDs without observing the page."""
+        self._set_element_handles(await evaluate(page, ASSIGN_ELEMENT_IDS_SCRIPT))
+
+    def _set_element_handles(self, ids: dict[str, str]):
+        self._element_handles = {
+            int(element_id): tag for element_id, tag in ids.items()
+        }
+
+    def _clean_options(self) -> dict:
+        """Keyword arguments of `clean_html` for this plugin."""
+        options = {"output_format": self.html_format}
+        if self.element_ids:
+            # The IDs identify the elements, classes would only cost tokens
+            options["allowed_attributes"] = ALLOWED_ATTRIBUTES - {"class"}
+        return options
+
+    async def _get_viewport(self, page: playwright.async_api.Page) -> dict:
+        # The emulated viewport is known without asking the page
+        viewport = page.viewport_size or self._viewport
+        if not viewport:
+            viewport = await page.evaluate(VIEWPORT_SCRIPT)
+        return viewport
+
+    def _fold(self, html: str) -> str:
+        """
+        Folds runs of repeated siblings in the cleaned HTML, remembering the
+        folded HTML for `expand_folded_elements`.
+        """
+        if not self.fold_repeated:
+            return html
+        html, self._folds = fold_html(html, keep=self.fold_keep)
+        return html
+
+    async def _aclean_html(self, html: str, **options) -> str:
+        """
+        Runs `_clean_html` in a worker thread, it's CPU-bound and would block
+        the loop the browser is driven from.
+        """
+        return await self._timed(
+            "clean_html", asyncio.to_thread(self._clean_html, html, **options)
         )
-        return html_clean
 
     @staticmethod
     @traceable(run_type="chain", name="clean_html", tags=["PlaywrightPlugin"])
-    def _clean_html(html: str) -> str:
+    def _clean_html(html: str, **options) -> str:
         """
         Cleans the web page HTML content from irrelevant tags and attributes
         to save tokens.
         """
-        soup = BeautifulSoup(html, "html.parser")
-        clean_html.remove_useless_tags(soup)
-        clean_html.clean_attributes(soup)
-        html_clean = soup.prettify()
-        html_clean = clean_html.remove_comments(html_clean)
-        return html_clean
+        return clean_html(html, parser=config.HTML_PARSER, **options)
 
     def _get_anthropic_description(self, html):
         response = self.anthropic_client.messages.create(
@@ -419,6 +1228,16 @@ class PlaywrightPlugin(Plugin):
 
     @traceable(run_type="chain", name="get_html_description", tags=["PlaywrightPlugin"])
     def _get_html_description(self, html):
+        cache_key = self._description_cache.key(
+            html,
+            config.MODEL_DEFAULT,
+            DESCRIBE_HTML_SYSTEM_MESSAGE,
+            config.TEMPERATURE_DEFAULT,
+        )
+        description = self._description_cache.get(cache_key)
+        if description is not None:
+            return description
+
         completion = self.client.chat.completions.create(
             model=config.MODEL_DEFAULT,
             temperature=config.TEMPERATURE_DEFAULT,
@@ -428,7 +1247,9 @@ class PlaywrightPlugin(Plugin):
             ],
             langsmith_extra={"metadata": {"operation": "describe_html"}},
         )
-        return completion.choices[0].message.content
+        description = completion.choices[0].message.content
+        self._description_cache.put(cache_key, description)
+        return description
 
     @traceable(
         run_type="chain", name="get_screenshot_description", tags=["PlaywrightPlugin"]
@@ -457,22 +1278,45 @@ class PlaywrightPlugin(Plugin):
         return completion.choices[0].message.content
 
     async def _ensure_page(self) -> playwright.async_api.Page:
-        if not self._page:
-            self._playwright = await playwright.async_api.async_playwright().start()
-            self._browser = await self._playwright.chromium.launch(headless=False)
-            browser_context = await self._browser.new_context()
-            self._page = await browser_context.new_page()
+        # The page may be being opened by warm_up()
+        async with self._page_lock:
+            if not self._page:
+                await self._open_page()
         return self._page
 
+    async def _open_page(self):
+        profile = self.browser_profile
+        pool = get_browser_pool(profile.headless)
+        self._browser_context = await pool.new_context(**profile.context_options)
+        await profile.apply(self._browser_context)
+        for script in (CHANGE_COUNTER_SCRIPT, *self.init_scripts):
+            await self._browser_context.add_init_script(script)
+        self._page = await self._browser_context.new_page()
+        self._page.on("framenavigated", self._on_frame_navigated)
+        self._settler = PageSettler(self._page)
+
+    def _on_frame_navigated(self, frame: playwright.async_api.Frame):
+        if frame.parent_frame is None:
+            self._navigations += 1
+            # The IDs belong to the previous document, the new one numbers its
+            # elements from 1 again
+            self._element_handles = {}
+
+    async def _settle(self):
+        if self._settler is None:
+            return
+        try:
+            self._settle_timings = await self._settler.wait(self.settle_options)
+        except Error as e:
+            # The action already happened, the page is observed as it is
+            logging.warning(f"Failed to wait for the page to settle: {e.message}")
+
     async def _screenshot(self):
         page = await self._ensure_page()
-        # locator().screenshot() waits for visibility and stability
-        await page.locator("body").screenshot()
         self._buffer = await page.screenshot()
 
     def _run_async(self, coroutine):
-        asyncio.set_event_loop(self._loop)
-        return self._loop.run_until_complete(coroutine)
+        return self._runtime.run(coroutine)
 
     def _enhance_selector(self, selector):
         return selector
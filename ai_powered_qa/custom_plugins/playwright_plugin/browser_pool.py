@@ -0,0 +1,236 @@
+"""
+A pool of warm browsers shared by the Playwright plugins. Each session gets
+an isolated `BrowserContext` (its own cookies, storage and pages) in one of
+the pooled browsers, which costs much less than launching a browser.
+
+All the methods must run on the Playwright runtime loop.
+"""
+
+import asyncio
+from functools import lru_cache
+import logging
+import time
+
+import playwright.async_api
+
+from ai_powered_qa import config
+
+from .runtime import PlaywrightRuntime, get_runtime
+
+
+class _PooledBrowser:
+    def __init__(self, browser: playwright.async_api.Browser):
+        self.browser = browser
+        self.contexts: set[playwright.async_api.BrowserContext] = set()
+        # Contexts being created
+        self.pending = 0
+        self.sessions = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def load(self) -> int:
+        return len(self.contexts) + self.pending
+
+    @property
+    def healthy(self) -> bool:
+        return self.browser.is_connected()
+
+
+class BrowserPool:
+    """
+    Keeps up to `max_browsers` browsers and hands out contexts, at most
+    `max_contexts_per_browser` per browser. A browser that served
+    `max_sessions_per_browser` sessions is recycled once its last context is
+    released, disconnected browsers are dropped, and browsers without
+    contexts for `idle_timeout` seconds are closed, except for
+    `warm_browsers` of them.
+    """
+
+    def __init__(
+        self,
+        runtime: PlaywrightRuntime,
+        max_browsers: int = config.BROWSER_POOL_MAX_BROWSERS,
+        warm_browsers: int = config.BROWSER_POOL_WARM_BROWSERS,
+        max_contexts_per_browser: int = config.BROWSER_POOL_MAX_CONTEXTS,
+        max_sessions_per_browser: int = config.BROWSER_POOL_MAX_SESSIONS,
+        idle_timeout: float = config.BROWSER_POOL_IDLE_TIMEOUT,
+        launch_options: dict | None = None,
+    ):
+        self._runtime = runtime
+        self.max_browsers = max_browsers
+        self.warm_browsers = min(warm_browsers, max_browsers)
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.max_sessions_per_browser = max_sessions_per_browser
+        self.idle_timeout = idle_timeout
+        self.launch_options = launch_options or {"headless": False}
+        self._browsers: list[_PooledBrowser] = []
+        self._launching = 0
+        self._condition: asyncio.Condition | None = None
+        self._reaper: asyncio.Task | None = None
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "browsers": len(self._browsers),
+            "contexts": sum(len(pooled.contexts) for pooled in self._browsers),
+            "sessions": sum(pooled.sessions for pooled in self._browsers),
+        }
+
+    async def start(self):
+        """Launches the warm browsers."""
+        self._ensure_started()
+        missing = self.warm_browsers - len(self._browsers) - self._launching
+        await asyncio.gather(*(self._launch() for _ in range(max(missing, 0))))
+
+    async def new_context(
+        self, **context_options
+    ) -> playwright.async_api.BrowserContext:
+        """
+        Returns a new context in the least busy browser that accepts one,
+        launching a browser if needed. Waits for a context to be released when
+        all the browsers are full.
+        """
+        self._ensure_started()
+        for attempt in range(2):
+            pooled = await self._acquire_browser()
+            try:
+                context = await pooled.browser.new_context(**context_options)
+            except playwright.async_api.Error:
+                await self._release_slot(pooled, None)
+                # A crashed browser isn't picked again, retry in another one
+                if attempt or pooled.healthy:
+                    raise
+                logging.warning("Browser disconnected, retrying in another one")
+                continue
+            pooled.pending -= 1
+            pooled.contexts.add(context)
+            context.on("close", lambda context: self._forget(pooled, context))
+            return context
+
+    async def release(self, context: playwright.async_api.BrowserContext):
+        """Closes the context, recycling its browser if it's due."""
+        for pooled in self._browsers:
+            if context in pooled.contexts:
+                await self._release_slot(pooled, context)
+                return
+        await context.close()
+
+    async def close(self):
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        browsers, self._browsers = self._browsers, []
+        await asyncio.gather(
+            *(pooled.browser.close() for pooled in browsers), return_exceptions=True
+        )
+
+    def _ensure_started(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        if self._reaper is None and self.idle_timeout:
+            self._reaper = asyncio.create_task(self._reap_idle_browsers())
+
+    def _accepts_context(self, pooled: _PooledBrowser) -> bool:
+        return (
+            pooled.healthy
+            and pooled.load < self.max_contexts_per_browser
+            and pooled.sessions < self.max_sessions_per_browser
+        )
+
+    async def _acquire_browser(self) -> _PooledBrowser:
+        async with self._condition:
+            while True:
+                self._drop_unhealthy()
+                candidates = [p for p in self._browsers if self._accepts_context(p)]
+                if candidates:
+                    pooled = min(candidates, key=lambda p: p.load)
+                    # Reserves the slot before new_context() yields
+                    pooled.sessions += 1
+                    pooled.pending += 1
+                    pooled.last_used = time.monotonic()
+                    return pooled
+                if len(self._browsers) + self._launching < self.max_browsers:
+                    self._condition.release()
+                    try:
+                        await self._launch()
+                    finally:
+                        await self._condition.acquire()
+                    continue
+                await self._condition.wait()
+
+    async def _launch(self):
+        self._launching += 1
+        try:
+            playwright_ = await self._runtime.get_playwright()
+            browser = await playwright_.chromium.launch(**self.launch_options)
+        finally:
+            self._launching -= 1
+        self._browsers.append(_PooledBrowser(browser))
+
+    async def _release_slot(self, pooled: _PooledBrowser, context):
+        """Releases a created context, or the reservation if `context` is None."""
+        pooled.last_used = time.monotonic()
+        if context is None:
+            pooled.pending -= 1
+        else:
+            pooled.contexts.discard(context)
+            try:
+                await context.close()
+            except playwright.async_api.Error:
+                pass
+        await self._after_release(pooled)
+
+    async def _after_release(self, pooled: _PooledBrowser):
+        if not pooled.healthy or (
+            pooled.sessions >= self.max_sessions_per_browser and not pooled.load
+        ):
+            await self._retire(pooled)
+        await self._notify()
+
+    def _forget(self, pooled: _PooledBrowser, context):
+        # The context was closed without going through the pool
+        if context in pooled.contexts:
+            pooled.contexts.discard(context)
+            pooled.last_used = time.monotonic()
+            asyncio.ensure_future(self._after_release(pooled))
+
+    def _drop_unhealthy(self):
+        for pooled in [p for p in self._browsers if not p.healthy]:
+            logging.warning("Dropping a disconnected browser from the pool")
+            self._browsers.remove(pooled)
+
+    async def _retire(self, pooled: _PooledBrowser):
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        try:
+            await pooled.browser.close()
+        except playwright.async_api.Error:
+            pass
+
+    async def _notify(self):
+        async with self._condition:
+            self._condition.notify_all()
+
+    async def _reap_idle_browsers(self):
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            self._drop_unhealthy()
+            now = time.monotonic()
+            idle = [
+                pooled
+                for pooled in self._browsers
+                if not pooled.load and now - pooled.last_used > self.idle_timeout
+            ]
+            surplus = max(len(self._browsers) - self.warm_browsers, 0)
+            for pooled in idle[:surplus]:
+                await self._retire(pooled)
+
+
+def get_browser_pool(headless: bool = False) -> BrowserPool:
+    """Returns the shared pool of headless or of visible browsers."""
+    return _get_browser_pool(bool(headless))
+
+
+@lru_cache
+def _get_browser_pool(headless: bool) -> BrowserPool:
+    return BrowserPool(get_runtime(), launch_options={"headless": headless})
@@ -0,0 +1,129 @@
+"""
+Launch and context settings of the browser used by a Playwright plugin. The
+default profile is a visible browser loading everything, `HTML_ONLY_PROFILE`
+suits agents that only read the HTML: it runs headless and doesn't download
+images, fonts, media, analytics or ads.
+"""
+
+from inspect import cleandoc
+from typing import Literal
+from urllib.parse import urlsplit
+
+import playwright.async_api
+from pydantic import BaseModel
+
+VIEWPORT_PRESETS = {
+    "desktop": {"width": 1280, "height": 720},
+    "laptop": {"width": 1366, "height": 768},
+    "tablet": {"width": 768, "height": 1024},
+    "mobile": {"width": 390, "height": 844},
+}
+
+RESOURCE_TYPES = frozenset(
+    {
+        "document",
+        "stylesheet",
+        "image",
+        "media",
+        "font",
+        "script",
+        "texttrack",
+        "xhr",
+        "fetch",
+        "eventsource",
+        "websocket",
+        "manifest",
+        "other",
+    }
+)
+
+TRACKING_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "hotjar.com",
+    "segment.io",
+    "mixpanel.com",
+    "clarity.ms",
+    "amazon-adsystem.com",
+)
+
+DISABLE_ANIMATIONS_SCRIPT = cleandoc(
+    """
+    (() => {
+        const style = document.createElement('style');
+        style.textContent = `*, *::before, *::after {
+            animation-delay: 0s !important;
+            animation-duration: 0s !important;
+            transition-delay: 0s !important;
+            transition-duration: 0s !important;
+            scroll-behavior: auto !important;
+            caret-color: transparent !important;
+        }`;
+        const insert = () => (document.head || document.documentElement).appendChild(style);
+        if (document.documentElement) {
+            insert();
+        } else {
+            document.addEventListener('DOMContentLoaded', insert);
+        }
+    })();
+    """
+)
+
+
+class BrowserProfile(BaseModel):
+    headless: bool = False
+    # Requests of these types (Playwright's `request.resource_type`) are aborted
+    blocked_resource_types: frozenset[str] = frozenset()
+    # Requests to these domains and their subdomains are aborted
+    blocked_domains: tuple[str, ...] = ()
+    disable_animations: bool = False
+    viewport: Literal["desktop", "laptop", "tablet", "mobile"] | None = None
+
+    model_config = {"frozen": True}
+
+    @property
+    def context_options(self) -> dict:
+        options = {}
+        if self.viewport:
+            options["viewport"] = VIEWPORT_PRESETS[self.viewport]
+        if self.disable_animations:
+            options["reduced_motion"] = "reduce"
+        return options
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if resource_type in self.blocked_resource_types:
+            return True
+        hostname = urlsplit(url).hostname or ""
+        return any(
+            hostname == domain or hostname.endswith("." + domain)
+            for domain in self.blocked_domains
+        )
+
+    async def apply(self, context: playwright.async_api.BrowserContext):
+        """Installs the request blocking and the init scripts of the profile."""
+        if self.blocked_resource_types or self.blocked_domains:
+
+            async def handle_route(route: playwright.async_api.Route):
+                request = route.request
+                if self.should_block(request.url, request.resource_type):
+                    await route.abort("blockedbyclient")
+                else:
+                    await route.fallback()
+
+            await context.route("**/*", handle_route)
+        if self.disable_animations:
+            await context.add_init_script(DISABLE_ANIMATIONS_SCRIPT)
+
+
+HTML_ONLY_PROFILE = BrowserProfile(
+    headless=True,
+    blocked_resource_types=frozenset({"image", "media", "font"}),
+    blocked_domains=TRACKING_DOMAINS,
+    disable_animations=True,
+    viewport="desktop",
+)
@@ -2,8 +2,8 @@ from bs4 import BeautifulSoup
 import re
 
 
-def clean_attributes(soup: BeautifulSoup) -> str:
-    allowed_attrs = [
+ALLOWED_ATTRIBUTES = frozenset(
+    [
         "class",
         "id",
         "name",
@@ -14,6 +14,7 @@ def clean_attributes(soup: BeautifulSoup) -> str:
         "data-playwright-scrollable",
         "data-playwright-value",
         "data-playwright-focused",
+        "data-playwright-id",
         "href",
         "tabindex",
         "disabled",
@@ -39,15 +40,10 @@ def clean_attributes(soup: BeautifulSoup) -> str:
         "aria-atomic",
         "aria-busy",
     ]
+)
 
-    for element in soup.find_all(True):
-        element.attrs = {
-            key: value for key, value in element.attrs.items() if key in allowed_attrs
-        }
-
-
-def remove_useless_tags(soup: BeautifulSoup):
-    tags_to_remove = [
+USELESS_TAGS = frozenset(
+    [
         "path",
         "meta",
         "link",
@@ -55,7 +51,20 @@ def remove_useless_tags(soup: BeautifulSoup):
         "script",
         "style",
     ]
-    for t in soup.find_all(tags_to_remove):
+)
+
+
+def clean_attributes(soup: BeautifulSoup) -> str:
+    for element in soup.find_all(True):
+        element.attrs = {
+            key: value
+            for key, value in element.attrs.items()
+            if key in ALLOWED_ATTRIBUTES
+        }
+
+
+def remove_useless_tags(soup: BeautifulSoup):
+    for t in soup.find_all(list(USELESS_TAGS)):
         t.decompose()
 
 
@@ -80,3 +89,16 @@ def remove_invisible(soup: BeautifulSoup):
 
 def remove_comments(html: str):
     return re.sub(r"[\s]*<!--[\s\S]*?-->[\s]*?", "", html)
+
+
+def clean_with_beautifulsoup(html: str, only_visible: bool = False) -> str:
+    """
+    The original cleaning pipeline. It's the reference `html_cleaner` is
+    checked against, use `html_cleaner.clean_html` to actually clean pages.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    if only_visible:
+        remove_invisible(soup)
+    remove_useless_tags(soup)
+    clean_attributes(soup)
+    return remove_comments(soup.prettify())
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
+import os
+import threading
+
+from ai_powered_qa.components.lru_store import SqliteLruStore
+
+
+class DescriptionCache:
+    """
+    Caches page descriptions by a fingerprint of the cleaned HTML, the model
+    and the prompt used to generate them. Recently used descriptions are kept
+    in memory, optionally backed by an on-disk store shared between sessions.
+    """
+
+    def __init__(self, max_entries: int = 256, store: SqliteLruStore | None = None):
+        self._max_entries = max_entries
+        self._store = store
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(html: str, model: str, system_message: str, temperature: float) -> str:
+        fingerprint = hashlib.sha256()
+        for part in [model, str(temperature), system_message, html]:
+            fingerprint.update(part.encode())
+            fingerprint.update(b"\0")
+        return fingerprint.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        description = self._store.get(key) if self._store is not None else None
+        with self._lock:
+            if description is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, description)
+        return description
+
+    def put(self, key: str, description: str):
+        with self._lock:
+            self._remember(key, description)
+        if self._store is not None:
+            self._store.put(key, description)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+            }
+
+    def _remember(self, key: str, description: str):
+        self._memory[key] = description
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+
+@lru_cache(maxsize=None)
+def get_description_cache() -> DescriptionCache:
+    """
+    The description cache shared by all plugins in the process. Set
+    DESCRIPTION_CACHE_PATH to also store descriptions on disk.
+    """
+    path = os.getenv("DESCRIPTION_CACHE_PATH")
+    store = SqliteLruStore(path, 64 * 2**20) if path else None
+    return DescriptionCache(store=store)
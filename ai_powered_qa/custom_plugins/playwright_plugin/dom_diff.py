@@ -0,0 +1,163 @@
+"""
+Structural diff of two cleaned HTML documents (the output of
+`html_cleaner.clean_html`), in a compact form the agent can read instead of
+the whole document: one line per added, removed or changed node, with the
+path of the node.
+
+    ~ html > body > p: text "Loading" -> "Done"
+    ~ html > body > form#signup > select[name=country]: data-playwright-value "" -> "CZ"
+    + html > body > form#signup: <ul><li>Czechia</li></ul>
+    - html > body > div.modal
+"""
+
+from difflib import SequenceMatcher
+from html import escape
+from html.parser import HTMLParser
+
+from .html_cleaner import VOID_ELEMENTS
+
+# Attributes identifying an element among its siblings
+KEY_ATTRIBUTES = ("id", "name", "data-testid", "href", "type")
+
+
+class _Node:
+    __slots__ = ("name", "attrs", "children", "text")
+
+    def __init__(self, name=None, attrs=None, text=None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.children = []
+        self.text = text
+
+    @property
+    def signature(self):
+        if self.name is None:
+            return (None, self.text)
+        return (self.name,) + tuple(self.attrs.get(a) for a in KEY_ATTRIBUTES)
+
+    def label(self) -> str:
+        label = self.name
+        if "id" in self.attrs:
+            label += "#" + self.attrs["id"]
+        elif "class" in self.attrs:
+            label += "".join("." + c for c in self.attrs["class"].split())
+        elif "name" in self.attrs:
+            label += f"[name={self.attrs['name']}]"
+        return label
+
+    def serialize(self) -> str:
+        if self.name is None:
+            return escape(self.text, quote=False)
+        attrs = "".join(
+            f' {name}="{escape(value)}"' for name, value in self.attrs.items()
+        )
+        if self.name in VOID_ELEMENTS and not self.children:
+            return f"<{self.name}{attrs}/>"
+        children = "".join(child.serialize() for child in self.children)
+        return f"<{self.name}{attrs}>{children}</{self.name}>"
+
+
+class _TreeParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("#document")
+        self._stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = _Node(tag, {name: value or "" for name, value in attrs})
+        self._stack[-1].children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self._stack[-1].children.append(
+            _Node(tag, {name: value or "" for name, value in attrs})
+        )
+
+    def handle_endtag(self, tag):
+        for index in range(len(self._stack) - 1, 0, -1):
+            if self._stack[index].name == tag:
+                del self._stack[index:]
+                return
+
+    def handle_data(self, data):
+        # clean_html pretty-prints, the indentation isn't part of the text
+        text = " ".join(data.split())
+        if not text:
+            return
+        children = self._stack[-1].children
+        if children and children[-1].name is None:
+            children[-1].text += " " + text
+        else:
+            children.append(_Node(text=text))
+
+
+def parse(html: str) -> _Node:
+    parser = _TreeParser()
+    parser.feed(html)
+    parser.close()
+    return parser.root
+
+
+def diff_html(old_html: str, new_html: str) -> list[str]:
+    """Returns the changes turning `old_html` into `new_html`, one per line."""
+    changes = []
+    _diff_children(parse(old_html), parse(new_html), [], changes)
+    return changes
+
+
+def _diff_children(old: _Node, new: _Node, path: list[str], changes: list[str]):
+    old_children, new_children = old.children, new.children
+    matcher = SequenceMatcher(
+        None,
+        [child.signature for child in old_children],
+        [child.signature for child in new_children],
+        autojunk=False,
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for old_child, new_child in zip(old_children[i1:i2], new_children[j1:j2]):
+                _diff_nodes(old_child, new_child, path, changes)
+            continue
+        removed, added = old_children[i1:i2], new_children[j1:j2]
+        # Nodes of the same kind at the same place changed rather than being
+        # replaced
+        paired = 0
+        while (
+            paired < min(len(removed), len(added))
+            and removed[paired].name == added[paired].name
+        ):
+            _diff_nodes(removed[paired], added[paired], path, changes)
+            paired += 1
+        removed, added = removed[paired:], added[paired:]
+        for node in removed:
+            changes.append(f"- {_path(path, node)}")
+        for node in added:
+            changes.append(f"+ {_path(path)}: {node.serialize()}")
+
+
+def _diff_nodes(old: _Node, new: _Node, path: list[str], changes: list[str]):
+    if old.name is None:
+        if old.text != new.text:
+            changes.append(f'~ {_path(path)}: text "{old.text}" -> "{new.text}"')
+        return
+    node_path = path + [new.label()]
+    for name in sorted(old.attrs.keys() | new.attrs.keys()):
+        old_value, new_value = old.attrs.get(name), new.attrs.get(name)
+        if old_value == new_value:
+            continue
+        if old_value is None:
+            change = f'{name} added "{new_value}"'
+        elif new_value is None:
+            change = f"{name} removed"
+        else:
+            change = f'{name} "{old_value}" -> "{new_value}"'
+        changes.append(f"~ {' > '.join(node_path)}: {change}")
+    _diff_children(old, new, node_path, changes)
+
+
+def _path(path: list[str], node: _Node | None = None) -> str:
+    labels = list(path)
+    if node is not None:
+        labels.append(node.label() if node.name else f'text "{node.text}"')
+    return " > ".join(labels) or "document"
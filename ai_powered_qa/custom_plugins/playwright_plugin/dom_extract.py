@@ -0,0 +1,150 @@
+"""
+Extracts the cleaned HTML of the visible part of a page in the browser.
+
+`window.extractCleanHtml` walks the DOM once. It marks elements with the same
+data attributes as the `JS_FUNCTIONS` of the plugins (so the selectors
+enhanced with `[data-playwright-visible=true]` keep working) and serializes
+only the visible elements, their ancestors and allow-listed attributes. Only
+the pruned markup is sent to Python, which just pretty-prints it.
+"""
+
+import asyncio
+from inspect import cleandoc
+
+from playwright.async_api import Page
+
+from . import settle
+from .clean_html import ALLOWED_ATTRIBUTES, USELESS_TAGS
+from .html_cleaner import VOID_ELEMENTS, clean_html
+
+JS_FUNCTIONS = cleandoc(
+    """
+    function extractCleanHtml({ allowedAttributes, uselessTags, voidElements, markFocus }) {
+        const allowed = new Set(allowedAttributes);
+        const useless = new Set(uselessTags);
+        const voids = new Set(voidElements);
+        const windowHeight = (window.innerHeight || document.documentElement.clientHeight);
+        const windowWidth = (window.innerWidth || document.documentElement.clientWidth);
+        // Without markFocus, the first element already marked as focused is kept
+        const focusedElement = markFocus
+            ? document.activeElement
+            : document.querySelector('[data-playwright-focused]');
+
+        // Same checks as updateElementVisibility
+        function isVisible(el, style) {
+            const rect = el.getBoundingClientRect();
+            const hasSize = rect.width > 0 && rect.height > 0;
+
+            const verticalOverlap = (rect.top >= 0 && rect.top <= windowHeight)
+                || (rect.bottom >= 0 && rect.bottom <= windowHeight)
+                || (rect.top <= 0 && rect.bottom >= windowHeight);
+            const horizontalOverlap = (rect.left >= 0 && rect.left <= windowWidth)
+                || (rect.right >= 0 && rect.right <= windowWidth)
+                || (rect.left <= 0 && rect.right >= windowWidth);
+
+            return hasSize && verticalOverlap && horizontalOverlap
+                && style.opacity !== '0' && style.visibility !== 'hidden';
+        }
+
+        // Same checks as updateElementScrollability
+        function isScrollable(el, style) {
+            if (el === document.body) {
+                return document.documentElement.scrollHeight > window.innerHeight;
+            }
+            const hasScrollableContent = el.scrollHeight > el.clientHeight;
+            return hasScrollableContent && /(auto|scroll)/.test(style.overflow + style.overflowX);
+        }
+
+        function mark(el, attribute, value) {
+            if (value) {
+                el.setAttribute(attribute, 'true');
+            } else if (el.hasAttribute(attribute)) {
+                el.removeAttribute(attribute);
+            }
+        }
+
+        function escapeText(text) {
+            return text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+        }
+
+        // Marks the element and returns its cleaned markup, or null if neither
+        // the element nor any of its descendants is visible or focused
+        function visit(el) {
+            const style = window.getComputedStyle(el);
+            const visible = isVisible(el, style);
+            mark(el, 'data-playwright-visible', visible);
+            mark(el, 'data-playwright-scrollable', visible && isScrollable(el, style));
+            if (markFocus) {
+                mark(el, 'data-playwright-focused', el === focusedElement);
+            }
+            const tag = el.localName;
+            if (tag === 'input' || tag === 'textarea' || tag === 'select') {
+                el.setAttribute('data-playwright-value', el.value);
+            }
+
+            let keep = visible || el === focusedElement;
+            const isUseless = useless.has(tag);
+            const parts = [];
+            for (const child of el.childNodes) {
+                if (child.nodeType === Node.ELEMENT_NODE) {
+                    const markup = visit(child);
+                    if (markup !== null) {
+                        keep = true;
+                        parts.push(markup);
+                    }
+                } else if (child.nodeType === Node.TEXT_NODE && !isUseless) {
+                    parts.push(escapeText(child.data));
+                }
+            }
+            if (!keep) {
+                return null;
+            }
+            if (isUseless) {
+                // Keeps the ancestors of visible elements, but isn't printed
+                return '';
+            }
+
+            let markup = '<' + tag;
+            for (const attribute of el.attributes) {
+                if (allowed.has(attribute.name)) {
+                    const value = escapeText(attribute.value).replace(/"/g, '&quot;');
+                    markup += ' ' + attribute.name + '="' + value + '"';
+                }
+            }
+            markup += '>';
+            if (!voids.has(tag)) {
+                markup += parts.join('') + '</' + tag + '>';
+            }
+            return markup;
+        }
+
+        const doctype = document.doctype
+            ? new XMLSerializer().serializeToString(document.doctype)
+            : '';
+        return doctype + (visit(document.documentElement) || '');
+    }
+    window.extractCleanHtml = extractCleanHtml;
+    """
+)
+
+
+async def extract_clean_html(
+    page: Page, mark_focus: bool, parser="html.parser", **clean_options
+):
+    """
+    Returns the cleaned HTML of the visible part of the page, formatted the
+    same way as `html_cleaner.clean_html` formats it. With `mark_focus`, the
+    focused element is marked with `data-playwright-focused` and kept. The
+    `clean_options` are passed to `clean_html`.
+    """
+    allowed_attributes = clean_options.get("allowed_attributes", ALLOWED_ATTRIBUTES)
+    options = {
+        "allowedAttributes": sorted(allowed_attributes),
+        "uselessTags": sorted(USELESS_TAGS),
+        "voidElements": sorted(VOID_ELEMENTS),
+        "markFocus": mark_focus,
+    }
+    expression = "options => window.extractCleanHtml(options)"
+    markup = await settle.evaluate(page, expression, options)
+    # Cleaning is CPU-bound, it doesn't block the loop the browser is driven from
+    return await asyncio.to_thread(clean_html, markup, parser=parser, **clean_options)
@@ -0,0 +1,818 @@
+"""
+Cleans the HTML of a page in a single pass over the parser events.
+
+Useless tags, attributes that aren't allow-listed, comments and (optionally)
+invisible elements are dropped while the tree is being built, and the result
+is printed the same way `BeautifulSoup.prettify` prints it. The output is the
+same as the one of `clean_html.clean_with_beautifulsoup` with the default
+"html.parser" parser. The tree can also be printed in more compact formats:
+minified HTML, an indented outline of the elements or Markdown. The "lxml"
+parser is a lot faster, but it fixes up the document structure the way
+browsers do, so its output can be nested differently.
+"""
+
+from html.entities import html5
+from html.parser import HTMLParser
+import json
+import re
+
+from .clean_html import ALLOWED_ATTRIBUTES, USELESS_TAGS, remove_comments
+
+PARSERS = ["html.parser", "lxml"]
+
+OUTPUT_FORMATS = ["pretty", "minified", "outline", "markdown"]
+
+VISIBLE_ATTRIBUTE = "data-playwright-visible"
+FOCUSED_ATTRIBUTE = "data-playwright-focused"
+
+# Elements that are printed as <tag/> when they have no content
+VOID_ELEMENTS = frozenset(
+    [
+        "area",
+        "base",
+        "br",
+        "col",
+        "embed",
+        "hr",
+        "img",
+        "input",
+        "keygen",
+        "link",
+        "menuitem",
+        "meta",
+        "param",
+        "source",
+        "track",
+        "wbr",
+        "basefont",
+        "bgsound",
+        "command",
+        "frame",
+        "image",
+        "isindex",
+        "nextid",
+        "spacer",
+    ]
+)
+
+# The content of these elements is printed as is
+PRESERVE_WHITESPACE_TAGS = frozenset(["pre", "textarea"])
+
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+_NON_WHITESPACE = re.compile(r"\S+")
+
+_WHITESPACE = re.compile(f"[{ASCII_SPACES}]+")
+
+_DOUBLE_SPACES = re.compile(r"(?<=\S)  +")
+
+_BLANK_LINES = re.compile(r"\n\s*\n")
+
+# Attributes printed in the outline, under their outline names
+OUTLINE_ATTRIBUTES = {
+    "role": "role",
+    "type": "type",
+    "name": "name",
+    "aria-label": "label",
+    "placeholder": "placeholder",
+    "href": "href",
+    "value": "value",
+    "data-playwright-value": "value",
+    "disabled": "disabled",
+    "aria-checked": "checked",
+    "aria-selected": "selected",
+    "aria-expanded": "expanded",
+    "data-playwright-focused": "focused",
+}
+
+# Elements that are left out of the outline when they don't have text of
+# their own or any of the outline attributes, their children are printed
+# in their place
+OUTLINE_GENERIC_ELEMENTS = frozenset(
+    [
+        "div",
+        "span",
+        "section",
+        "article",
+        "main",
+        "header",
+        "footer",
+        "aside",
+        "tbody",
+        "thead",
+        "tfoot",
+        "center",
+        "font",
+    ]
+)
+
+MARKDOWN_BLOCK_ELEMENTS = frozenset(
+    [
+        "address",
+        "article",
+        "aside",
+        "blockquote",
+        "body",
+        "dd",
+        "details",
+        "dialog",
+        "div",
+        "dl",
+        "dt",
+        "fieldset",
+        "figcaption",
+        "figure",
+        "footer",
+        "form",
+        "header",
+        "html",
+        "main",
+        "nav",
+        "ol",
+        "p",
+        "section",
+        "summary",
+        "table",
+        "ul",
+    ]
+)
+
+# Whitespace around these elements isn't rendered, so it isn't kept as a space
+# between inline elements either
+BLOCK_ELEMENTS = MARKDOWN_BLOCK_ELEMENTS | frozenset(
+    [
+        "[document]",
+        "br",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "head",
+        "hr",
+        "li",
+        "noscript",
+        "option",
+        "pre",
+        "tbody",
+        "td",
+        "tfoot",
+        "th",
+        "thead",
+        "title",
+        "tr",
+    ]
+)
+
+MARKDOWN_EMPHASIS = {"b": "**", "strong": "**", "i": "*", "em": "*", "code": "`"}
+
+# Form controls are printed as [tag#id attributes: text]
+MARKDOWN_CONTROLS = frozenset(["button", "input", "select", "textarea"])
+
+
+class _Element:
+    __slots__ = ("name", "attrs", "children", "keep", "dropped")
+
+    def __init__(self, name: str, dropped: bool = False):
+        self.name = name
+        self.attrs = {}
+        self.children = []
+        # Whether the element is visible, focused or contains such an element
+        self.keep = False
+        # Useless elements are still tracked to nest the document correctly
+        self.dropped = dropped
+
+
+class _Preformatted(str):
+    """Doctypes, CDATA sections and other markup that's printed verbatim."""
+
+
+class _Comment(str):
+    """
+    Comments are kept in the tree until printing, as removing one also removes
+    the whitespace printed before it.
+    """
+
+
+class _Space(str):
+    """Whitespace between inline elements, collapsed to a single space."""
+
+
+def _collapse_whitespace(text: str) -> str:
+    if text.strip(ASCII_SPACES):
+        return text
+    return "\n" if "\n" in text else " "
+
+
+class _TreeBuilder:
+    """
+    Builds the cleaned tree from parser events. Elements are nested the same
+    way BeautifulSoup nests them: an end tag closes all elements opened after
+    the matching start tag, an end tag without a matching start tag is
+    ignored.
+    """
+
+    def __init__(
+        self,
+        only_visible: bool = False,
+        allowed_attributes: frozenset[str] = ALLOWED_ATTRIBUTES,
+        keep_spaces: bool = False,
+    ):
+        self.root = _Element("[document]")
+        self._stack = [self.root]
+        self._open_counts = {}
+        self._data = []
+        self._preserve_depth = 0
+        self._only_visible = only_visible
+        self._allowed_attributes = allowed_attributes
+        # Whether whitespace between inline elements is kept as a _Space, the
+        # pretty format indents every node instead
+        self._keep_spaces = keep_spaces
+        self._focus_found = False
+        # Whether "<!--" appears outside of comments, e.g. in a tag name
+        self.has_comment_markup = False
+
+    def start(self, name: str, attrs):
+        self._end_data()
+        parent = self._stack[-1]
+        element = _Element(name, parent.dropped or name in USELESS_TAGS)
+        if "<!--" in name:
+            self.has_comment_markup = True
+        if self._only_visible:
+            for key, _ in attrs:
+                if key == VISIBLE_ATTRIBUTE:
+                    element.keep = True
+                elif key == FOCUSED_ATTRIBUTE and not self._focus_found:
+                    # Only the first focused element is kept
+                    self._focus_found = element.keep = True
+        if not element.dropped:
+            element.attrs = {
+                key: "" if value is None else value
+                for key, value in attrs
+                if key in self._allowed_attributes
+            }
+            if "class" in element.attrs:
+                classes = _NON_WHITESPACE.findall(element.attrs["class"])
+                element.attrs["class"] = " ".join(classes)
+            parent.children.append(element)
+
+        self._stack.append(element)
+        self._open_counts[name] = self._open_counts.get(name, 0) + 1
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+
+    def end(self, name: str):
+        self._end_data()
+        if not self._open_counts.get(name):
+            return
+        while self._pop().name != name:
+            pass
+
+    def data(self, text: str):
+        self._data.append(text)
+
+    def comment(self, text: str):
+        self._end_data()
+        if not self._preserve_depth:
+            text = _collapse_whitespace(text)
+        if not self._stack[-1].dropped:
+            self._stack[-1].children.append(_Comment(text))
+
+    def preformatted(self, prefix: str, text: str, suffix: str):
+        self._end_data()
+        if not self._preserve_depth:
+            text = _collapse_whitespace(text)
+        if "<!--" in text:
+            self.has_comment_markup = True
+        if not self._stack[-1].dropped:
+            self._stack[-1].children.append(_Preformatted(prefix + text + suffix))
+
+    def close(self) -> _Element:
+        self._end_data()
+        while len(self._stack) > 1:
+            self._pop()
+        self._trim_spaces(self.root)
+        return self.root
+
+    def _pop(self) -> _Element:
+        element = self._stack.pop()
+        self._open_counts[element.name] -= 1
+        if element.name in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth -= 1
+        self._trim_spaces(element)
+
+        parent = self._stack[-1]
+        if element.keep:
+            parent.keep = True
+        elif self._only_visible and not element.dropped:
+            # Nothing was added to the parent since the element was opened
+            parent.children.pop()
+        return element
+
+    def _end_data(self):
+        if not self._data:
+            return
+        text = "".join(self._data)
+        self._data = []
+        parent = self._stack[-1]
+        if parent.dropped:
+            return
+        # Whitespace is only printed inside <pre> and <textarea>, but it still
+        # makes a void element non-empty
+        if not self._preserve_depth and not text.strip(ASCII_SPACES):
+            if not parent.children and parent.name in VOID_ELEMENTS:
+                parent.children.append("")
+            elif self._keep_spaces:
+                parent.children.append(_Space(" "))
+            return
+        parent.children.append(text)
+
+    def _trim_spaces(self, element: _Element):
+        """
+        Removes the spaces at the start and end of a block element and next to
+        block elements, where a browser doesn't render them either.
+        """
+        if not self._keep_spaces:
+            return
+        children = element.children
+        block = element.name in BLOCK_ELEMENTS
+        element.children = [
+            child
+            for i, child in enumerate(children)
+            if not isinstance(child, _Space)
+            or not (
+                _is_block_boundary(children, i, -1, block)
+                or _is_block_boundary(children, i, 1, block)
+            )
+        ]
+
+
+def _is_block_boundary(children: list, index: int, step: int, block: bool) -> bool:
+    """
+    Whether the space at `index` is redundant in the `step` direction: the
+    nearest sibling there is a block element, whitespace that's printed
+    anyway, or there's none and the parent is a block.
+    """
+    index += step
+    while 0 <= index < len(children):
+        sibling = children[index]
+        if isinstance(sibling, _Element):
+            return sibling.name in BLOCK_ELEMENTS
+        if isinstance(sibling, _Space):
+            # Only the first of several spaces is kept
+            if step < 0:
+                return True
+        elif not isinstance(sibling, _Comment):
+            edge = sibling[-1:] if step < 0 else sibling[:1]
+            return edge in tuple(ASCII_SPACES)
+        index += step
+    return block
+
+
+class _CleaningHTMLParser(HTMLParser):
+    """
+    Translates html.parser events into tree builder calls the same way
+    BeautifulSoup's html.parser tree builder does.
+    """
+
+    def __init__(self, builder: _TreeBuilder):
+        super().__init__(convert_charrefs=False)
+        self._builder = builder
+        # How many void elements of each name were closed without an end tag.
+        # BeautifulSoup keeps a list, which makes every end tag linear in the
+        # number of void elements on the page.
+        self._already_closed_void_elements = {}
+
+    def handle_startendtag(self, name, attrs):
+        self.handle_starttag(name, attrs, handle_void_element=False)
+        self.handle_endtag(name)
+
+    def handle_starttag(self, name, attrs, handle_void_element=True):
+        self._builder.start(name, attrs)
+        if handle_void_element and name in VOID_ELEMENTS:
+            self.handle_endtag(name, check_already_closed=False)
+            closed = self._already_closed_void_elements
+            closed[name] = closed.get(name, 0) + 1
+
+    def handle_endtag(self, name, check_already_closed=True):
+        closed = self._already_closed_void_elements
+        if check_already_closed and closed.get(name):
+            # The end tag of a void element, e.g. </br> after <br>
+            closed[name] -= 1
+        else:
+            self._builder.end(name)
+
+    def handle_data(self, data):
+        self._builder.data(data)
+
+    def handle_charref(self, name):
+        if name[0] in "xX":
+            codepoint = int(name.lstrip("xX"), 16)
+        else:
+            codepoint = int(name)
+
+        data = None
+        if codepoint < 256:
+            try:
+                data = bytearray([codepoint]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(codepoint)
+            except (ValueError, OverflowError):
+                pass
+        self.handle_data(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        character = html5.get(f"{name};")
+        self.handle_data(character if character is not None else f"&{name}")
+
+    def handle_comment(self, data):
+        self._builder.comment(data)
+
+    def handle_decl(self, data):
+        self._builder.preformatted("<!DOCTYPE ", data[len("DOCTYPE ") :], ">\n")
+
+    def unknown_decl(self, data):
+        if data.upper().startswith("CDATA["):
+            self._builder.preformatted("<![CDATA[", data[len("CDATA[") :], "]]>")
+        else:
+            self._builder.preformatted("<?", data, "?>")
+
+    def handle_pi(self, data):
+        self._builder.preformatted("<?", data, ">")
+
+
+class _LxmlTarget:
+    """Feeds lxml parser events to the tree builder."""
+
+    def __init__(self, builder: _TreeBuilder):
+        self._builder = builder
+
+    def start(self, tag, attrib):
+        self._builder.start(tag, attrib.items())
+
+    def end(self, tag):
+        self._builder.end(tag)
+
+    def data(self, data):
+        self._builder.data(data)
+
+    def comment(self, text):
+        self._builder.comment(text)
+
+    def doctype(self, name, pubid, system):
+        declaration = name or ""
+        if pubid:
+            declaration += f' PUBLIC "{pubid}"'
+        if system:
+            declaration += f' "{system}"' if pubid else f' SYSTEM "{system}"'
+        self._builder.preformatted("<!DOCTYPE ", declaration, ">\n")
+
+    def pi(self, target, data=None):
+        self._builder.preformatted("<?", f"{target} {data}" if data else target, ">")
+
+    def close(self):
+        return self._builder.close()
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _format_start_tag(element: _Element, void: bool) -> str:
+    attributes = []
+    for key, value in sorted(element.attrs.items()):
+        value = _escape(value)
+        if '"' not in value:
+            attributes.append(f' {key}="{value}"')
+        elif "'" not in value:
+            attributes.append(f" {key}='{value}'")
+        else:
+            value = value.replace('"', "&quot;")
+            attributes.append(f' {key}="{value}"')
+    return f"<{element.name}{''.join(attributes)}{'/' if void else ''}>"
+
+
+def _strip_trailing_whitespace(pieces: list):
+    while pieces:
+        stripped = pieces[-1].rstrip()
+        if stripped:
+            pieces[-1] = stripped
+            return
+        pieces.pop()
+
+
+def _prettify(root: _Element, has_comment_markup: bool = False) -> str:
+    """
+    Prints the tree the same way `BeautifulSoup.prettify` followed by
+    `clean_html.remove_comments` would. Comments are dropped while printing,
+    unless `has_comment_markup`, in which case they are printed and removed
+    with the same regex as before, to stay equivalent.
+    """
+    pieces = []
+    level = 0
+    # The <pre> or <textarea> being printed, its content isn't indented
+    literal = None
+    stack = [iter(root.children)]
+    open_elements = []
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            if not stack:
+                break
+            element = open_elements.pop()
+            level -= 1
+            tag = f"</{element.name}>"
+            if element is literal:
+                literal = None
+                pieces.append(tag + "\n")
+            elif literal is not None:
+                pieces.append(tag)
+            else:
+                pieces.append(" " * level + tag + "\n")
+        elif isinstance(child, _Element):
+            void = not child.children and child.name in VOID_ELEMENTS
+            tag = _format_start_tag(child, void)
+            if literal is not None:
+                pieces.append(tag)
+            elif void:
+                pieces.append(" " * level + tag + "\n")
+            elif child.name in PRESERVE_WHITESPACE_TAGS:
+                literal = child
+                pieces.append(" " * level + tag)
+            else:
+                pieces.append(" " * level + tag + "\n")
+            if not void:
+                level += 1
+                open_elements.append(child)
+                stack.append(iter(child.children))
+        elif isinstance(child, _Comment) and not has_comment_markup:
+            # remove_comments drops the comment with the whitespace before it
+            _strip_trailing_whitespace(pieces)
+            if literal is None:
+                pieces.append("\n")
+        else:
+            if isinstance(child, _Comment):
+                text = f"<!--{child}-->"
+            elif isinstance(child, _Preformatted):
+                text = child
+            else:
+                text = _escape(child)
+            if literal is not None:
+                pieces.append(text)
+            else:
+                text = text.strip()
+                if text:
+                    pieces.append(" " * level + text + "\n")
+
+    html = "".join(pieces)
+    if has_comment_markup:
+        html = remove_comments(html)
+    return html
+
+
+def _text(text: str) -> str:
+    """Text outside of <pre> and <textarea>, with its whitespace collapsed."""
+    return _WHITESPACE.sub(" ", text)
+
+
+def _minify(root: _Element) -> str:
+    """Prints the tree without indentation, collapsing whitespace in text."""
+    pieces = []
+    # How many <pre> and <textarea> elements are being printed
+    literal = 0
+    stack = [iter(root.children)]
+    open_elements = []
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            if not stack:
+                break
+            element = open_elements.pop()
+            if element.name in PRESERVE_WHITESPACE_TAGS:
+                literal -= 1
+            pieces.append(f"</{element.name}>")
+        elif isinstance(child, _Element):
+            void = not child.children and child.name in VOID_ELEMENTS
+            pieces.append(_format_start_tag(child, void))
+            if not void:
+                if child.name in PRESERVE_WHITESPACE_TAGS:
+                    literal += 1
+                open_elements.append(child)
+                stack.append(iter(child.children))
+        elif isinstance(child, _Comment):
+            continue
+        elif isinstance(child, _Preformatted):
+            pieces.append(child if literal else child.strip())
+        else:
+            pieces.append(_escape(child if literal else _text(child)))
+    return "".join(pieces).strip() + "\n"
+
+
+def _outline_line(element: _Element, text: str) -> str | None:
+    """
+    Returns the outline of the element, or None if it's a generic element
+    with nothing worth printing.
+    """
+    attributes = []
+    for key, value in element.attrs.items():
+        name = OUTLINE_ATTRIBUTES.get(key)
+        if name:
+            attributes.append(f"{name}={json.dumps(value)}" if value else name)
+    if not (attributes or text or "id" in element.attrs) and (
+        element.name in OUTLINE_GENERIC_ELEMENTS
+    ):
+        return None
+    line = element.name
+    if "id" in element.attrs:
+        line += "#" + element.attrs["id"]
+    if attributes:
+        line += " " + " ".join(attributes)
+    if text:
+        line += " " + json.dumps(text)
+    return line
+
+
+def _outline(root: _Element) -> str:
+    """
+    Prints one line per element, indented by its depth: the tag, the id,
+    the role, name, value and state attributes, and the text of elements
+    that only contain text. Other text is printed on lines of its own.
+    """
+    lines = []
+    stack = [(iter(root.children), 0)]
+    while stack:
+        child = next(stack[-1][0], None)
+        depth = stack[-1][1]
+        if child is None:
+            stack.pop()
+        elif isinstance(child, _Element):
+            children = [c for c in child.children if not isinstance(c, _Comment)]
+            only_text = all(isinstance(c, str) for c in children)
+            text = _text(" ".join(children)).strip() if only_text else ""
+            line = _outline_line(child, text)
+            if line is not None:
+                lines.append(" " * depth + line)
+            if not only_text:
+                stack.append((iter(children), depth if line is None else depth + 1))
+        elif not isinstance(child, (_Comment, _Preformatted)):
+            text = _text(child).strip()
+            if text:
+                lines.append(" " * depth + json.dumps(text))
+    return "\n".join(lines) + "\n"
+
+
+class _MarkdownWriter:
+    """Renders the tree as Markdown, keeping links and form controls."""
+
+    def __init__(self):
+        self._list_depth = 0
+
+    def render(self, root: _Element) -> str:
+        lines = []
+        fenced = False
+        for line in self._children(root).split("\n"):
+            if line == "```":
+                fenced = not fenced
+            elif not fenced:
+                stripped = line.strip()
+                # Only list items are indented
+                if stripped.startswith("- "):
+                    stripped = line[: len(line) - len(line.lstrip())] + stripped
+                line = _DOUBLE_SPACES.sub(" ", stripped)
+            if line or fenced or (lines and lines[-1]):
+                lines.append(line)
+        return "\n".join(lines).strip() + "\n"
+
+    def _children(self, element: _Element) -> str:
+        return "".join(self._node(child) for child in element.children)
+
+    def _inline(self, element: _Element) -> str:
+        return _text(self._children(element)).strip()
+
+    def _node(self, node) -> str:
+        if isinstance(node, (_Comment, _Preformatted)):
+            return ""
+        if not isinstance(node, _Element):
+            return _text(node)
+        name = node.name
+        if name in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            return f"\n\n{'#' * int(name[1])} {self._inline(node)}\n\n"
+        if name == "pre":
+            return f"\n\n```\n{self._literal(node)}\n```\n\n"
+        if name in MARKDOWN_CONTROLS:
+            return self._control(node)
+        if name == "li":
+            content = _BLANK_LINES.sub("\n", self._children(node).strip())
+            indentation = "  " * max(self._list_depth - 1, 0)
+            return f"\n{indentation}- {content}\n"
+        if name in ("ul", "ol"):
+            self._list_depth += 1
+            content = self._children(node)
+            self._list_depth -= 1
+            return f"\n{content}\n" if self._list_depth else f"\n\n{content}\n\n"
+        if name == "tr":
+            cells = [
+                self._inline(cell)
+                for cell in node.children
+                if isinstance(cell, _Element)
+            ]
+            return "\n| " + " | ".join(cells) + " |"
+        if name == "br":
+            return "\n"
+        if name == "hr":
+            return "\n\n---\n\n"
+        if name == "a":
+            text = self._inline(node)
+            href = node.attrs.get("href")
+            return f"[{text}]({href})" if href else text
+        if name in MARKDOWN_EMPHASIS:
+            text = self._inline(node)
+            mark = MARKDOWN_EMPHASIS[name]
+            return f"{mark}{text}{mark}" if text else ""
+        if name in MARKDOWN_BLOCK_ELEMENTS:
+            return f"\n\n{self._children(node)}\n\n"
+        return self._children(node)
+
+    def _literal(self, element: _Element) -> str:
+        pieces = []
+        for child in element.children:
+            if isinstance(child, _Element):
+                pieces.append(self._literal(child))
+            elif not isinstance(child, _Comment):
+                pieces.append(child)
+        return "".join(pieces).strip("\n")
+
+    def _control(self, element: _Element) -> str:
+        label = element.name
+        if "id" in element.attrs:
+            label += "#" + element.attrs["id"]
+        for key in ("type", "name", "placeholder", "value", "data-playwright-value"):
+            if element.attrs.get(key):
+                label += f" {OUTLINE_ATTRIBUTES[key]}={json.dumps(element.attrs[key])}"
+        if "disabled" in element.attrs:
+            label += " disabled"
+        if element.name == "textarea":
+            text = self._literal(element).strip()
+        elif element.name == "select":
+            options = [
+                self._inline(option)
+                for option in element.children
+                if isinstance(option, _Element)
+            ]
+            text = ", ".join(option for option in options if option)
+        else:
+            text = self._inline(element)
+        return f" [{label}: {text}] " if text else f" [{label}] "
+
+
+def clean_html(
+    html: str,
+    only_visible: bool = False,
+    parser="html.parser",
+    output_format="pretty",
+    allowed_attributes: frozenset[str] = ALLOWED_ATTRIBUTES,
+) -> str:
+    """
+    Cleans the web page HTML content from irrelevant tags, attributes and
+    comments. With `only_visible`, only elements marked with the
+    `data-playwright-visible` attribute, the focused element and their
+    ancestors are kept.
+
+    :param str parser: "html.parser" or "lxml" (needs the lxml package)
+    :param str output_format: "pretty" (`BeautifulSoup.prettify`), "minified",
+        "outline" or "markdown"
+    :param allowed_attributes: the attributes that are kept
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unknown output format: {output_format}, use one of {OUTPUT_FORMATS}"
+        )
+    builder = _TreeBuilder(
+        only_visible, allowed_attributes, output_format in ("minified", "markdown")
+    )
+    if parser == "html.parser":
+        html_parser = _CleaningHTMLParser(builder)
+        html_parser.feed(html)
+        html_parser.close()
+        root = builder.close()
+    elif parser == "lxml":
+        from lxml import etree
+
+        lxml_parser = etree.HTMLParser(target=_LxmlTarget(builder))
+        lxml_parser.feed(html)
+        root = lxml_parser.close()
+    else:
+        raise ValueError(f"Unknown parser: {parser}, use one of {PARSERS}")
+    if output_format == "minified":
+        return _minify(root)
+    if output_format == "outline":
+        return _outline(root)
+    if output_format == "markdown":
+        return _MarkdownWriter().render(root)
+    return _prettify(root, builder.has_comment_markup)
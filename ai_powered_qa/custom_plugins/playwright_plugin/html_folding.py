@@ -0,0 +1,220 @@
+"""
+Folds runs of repeated siblings in cleaned HTML (the output of
+`html_cleaner.clean_html`). Product grids, tables and feeds repeat the same
+markup with different content hundreds of times, which costs tokens without
+telling the model much more than the first few items do. A run of sibling
+subtrees of the same shape (tags and attribute names, not their values or
+text) keeps its first items and the rest is replaced with one line:
+
+    ... 47 more <li> like the above (fold 2): "Item 4", "Item 5", "Item 6", ...
+
+A run can also repeat a group of siblings, e.g. the rows of a table where
+each item spans two rows. The folded HTML is kept by fold number, so that it
+can be shown on demand.
+"""
+
+import re
+
+from .html_cleaner import VOID_ELEMENTS
+
+# A line of pretty-printed HTML holding only an opening or a closing tag
+TAG_LINE = re.compile(r"<(/?)([^\s/>]+)[^>]*?(/?)>")
+
+ATTRIBUTE_NAME = re.compile(r"\s([^\s=/>]+)=")
+
+# The content of these elements is printed as is, over any number of lines
+LITERAL_START = re.compile(r"<(pre|textarea)[\s>]")
+
+# Number of siblings in the longest repeated group that is folded
+MAX_PERIOD = 3
+
+# Length of the samples of the folded text in the fold line
+SAMPLE_LENGTH = 40
+
+
+class _Node:
+    __slots__ = ("start", "end", "name", "children", "_shape")
+
+    def __init__(self, start: int, name: str | None):
+        self.start = start
+        self.end = start + 1
+        # None for text
+        self.name = name
+        # None for nodes without children lines
+        self.children = None
+        self._shape = None
+
+    def shape(self, lines: list[str], shapes: dict[tuple, int]) -> int:
+        """
+        Returns the number of the shape of the subtree in `shapes`, so that
+        subtrees are compared by comparing numbers.
+        """
+        if self._shape is None:
+            if self.name is None:
+                shape = ("#text",)
+            else:
+                attributes = tuple(ATTRIBUTE_NAME.findall(lines[self.start]))
+                children = tuple(
+                    child.shape(lines, shapes) for child in self.children or ()
+                )
+                shape = (self.name, attributes, children)
+            self._shape = shapes.setdefault(shape, len(shapes))
+        return self._shape
+
+
+def _parse(lines: list[str]) -> _Node:
+    root = _Node(-1, "[document]")
+    root.children = []
+    stack = [root]
+    number = 0
+    while number < len(lines):
+        stripped = lines[number].lstrip()
+        node = None
+        literal = LITERAL_START.match(stripped)
+        match = TAG_LINE.fullmatch(stripped)
+        if literal:
+            node = _Node(number, literal[1])
+            closing_tag = f"</{literal[1]}>"
+            while number < len(lines) - 1 and not lines[number].endswith(closing_tag):
+                number += 1
+            node.end = number + 1
+        elif match and match[1]:
+            # Closes the matching element and all elements opened after it
+            for index in range(len(stack) - 1, 0, -1):
+                if stack[index].name == match[2]:
+                    for element in stack[index + 1 :]:
+                        element.end = number
+                    stack[index].end = number + 1
+                    del stack[index:]
+                    break
+            else:
+                node = _Node(number, None)
+        elif match and not match[3] and match[2] not in VOID_ELEMENTS:
+            node = _Node(number, match[2])
+            node.children = []
+            stack[-1].children.append(node)
+            stack.append(node)
+            node = None
+        elif match:
+            node = _Node(number, match[2])
+        else:
+            node = _Node(number, None)
+        if node is not None:
+            stack[-1].children.append(node)
+        number += 1
+    for element in stack[1:]:
+        element.end = len(lines)
+    return root
+
+
+def fold_html(html: str, keep: int = 3, min_run: int = 6) -> tuple[str, dict[int, str]]:
+    """
+    Folds runs of at least `min_run` repeated siblings (or groups of
+    siblings), keeping the first `keep`. Returns the folded HTML and the HTML
+    of each fold by its number.
+    """
+    lines = html.splitlines()
+    folder = _Folder(lines, keep, max(min_run, keep + 1))
+    for child in _parse(lines).children:
+        folder.emit(child)
+    if not folder.folds:
+        return html, {}
+    folded = "\n".join(folder.output)
+    if html.endswith("\n"):
+        folded += "\n"
+    return folded, folder.folds
+
+
+class _Folder:
+    def __init__(self, lines: list[str], keep: int, min_run: int):
+        self.lines = lines
+        self.keep = keep
+        self.min_run = min_run
+        self.output = []
+        self.folds = {}
+        self.shapes = {}
+
+    def emit(self, node: _Node):
+        if node.children is None:
+            self.output.extend(self.lines[node.start : node.end])
+            return
+        self.output.append(self.lines[node.start])
+        self.emit_children(node.children)
+        # The closing tag, if the element has one
+        if node.end - 1 > node.start and (
+            not node.children or node.children[-1].end < node.end
+        ):
+            self.output.append(self.lines[node.end - 1])
+
+    def emit_children(self, children: list[_Node]):
+        index = 0
+        while index < len(children):
+            period, repeats = self._find_run(children, index)
+            if repeats < self.min_run:
+                self.emit(children[index])
+                index += 1
+                continue
+            end = index + period * repeats
+            kept_end = index + period * self.keep
+            for child in children[index:kept_end]:
+                self.emit(child)
+            self._fold(children[kept_end:end], period, repeats - self.keep)
+            index = end
+
+    def _find_run(self, children: list[_Node], index: int) -> tuple[int, int]:
+        """Returns the period and the number of repeats of the run at index."""
+        best_period, best_repeats = 1, 1
+        for period in range(1, MAX_PERIOD + 1):
+            unit = children[index : index + period]
+            if len(unit) < period:
+                break
+            if all(node.name is None for node in unit):
+                continue
+            shapes = [node.shape(self.lines, self.shapes) for node in unit]
+            repeats = 1
+            while all(
+                start < len(children)
+                and children[start].shape(self.lines, self.shapes) == shape
+                for start, shape in zip(
+                    range(index + repeats * period, index + (repeats + 1) * period),
+                    shapes,
+                )
+            ):
+                repeats += 1
+            if repeats * period > best_repeats * best_period:
+                best_period, best_repeats = period, repeats
+        return best_period, best_repeats
+
+    def _fold(self, nodes: list[_Node], period: int, repeats: int):
+        number = len(self.folds) + 1
+        folded = self.lines[nodes[0].start : nodes[-1].end]
+        indentation = len(folded[0]) - len(folded[0].lstrip())
+        self.folds[number] = "\n".join(
+            # Lines in <pre> may be indented less
+            line[indentation:] if line[:indentation].isspace() else line
+            for line in folded
+        )
+
+        tags = ", ".join(f"<{node.name}>" for node in nodes[:period] if node.name)
+        if period > 1:
+            tags = f"groups of {tags}"
+        samples = []
+        for unit in range(0, len(nodes), period):
+            text = self._first_text(nodes[unit : unit + period])
+            if text:
+                samples.append(f'"{text}"')
+            if len(samples) == 3:
+                break
+        summary = f"... {repeats} more {tags} like the above (fold {number})"
+        if samples:
+            summary += ": " + ", ".join(samples) + ", ..."
+        self.output.append(" " * indentation + summary)
+
+    def _first_text(self, nodes: list[_Node]) -> str | None:
+        for line in self.lines[nodes[0].start : nodes[-1].end]:
+            text = line.strip()
+            if text and not TAG_LINE.fullmatch(text):
+                if len(text) > SAMPLE_LENGTH:
+                    text = text[: SAMPLE_LENGTH - 3] + "..."
+                return text
+        return None
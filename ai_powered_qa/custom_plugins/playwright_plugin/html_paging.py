@@ -1,17 +1,140 @@
+import asyncio
+import hashlib
 from inspect import cleandoc
+from typing import Literal
+import warnings
 
+from bs4 import BeautifulSoup
+from pydantic import model_validator
+from soupsieve import SelectorSyntaxError
+
+from ai_powered_qa import config
 from ai_powered_qa.components.plugin import tool
+from ai_powered_qa.components.utils import count_tokens
 
 from . import base
+from .html_folding import TAG_LINE
+from .pipeline import Stage, run_pipeline
+
+# Rough number of characters of HTML per token, to convert the deprecated
+# `html_part_length`
+CHARACTERS_PER_TOKEN = 4
+
+
+def fingerprint(html: str) -> str:
+    return hashlib.sha1(html.encode()).hexdigest()
+
+
+class HtmlPageIndex:
+    """
+    Splits cleaned, pretty-printed HTML into parts of about `max_tokens`
+    tokens, between nodes. Each part starts with the opening tags of the
+    elements it's nested in and ends with their closing tags, so it reads as
+    a fragment of the whole document.
+    """
+
+    def __init__(self, html: str, max_tokens: int, model: str = config.MODEL_DEFAULT):
+        self.html = html
+        self.fingerprint = fingerprint(html)
+        self._lines = html.splitlines()
+        # (first line, end line, open elements at the start, open at the end),
+        # the open elements as (line, tag name)
+        self._parts: list[tuple[int, int, list, list]] = []
+        self._build(max_tokens, model)
+
+    def __len__(self) -> int:
+        return len(self._parts)
+
+    def _build(self, max_tokens: int, model: str):
+        line_tokens = [count_tokens(line, model) + 1 for line in self._lines]
+        open_elements = []
+        start, start_open_elements = 0, []
+        tokens = 0
+        for number, line in enumerate(self._lines):
+            stripped = line.lstrip()
+            if (
+                number > start
+                and tokens + line_tokens[number] > max_tokens
+                and not stripped.startswith("</")
+            ):
+                self._parts.append(
+                    (start, number, start_open_elements, list(open_elements))
+                )
+                start, start_open_elements = number, list(open_elements)
+                tokens = sum(line_tokens[line] for line, _ in open_elements)
+            tokens += line_tokens[number]
+
+            match = TAG_LINE.fullmatch(stripped)
+            if not match:
+                continue
+            closing, name, self_closing = match.groups()
+            if closing:
+                # Pops up to the matching element, if it's open
+                for index in range(len(open_elements) - 1, -1, -1):
+                    if open_elements[index][1] == name:
+                        del open_elements[index:]
+                        break
+            elif not self_closing:
+                open_elements.append((number, name))
+        self._parts.append((start, len(self._lines), start_open_elements, []))
+
+    def part(self, number: int) -> str:
+        """Returns the part with the given number, starting at 1."""
+        start, end, start_open_elements, end_open_elements = self._parts[number - 1]
+        lines = [self._lines[line] for line, _ in start_open_elements]
+        lines.extend(self._lines[start:end])
+        for line, name in reversed(end_open_elements):
+            indentation = self._lines[line][: -len(self._lines[line].lstrip())]
+            lines.append(f"{indentation}</{name}>")
+        return "\n".join(lines)
+
+    def part_of_line(self, line: int) -> int:
+        """Returns the number of the part containing the line (starting at 0)."""
+        for number, (start, end, _, _) in enumerate(self._parts, start=1):
+            if start <= line < end:
+                return number
+        return len(self._parts)
+
+    def find(self, selector: str) -> int | None:
+        """
+        Returns the number of the part containing the first element matching
+        the CSS selector, or None if there's no such element.
+        """
+        soup = BeautifulSoup(self.html, "html.parser")
+        element = soup.select_one(selector)
+        if element is None or element.sourceline is None:
+            return None
+        return self.part_of_line(element.sourceline - 1)
 
 
 class PlaywrightPluginHtmlPaging(base.PlaywrightPlugin):
     name: str = "PlaywrightPluginHtmlPaging"
-    html_part_length: int = 15000
+    # Token budget of one HTML part
+    html_part_tokens: int = 4000
+    # The whole page is shown part by part instead
+    fold_repeated: bool = False
+    # Parts are split between the lines of the pretty-printed HTML, the other
+    # formats print a page on a single line or drop the tags
+    html_format: Literal["pretty"] = "pretty"
 
     def __init__(self, **data):
         super().__init__(**data)
         self._part = 1
+        self._index = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _convert_html_part_length(cls, data):
+        if isinstance(data, dict) and "html_part_length" in data:
+            warnings.warn(
+                "html_part_length is deprecated, use html_part_tokens instead",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+            data = dict(data)
+            length = data.pop("html_part_length")
+            data.setdefault("html_part_tokens", max(length // CHARACTERS_PER_TOKEN, 1))
+        return data
 
     @property
     def system_message(self):
@@ -22,24 +145,25 @@ class PlaywrightPluginHtmlPaging(base.PlaywrightPlugin):
 
             The HTML content is too long to display in one go. The content has
             been split into multiple parts. Use the `move_to_html_part` tool to
-            move between parts of the HTML content.
+            move between parts of the HTML content, or the
+            `move_to_html_part_with_selector` tool to move to the part
+            containing a given element.
             """
         )
 
-    @property
-    def context_message(self):
-        try:
-            html = self._run_async(self._get_page_content())
-            html, max_parts = self._get_html_part(html)
-        except base.PageNotLoadedException:
-            html = "No page loaded yet."
-            max_parts = 1
-            description = "The browser is empty"
-        else:
-            description = self._get_html_description(html)
-        self._run_async(self._screenshot())
+    async def _aget_context_message(self):
+        self._timings = {}
+        await self._ensure_page()
+        stages = {
+            "html_part": Stage(self._get_html_part),
+            "description": Stage(self._describe_html_part, ("html_part",)),
+        }
+        if self.take_screenshot:
+            stages["screenshot"] = Stage(self._screenshot)
+        results = await run_pipeline(stages, self._timings)
+        html, max_parts = results["html_part"]
         context_message_main = base.CONTEXT_TEMPLATE.format(
-            html=html, description=description
+            html=html or "No page loaded yet.", description=results["description"]
         )
         return cleandoc(
             f"""
@@ -49,7 +173,29 @@ class PlaywrightPluginHtmlPaging(base.PlaywrightPlugin):
             """
         )
 
-    @tool
+    async def _get_html_part(self) -> tuple[str | None, int]:
+        """The current HTML part and the number of parts."""
+        try:
+            index = self._get_index(self._fold(await self._get_page_content()))
+        except base.PageNotLoadedException:
+            return None, 1
+        # The page may have fewer parts than before
+        self._part = max(1, min(self._part, len(index)))
+        return index.part(self._part), len(index)
+
+    async def _describe_html_part(self, html_part: tuple[str | None, int]) -> str:
+        html, _ = html_part
+        if html is None:
+            return "The browser is empty"
+        return await asyncio.to_thread(self._get_html_description, html)
+
+    def _get_index(self, html: str) -> HtmlPageIndex:
+        # Split only once per version of the page
+        if self._index is None or self._index.fingerprint != fingerprint(html):
+            self._index = HtmlPageIndex(html, self.html_part_tokens)
+        return self._index
+
+    @tool(serial=True)
     def move_to_html_part(self, part: int):
         """
         Moves to the HTML part at the given index. We split the HTML content of the website
@@ -60,22 +206,25 @@ class PlaywrightPluginHtmlPaging(base.PlaywrightPlugin):
         self._part = part
         return f"Moved to HTML part {self._part}"
 
-    def _get_html_part(self, html: str) -> str:
+    @tool(serial=True)
+    def move_to_html_part_with_selector(self, selector: str):
         """
-        Splits the HTML content into parts of about self.part_length characters.
-        Always performs a split at a tag start character.
-        After HTML is split it returns the part at intex self._part
-        We split the HTML content into parts to avoid reaching the token limit
+        Moves to the HTML part containing the first element matching a CSS selector
+
+        :param str selector: CSS selector of the element
         """
-        if len(html) < self.html_part_length:
-            return html, 1
-        parts = []
-        current_part = ""
-        for char in html:
-            if char == "<" and len(current_part) > self.html_part_length:
-                parts.append(current_part)
-                current_part = "<"
-            else:
-                current_part += char
-        parts.append(current_part)
-        return parts[self._part - 1], len(parts)
+        return self._run_async(self._move_to_html_part_with_selector(selector))
+
+    async def _move_to_html_part_with_selector(self, selector: str):
+        try:
+            index = self._get_index(self._fold(await self._get_page_content()))
+        except base.PageNotLoadedException:
+            return "No page loaded yet."
+        try:
+            part = index.find(selector)
+        except SelectorSyntaxError:
+            return f"'{selector}' is not a valid CSS selector."
+        if part is None:
+            return f"No element matches '{selector}'."
+        self._part = part
+        return f"Moved to HTML part {self._part}"
@@ -1,14 +1,13 @@
 from inspect import cleandoc
-import logging
-
-from bs4 import BeautifulSoup
-import playwright.async_api
-from playwright.async_api import Error
+from typing import ClassVar
 
+from ai_powered_qa import config
 from ai_powered_qa.components.plugin import tool
 
-from . import clean_html
-from .base import PageNotLoadedException, PlaywrightPlugin
+from . import dom_extract
+from .base import PageNotLoadedException, PlaywrightPlugin, build_observe_script
+from .html_cleaner import clean_html
+from .settle import settle_after
 
 JS_FUNCTIONS = cleandoc(
     """
@@ -104,41 +103,35 @@ JS_FUNCTIONS = cleandoc(
 
 class PlaywrightPluginOnlyVisible(PlaywrightPlugin):
     name: str = "PlaywrightPluginOnlyVisible"
+    # Prune and serialize the page in the browser instead of cleaning the
+    # whole page.content() in Python
+    in_browser_extraction: bool = False
+
+    init_scripts: ClassVar[tuple[str, ...]] = (JS_FUNCTIONS, dom_extract.JS_FUNCTIONS)
+
+    observe_script: ClassVar[str] = build_observe_script(
+        "window.updateElementVisibility();"
+        " window.updateElementScrollability();"
+        " window.setValueAsDataAttribute();"
+    )
 
     async def _get_page_content(self):
         page = await self._ensure_page()
         if page.url == "about:blank":
             raise PageNotLoadedException("No page loaded yet.")
-        try:
-            await page.evaluate("window.updateElementVisibility()")
-            await page.evaluate("window.updateElementScrollability()")
-            await page.evaluate("window.setValueAsDataAttribute()")
-        except Error as e:
-            if (
-                e.message
-                == "Execution context was destroyed, most likely because of a navigation"
-            ):
-                logging.warning("Execution context was destroyed")
-                await page.wait_for_url(page.url, wait_until="domcontentloaded")
-                await page.evaluate("window.updateElementVisibility()")
-                await page.evaluate("window.updateElementScrollability()")
-                await page.evaluate("window.setValueAsDataAttribute()")
-            else:
-                raise e
-        html = await page.content()
-        html_clean = self._clean_html(html)
-        return html_clean
-
-    async def _ensure_page(self) -> playwright.async_api.Page:
-        if not self._page:
-            self._playwright = await playwright.async_api.async_playwright().start()
-            self._browser = await self._playwright.chromium.launch(headless=False)
-            browser_context = await self._browser.new_context()
-            await browser_context.add_init_script(JS_FUNCTIONS)
-            self._page = await browser_context.new_page()
-        return self._page
-
-    @tool
+        if self.in_browser_extraction:
+            if self.element_ids:
+                await self._assign_element_ids(page)
+            return await dom_extract.extract_clean_html(
+                page,
+                mark_focus=False,
+                parser=config.HTML_PARSER,
+                **self._clean_options(),
+            )
+        html = (await self._observe(page))["html"]
+        return await self._aclean_html(html, **self._clean_options())
+
+    @tool(serial=True)
     def scroll(self, selector: str, direction: str):
         """
         Scroll up or down in a selected scroll container
@@ -148,12 +141,14 @@ class PlaywrightPluginOnlyVisible(PlaywrightPlugin):
         """
         return self._run_async(self._scroll(selector, direction))
 
+    @settle_after
     async def _scroll(self, selector: str, direction: str):
         page = await self._ensure_page()
         try:
             # Get viewport dimensions
-            window_height = await page.evaluate("window.innerHeight")
-            window_width = await page.evaluate("window.innerWidth")
+            viewport = await self._get_viewport(page)
+            window_height = viewport["height"]
+            window_width = viewport["width"]
 
             # Get element's bounding box
             bounds = await page.locator(selector).bounding_box()
@@ -191,18 +186,17 @@ class PlaywrightPluginOnlyVisible(PlaywrightPlugin):
         return f"Scrolled successfully."
 
     @staticmethod
-    def _clean_html(html: str) -> str:
+    def _clean_html(html: str, **options) -> str:
         """
         Cleans the web page HTML content from irrelevant tags and attributes
         to save tokens.
         """
-        soup = BeautifulSoup(html, "html.parser")
-        clean_html.remove_invisible(soup)
-        clean_html.remove_useless_tags(soup)
-        clean_html.clean_attributes(soup)
-        html_clean = soup.prettify()
-        html_clean = clean_html.remove_comments(html_clean)
-        return html_clean
+        return clean_html(
+            html,
+            only_visible=True,
+            parser=config.HTML_PARSER,
+            **options,
+        )
 
     def _enhance_selector(self, selector):
         return _selector_visible(selector)
@@ -0,0 +1,68 @@
+"""
+Runs the stages of an observation of a page as a dependency graph. Each stage
+starts as soon as the stages it depends on are done, so independent stages
+(e.g. the screenshot and the description of the HTML) run concurrently. A
+stage that isn't needed is simply left out of the graph.
+
+    results = await run_pipeline(
+        {
+            "screenshot": Stage(take_screenshot),
+            "page_content": Stage(get_page_content),
+            "description": Stage(describe, ("page_content",)),
+        },
+        timings,
+    )
+"""
+
+import asyncio
+from graphlib import TopologicalSorter
+import time
+from typing import Any, Awaitable, Callable, NamedTuple
+
+
+class Stage(NamedTuple):
+    # Called with the results of the dependencies as keyword arguments
+    function: Callable[..., Awaitable[Any]]
+    dependencies: tuple[str, ...] = ()
+
+
+async def run_pipeline(
+    stages: dict[str, Stage], timings: dict[str, float]
+) -> dict[str, Any]:
+    """
+    Runs the stages, each once its dependencies are done, and returns their
+    results by name. The seconds each stage took, not counting the wait for
+    its dependencies, are recorded in `timings`. If a stage fails, the others
+    are cancelled and the exception is raised.
+    """
+    graph = {name: stage.dependencies for name, stage in stages.items()}
+    for name, dependencies in graph.items():
+        for dependency in dependencies:
+            if dependency not in stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+    # Raises CycleError for circular dependencies
+    order = list(TopologicalSorter(graph).static_order())
+
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def run(name: str, stage: Stage):
+        results = {
+            dependency: await tasks[dependency] for dependency in stage.dependencies
+        }
+        start = time.perf_counter()
+        try:
+            return await stage.function(**results)
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    for name in order:
+        tasks[name] = asyncio.ensure_future(run(name, stages[name]))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        # Lets the cancelled stages finish before the exception propagates
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return {name: task.result() for name, task in tasks.items()}
@@ -0,0 +1,111 @@
+"""
+A process-wide event loop running in a background thread, shared by all the
+Playwright plugins. Playwright objects are bound to the loop that created
+them, so every coroutine touching the browser is submitted to this loop, from
+any thread, and only one Playwright driver process is started.
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+from functools import lru_cache
+import threading
+from typing import Any, Coroutine
+
+import playwright.async_api
+
+
+class PlaywrightRuntime:
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="playwright-runtime", daemon=True
+        )
+        self._thread.start()
+        self._playwright: playwright.async_api.Playwright | None = None
+        self._playwright_lock: asyncio.Lock | None = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        """
+        Schedules the coroutine on the runtime loop and returns a future for
+        its result. Context variables of the caller (e.g. the current tracing
+        run) are visible to the coroutine. Cancelling the future cancels the
+        coroutine; the cancellation is delivered before any coroutine submitted
+        afterwards starts.
+        """
+        future = concurrent.futures.Future()
+        context = contextvars.copy_context()
+
+        def copy_result(task: asyncio.Task):
+            # The future stays pending until now so that it can be cancelled
+            if not future.set_running_or_notify_cancel():
+                return
+            if task.cancelled():
+                future.set_exception(concurrent.futures.CancelledError())
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def start():
+            if future.cancelled():
+                coroutine.close()
+                return
+            # Tasks run in a copy of the context current when they are created
+            task = context.run(self._loop.create_task, coroutine)
+            task.add_done_callback(copy_result)
+
+            def cancel_task(future: concurrent.futures.Future):
+                if future.cancelled():
+                    self._loop.call_soon_threadsafe(task.cancel)
+
+            future.add_done_callback(cancel_task)
+
+        self._loop.call_soon_threadsafe(start)
+        return future
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """Runs the coroutine on the runtime loop and blocks until it's done."""
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError(
+                "Can't block the Playwright runtime loop, await the coroutine"
+            )
+        return self.submit(coroutine).result()
+
+    async def arun(self, coroutine: Coroutine) -> Any:
+        """Awaits the coroutine on the runtime loop from any event loop."""
+        if asyncio.get_running_loop() is self._loop:
+            return await coroutine
+        return await asyncio.wrap_future(self.submit(coroutine))
+
+    async def get_playwright(self) -> playwright.async_api.Playwright:
+        """Starts the shared Playwright driver on first use."""
+        if self._playwright_lock is None:
+            self._playwright_lock = asyncio.Lock()
+        async with self._playwright_lock:
+            if self._playwright is None:
+                self._playwright = await playwright.async_api.async_playwright().start()
+        return self._playwright
+
+    def stop(self):
+        """Stops the Playwright driver and the loop."""
+        if not self._loop.is_running():
+            return
+        if self._playwright is not None:
+            self.run(self._playwright.stop())
+            self._playwright = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+@lru_cache
+def get_runtime() -> PlaywrightRuntime:
+    runtime = PlaywrightRuntime()
+    atexit.register(runtime.stop)
+    return runtime
@@ -0,0 +1,187 @@
+"""
+Waits for a page to settle after an action, so that the observation (and the
+description paid for in tokens) is of the rendered page and not of a loading
+state. A page is settled when no requests have been in flight for a while and
+the DOM stopped changing, or when the deadline is reached.
+"""
+
+import asyncio
+from functools import wraps
+from inspect import cleandoc
+import logging
+import time
+from typing import Any
+
+import playwright.async_api
+from playwright.async_api import Error
+from pydantic import BaseModel
+
+from ai_powered_qa import config
+
+CONTEXT_DESTROYED = (
+    "Execution context was destroyed, most likely because of a navigation"
+)
+
+# Requests that stay open as long as the page, they never become idle
+LONG_LIVED_RESOURCE_TYPES = frozenset({"eventsource", "websocket"})
+
+DOM_QUIET_SCRIPT = cleandoc(
+    """
+    ({ quietMs, timeoutMs }) => new Promise(resolve => {
+        const start = performance.now();
+        let lastMutation = start;
+        let mutations = 0;
+        const observer = new MutationObserver(records => {
+            for (const record of records) {
+                // Our own data attributes don't count
+                if (record.type === 'attributes'
+                    && record.attributeName.startsWith('data-playwright-')) {
+                    continue;
+                }
+                mutations++;
+                lastMutation = performance.now();
+            }
+        });
+        observer.observe(document, {
+            subtree: true, childList: true, attributes: true, characterData: true,
+        });
+        const check = () => {
+            const now = performance.now();
+            const quiet = now - lastMutation >= quietMs;
+            if (quiet || now - start >= timeoutMs) {
+                observer.disconnect();
+                resolve({ quiet, mutations });
+            } else {
+                const wait = Math.min(quietMs - (now - lastMutation), timeoutMs - (now - start));
+                setTimeout(check, Math.max(wait, 10));
+            }
+        };
+        setTimeout(check, Math.min(quietMs, timeoutMs));
+    })
+    """
+)
+
+
+class SettleOptions(BaseModel):
+    # No request in flight for this long, None to not wait for the network
+    network_idle_ms: int | None = 500
+    # No DOM mutation for this long, None to not wait for the DOM
+    quiet_window_ms: int | None = 300
+    # Give up waiting after this long
+    timeout_ms: int = config.PLAYWRIGHT_TIMEOUT
+
+
+class PageSettler:
+    """Tracks the requests of a page to tell when it's settled."""
+
+    def __init__(self, page: playwright.async_api.Page):
+        self._page = page
+        self._inflight = set()
+        self._last_request_change = time.monotonic()
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+
+    def _on_request(self, request: playwright.async_api.Request):
+        if request.resource_type not in LONG_LIVED_RESOURCE_TYPES:
+            self._inflight.add(request)
+            self._last_request_change = time.monotonic()
+
+    def _on_request_done(self, request: playwright.async_api.Request):
+        if request in self._inflight:
+            self._inflight.discard(request)
+            self._last_request_change = time.monotonic()
+
+    async def wait(self, options: SettleOptions) -> dict[str, float]:
+        """
+        Waits until the page is settled or the deadline is reached. Returns
+        the seconds spent waiting for the network, for the DOM and in total.
+        """
+        start = time.monotonic()
+        deadline = start + options.timeout_ms / 1000
+        timings = {"settle_network": 0.0, "settle_dom": 0.0}
+        settled = False
+        while not settled and time.monotonic() < deadline:
+            step_start = time.monotonic()
+            await self._wait_for_network_idle(options, deadline)
+            timings["settle_network"] += time.monotonic() - step_start
+
+            step_start = time.monotonic()
+            try:
+                settled = await self._wait_for_dom_quiet(options, deadline)
+            except Error as e:
+                if e.message != CONTEXT_DESTROYED:
+                    raise e
+                # Navigated in the meantime, the new page has to settle
+                await self._wait_for_load(deadline)
+            timings["settle_dom"] += time.monotonic() - step_start
+        timings["settle"] = time.monotonic() - start
+        if not settled:
+            logging.info(f"Page didn't settle within {options.timeout_ms}ms")
+        return timings
+
+    async def _wait_for_network_idle(self, options: SettleOptions, deadline: float):
+        if options.network_idle_ms is None:
+            return
+        idle = options.network_idle_ms / 1000
+        while time.monotonic() < deadline:
+            since_change = time.monotonic() - self._last_request_change
+            if not self._inflight and since_change >= idle:
+                return
+            await asyncio.sleep(min(0.05, max(deadline - time.monotonic(), 0)))
+
+    async def _wait_for_dom_quiet(self, options: SettleOptions, deadline: float):
+        if options.quiet_window_ms is None:
+            return True
+        remaining_ms = max((deadline - time.monotonic()) * 1000, 0)
+        result = await self._page.evaluate(
+            DOM_QUIET_SCRIPT,
+            {"quietMs": options.quiet_window_ms, "timeoutMs": remaining_ms},
+        )
+        return result["quiet"]
+
+    async def _wait_for_load(self, deadline: float):
+        remaining_ms = max((deadline - time.monotonic()) * 1000, 1)
+        try:
+            await self._page.wait_for_load_state(
+                "domcontentloaded", timeout=remaining_ms
+            )
+        except playwright.async_api.TimeoutError:
+            pass
+
+
+async def evaluate(
+    page: playwright.async_api.Page,
+    expression: str,
+    arg: Any = None,
+    timeout_ms: int = config.PLAYWRIGHT_TIMEOUT,
+) -> Any:
+    """
+    `page.evaluate` that, when a navigation destroys the execution context,
+    waits for the new document and evaluates again, until `timeout_ms`.
+    """
+    deadline = time.monotonic() + timeout_ms / 1000
+    while True:
+        try:
+            return await page.evaluate(expression, arg)
+        except Error as e:
+            if e.message != CONTEXT_DESTROYED or time.monotonic() >= deadline:
+                raise e
+            logging.warning("Execution context was destroyed")
+            remaining_ms = max((deadline - time.monotonic()) * 1000, 1)
+            await page.wait_for_load_state("domcontentloaded", timeout=remaining_ms)
+
+
+def settle_after(coroutine_function):
+    """
+    Decorates the coroutine of an action tool of a Playwright plugin, so that
+    the tool returns once the page is settled.
+    """
+
+    @wraps(coroutine_function)
+    async def wrapper(self, *args, **kwargs):
+        result = await coroutine_function(self, *args, **kwargs)
+        await self._settle()
+        return result
+
+    return wrapper
@@ -16,7 +16,7 @@ class TodoPlugin(Plugin):
             ctx += f"[{'COMPLETED' if todo['completed'] else 'TODO'}] {todo['title']}\n"
         return ctx
 
-    @tool
+    @tool(serial=True)
     def add_todo(self, title: str):
         """
         Adds a new item to the todo list.
@@ -26,7 +26,7 @@ class TodoPlugin(Plugin):
         self.todos.append({"title": title, "completed": False})
         return f"Added todo: {title}"
 
-    @tool
+    @tool(serial=True)
     def mark_completed(self, title: str):
         """
         Marks a todo item as completed.
@@ -39,7 +39,7 @@ class TodoPlugin(Plugin):
                 return f"Marked todo as completed: {title}"
         return f"Could not find todo: {title}"
 
-    @tool
+    @tool(serial=True)
     def remove(self, title: str):
         """
         Removes a todo item from the list.
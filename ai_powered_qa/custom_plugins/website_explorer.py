@@ -1,16 +1,19 @@
+from typing import Any
+
 from openai import OpenAI
 from pydantic import PrivateAttr
 
+from ai_powered_qa.components.completion_cache import with_completion_cache
 from ai_powered_qa.components.plugin import Plugin, tool
 
 
 class WebsiteExplorer(Plugin):
     name: str = "WebsiteExplorer"
-    _client: OpenAI = PrivateAttr()
+    _client: Any = PrivateAttr()
 
     def __init__(self, **data):
         super().__init__(**data)
-        self._client = OpenAI()
+        self._client = with_completion_cache(OpenAI())
 
     @tool
     def find_element_to_perform_action(self, action_description: str, html: str):
@@ -66,6 +66,8 @@ def load_agent(default_kwargs: dict) -> tuple[Agent, AgentStore]:
         st.session_state[AGENT_INSTANCE_KEY] = _agent
         st.session_state[AGENT_MODEL_KEY] = _agent.model
         st.session_state[SYSTEM_MESSAGE_KEY] = _agent.system_message
+        # Start the browser while the user is typing the first message
+        _agent.warm_up()
 
     agent = st.session_state[AGENT_INSTANCE_KEY]
 
@@ -0,0 +1,59 @@
+"""
+Measures the cost of assigning to an agent's configuration with many plugins
+configured, which the Streamlit UI does on every rerun.
+
+    $ poetry run python benchmarks/bench_agent_hash.py --plugins 50
+"""
+
+import argparse
+import timeit
+
+from ai_powered_qa.components.agent import Agent
+from ai_powered_qa.components.plugin import Plugin
+
+
+class ConfigOnlyPlugin(Plugin):
+    name: str = "ConfigOnlyPlugin"
+    options: dict = {}
+
+
+def build_agent(plugin_count: int) -> Agent:
+    plugins = {
+        f"plugin_{i}": ConfigOnlyPlugin(
+            name=f"plugin_{i}",
+            options={f"option_{j}": "x" * 100 for j in range(50)},
+        )
+        for i in range(plugin_count)
+    }
+    return Agent(
+        agent_name="bench_agent", client=None, async_client=None, plugins=plugins
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plugins", type=int, default=50)
+    parser.add_argument("--number", type=int, default=1000)
+    args = parser.parse_args()
+
+    agent = build_agent(args.plugins)
+
+    def assign():
+        agent.model = "gpt-4-1106-preview"
+        agent.system_message = "You are a helpful assistant."
+
+    def assign_and_read_version():
+        # What every assignment used to cost
+        assign()
+        agent.version
+
+    for name, function in [
+        ("assignment (lazy hash)", assign),
+        ("assignment + version read", assign_and_read_version),
+    ]:
+        seconds = timeit.timeit(function, number=args.number)
+        print(f"{name:<30} {seconds / args.number * 1e6:10.1f} us per rerun")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compares the single-pass HTML cleaner with the BeautifulSoup pipeline on a
+corpus of saved pages (any .html files, e.g. `await page.content()` dumps),
+and checks that both produce the same output.
+
+    $ poetry run python benchmarks/bench_clean_html.py pages/ --only-visible
+"""
+
+import argparse
+from pathlib import Path
+import time
+
+from ai_powered_qa.custom_plugins.playwright_plugin.clean_html import (
+    clean_with_beautifulsoup,
+)
+from ai_powered_qa.custom_plugins.playwright_plugin.html_cleaner import (
+    PARSERS,
+    clean_html,
+)
+
+
+def find_pages(paths: list[str]) -> list[Path]:
+    pages = []
+    for path in map(Path, paths):
+        pages.extend(sorted(path.rglob("*.html")) if path.is_dir() else [path])
+    return pages
+
+
+def best_time(function, number: int) -> tuple[float, str]:
+    best = float("inf")
+    for _ in range(number):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages", nargs="+", help="HTML files or directories")
+    parser.add_argument("--only-visible", action="store_true")
+    parser.add_argument("--parser", choices=PARSERS, default="html.parser")
+    parser.add_argument("--number", type=int, default=3)
+    args = parser.parse_args()
+
+    totals = [0.0, 0.0]
+    mismatches = []
+    print(f"{'page':<40} {'size':>9} {'bs4':>9} {'single':>9} {'speedup':>8}")
+    for page in find_pages(args.pages):
+        html = page.read_text(errors="replace")
+        old_seconds, old_html = best_time(
+            lambda: clean_with_beautifulsoup(html, args.only_visible), args.number
+        )
+        new_seconds, new_html = best_time(
+            lambda: clean_html(html, args.only_visible, args.parser), args.number
+        )
+        totals[0] += old_seconds
+        totals[1] += new_seconds
+        if old_html != new_html:
+            mismatches.append(page)
+        print(
+            f"{page.name[:40]:<40} {len(html) / 1024:7.0f}kB "
+            f"{old_seconds * 1000:7.1f}ms {new_seconds * 1000:7.1f}ms "
+            f"{old_seconds / new_seconds:7.1f}x"
+        )
+
+    print(
+        f"{'total':<50} {totals[0] * 1000:7.1f}ms {totals[1] * 1000:7.1f}ms "
+        f"{totals[0] / totals[1]:7.1f}x"
+    )
+    if mismatches:
+        print(f"Output differs from BeautifulSoup for {len(mismatches)} pages:")
+        for page in mismatches:
+            print(f"  {page}")
+
+
+if __name__ == "__main__":
+    main()
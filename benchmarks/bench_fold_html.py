@@ -0,0 +1,60 @@
+"""
+Measures the tokens saved by folding repeated siblings in the cleaned HTML on
+a corpus of saved pages (any .html files, e.g. `await page.content()` dumps).
+
+    $ poetry run python benchmarks/bench_fold_html.py pages/ --only-visible
+"""
+
+import argparse
+from pathlib import Path
+import time
+
+from ai_powered_qa import config
+from ai_powered_qa.components.utils import count_tokens
+from ai_powered_qa.custom_plugins.playwright_plugin.html_cleaner import clean_html
+from ai_powered_qa.custom_plugins.playwright_plugin.html_folding import fold_html
+
+
+def find_pages(paths: list[str]) -> list[Path]:
+    pages = []
+    for path in map(Path, paths):
+        pages.extend(sorted(path.rglob("*.html")) if path.is_dir() else [path])
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages", nargs="+", help="HTML files or directories")
+    parser.add_argument("--only-visible", action="store_true")
+    parser.add_argument("--keep", type=int, default=3)
+    parser.add_argument("--model", default=config.MODEL_DEFAULT)
+    args = parser.parse_args()
+
+    totals = [0, 0]
+    print(
+        f"{'page':<40} {'cleaned':>9} {'folded':>9} {'saved':>7} "
+        f"{'folds':>6} {'time':>9}"
+    )
+    for page in find_pages(args.pages):
+        html = clean_html(page.read_text(errors="replace"), args.only_visible)
+        start = time.perf_counter()
+        folded, folds = fold_html(html, keep=args.keep)
+        seconds = time.perf_counter() - start
+        tokens = count_tokens(html, args.model)
+        folded_tokens = count_tokens(folded, args.model)
+        totals[0] += tokens
+        totals[1] += folded_tokens
+        print(
+            f"{page.name[:40]:<40} {tokens:>9} {folded_tokens:>9} "
+            f"{1 - folded_tokens / max(tokens, 1):6.0%} {len(folds):>6} "
+            f"{seconds * 1000:7.1f}ms"
+        )
+
+    print(
+        f"{'total':<40} {totals[0]:>9} {totals[1]:>9} "
+        f"{1 - totals[1] / max(totals[0], 1):6.0%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
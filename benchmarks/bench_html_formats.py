@@ -0,0 +1,80 @@
+"""
+Compares the output formats of the HTML cleaner on a corpus of saved pages
+(any .html files, e.g. `await page.content()` dumps): the tokens of the
+cleaned page in each format and the time spent cleaning and printing it.
+
+    $ poetry run python benchmarks/bench_html_formats.py pages/ --only-visible
+"""
+
+import argparse
+from pathlib import Path
+import time
+
+from ai_powered_qa import config
+from ai_powered_qa.components.utils import count_tokens
+from ai_powered_qa.custom_plugins.playwright_plugin.html_cleaner import (
+    OUTPUT_FORMATS,
+    clean_html,
+)
+
+
+def find_pages(paths: list[str]) -> list[Path]:
+    pages = []
+    for path in map(Path, paths):
+        pages.extend(sorted(path.rglob("*.html")) if path.is_dir() else [path])
+    return pages
+
+
+def best_time(function, number: int) -> tuple[float, str]:
+    best = float("inf")
+    for _ in range(number):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages", nargs="+", help="HTML files or directories")
+    parser.add_argument("--only-visible", action="store_true")
+    parser.add_argument("--model", default=config.MODEL_DEFAULT)
+    parser.add_argument("--number", type=int, default=3)
+    args = parser.parse_args()
+
+    totals = {output_format: [0, 0.0] for output_format in OUTPUT_FORMATS}
+    print(f"{'page':<30} " + " ".join(f"{name:>19}" for name in OUTPUT_FORMATS))
+    for page in find_pages(args.pages):
+        html = page.read_text(errors="replace")
+        columns = []
+        for output_format in OUTPUT_FORMATS:
+            seconds, cleaned = best_time(
+                lambda: clean_html(
+                    html, args.only_visible, output_format=output_format
+                ),
+                args.number,
+            )
+            tokens = count_tokens(cleaned, args.model)
+            totals[output_format][0] += tokens
+            totals[output_format][1] += seconds
+            columns.append(f"{tokens:>8} {seconds * 1000:7.1f}ms")
+        print(f"{page.name[:30]:<30} " + " ".join(columns))
+
+    pretty_tokens = max(totals["pretty"][0], 1)
+    print(
+        f"{'total':<30} "
+        + " ".join(
+            f"{tokens:>8} {seconds * 1000:7.1f}ms"
+            for tokens, seconds in totals.values()
+        )
+    )
+    print(
+        f"{'vs. pretty':<30} "
+        + " ".join(
+            f"{tokens / pretty_tokens:>8.0%} {'':>9}" for tokens, _ in totals.values()
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measures the navigate-to-observation latency (new context, `page.goto` and
+the cleaned HTML of the page) of the keyboard-only plugin with the default
+browser profile, run headless, and with `HTML_ONLY_PROFILE`, which blocks
+images, fonts, media and trackers.
+
+    $ poetry run python benchmarks/bench_navigate.py https://example.com --turns 5
+"""
+
+import argparse
+import time
+
+from ai_powered_qa.custom_plugins.playwright_plugin.browser_pool import BrowserPool
+from ai_powered_qa.custom_plugins.playwright_plugin.browser_profile import (
+    HTML_ONLY_PROFILE,
+    BrowserProfile,
+)
+from ai_powered_qa.custom_plugins.playwright_plugin.html_cleaner import clean_html
+from ai_powered_qa.custom_plugins.playwright_plugin.only_keyboard import (
+    PlaywrightPluginOnlyKeyboard,
+)
+from ai_powered_qa.custom_plugins.playwright_plugin.runtime import get_runtime
+
+PROFILES = {
+    "no blocking": BrowserProfile(headless=True),
+    "html only": HTML_ONLY_PROFILE,
+}
+
+
+async def observe(pool: BrowserPool, profile: BrowserProfile, url: str):
+    """Returns the latency and the number of requests sent and blocked."""
+    start = time.perf_counter()
+    context = await pool.new_context(**profile.context_options)
+    await profile.apply(context)
+    for script in PlaywrightPluginOnlyKeyboard.init_scripts:
+        await context.add_init_script(script)
+    requests = []
+    context.on("request", requests.append)
+    failed = []
+    context.on("requestfailed", failed.append)
+    page = await context.new_page()
+    await page.goto(url)
+    observation = await page.evaluate(PlaywrightPluginOnlyKeyboard.observe_script)
+    clean_html(observation["html"])
+    elapsed = time.perf_counter() - start
+    await pool.release(context)
+    return elapsed, len(requests), len(failed)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    # Both profiles are headless, so they can share the browser
+    pool = BrowserPool(get_runtime(), launch_options={"headless": True})
+    await pool.start()
+    print(f"{'url':<40} {'profile':<12} {'mean':>9} {'min':>9} {'requests':>9}")
+    for url in args.urls:
+        for name, profile in PROFILES.items():
+            results = [await observe(pool, profile, url) for _ in range(args.turns)]
+            times = [elapsed for elapsed, _, _ in results]
+            _, requests, blocked = results[-1]
+            print(
+                f"{url[:40]:<40} {name:<12} "
+                f"{sum(times) / len(times) * 1000:7.0f}ms {min(times) * 1000:7.0f}ms "
+                f"{requests:>4} ({blocked} blocked)"
+            )
+    await pool.close()
+
+
+if __name__ == "__main__":
+    get_runtime().run(main())
@@ -0,0 +1,99 @@
+"""
+Compares the per-turn page observation before and after batching it: the old
+sequence (a stabilizing screenshot, the screenshot, one `page.evaluate` per
+data attribute update and `page.content()`) against one observe script
+running concurrently with a single screenshot.
+
+    $ poetry run python benchmarks/bench_observe.py https://example.com --turns 10
+"""
+
+import argparse
+import asyncio
+import time
+
+import playwright.async_api
+
+from ai_powered_qa.custom_plugins.playwright_plugin.only_keyboard import (
+    JS_FUNCTIONS as KEYBOARD_JS_FUNCTIONS,
+    PlaywrightPluginOnlyKeyboard,
+)
+from ai_powered_qa.custom_plugins.playwright_plugin.only_visible import (
+    JS_FUNCTIONS as VISIBLE_JS_FUNCTIONS,
+    PlaywrightPluginOnlyVisible,
+)
+
+PLUGINS = {
+    "only_visible": (
+        VISIBLE_JS_FUNCTIONS,
+        PlaywrightPluginOnlyVisible.observe_script,
+        [
+            "window.updateElementVisibility()",
+            "window.updateElementScrollability()",
+            "window.setValueAsDataAttribute()",
+        ],
+    ),
+    "only_keyboard": (
+        KEYBOARD_JS_FUNCTIONS,
+        PlaywrightPluginOnlyKeyboard.observe_script,
+        ["window.updateDataAttributes()"],
+    ),
+}
+
+
+async def legacy_observation(page, updates):
+    await page.locator("body").screenshot()
+    await page.screenshot()
+    for update in updates:
+        await page.evaluate(update)
+    return await page.content()
+
+
+async def batched_observation(page, observe_script):
+    observation, _ = await asyncio.gather(
+        page.evaluate(observe_script), page.screenshot()
+    )
+    return observation["html"]
+
+
+async def time_turns(function, turns: int) -> list[float]:
+    times = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        await function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url")
+    parser.add_argument("--plugin", choices=PLUGINS, default="only_visible")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--headed", action="store_true")
+    args = parser.parse_args()
+
+    js_functions, observe_script, updates = PLUGINS[args.plugin]
+    async with playwright.async_api.async_playwright() as p:
+        browser = await p.chromium.launch(headless=not args.headed)
+        context = await browser.new_context()
+        await context.add_init_script(js_functions)
+        page = await context.new_page()
+        await page.goto(args.url)
+
+        legacy = await time_turns(lambda: legacy_observation(page, updates), args.turns)
+        batched = await time_turns(
+            lambda: batched_observation(page, observe_script), args.turns
+        )
+        await browser.close()
+
+    print(f"{'':<10} {'mean':>9} {'min':>9} {'max':>9}")
+    for name, times in [("legacy", legacy), ("batched", batched)]:
+        print(
+            f"{name:<10} {sum(times) / len(times) * 1000:7.1f}ms "
+            f"{min(times) * 1000:7.1f}ms {max(times) * 1000:7.1f}ms"
+        )
+    print(f"speedup    {sum(legacy) / sum(batched):7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
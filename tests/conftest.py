@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from ai_powered_qa.custom_plugins.playwright_plugin.base import CHANGE_COUNT_SCRIPT
+
+
+class FakeAccessibility:
+    def __init__(self):
+        self.snapshots = 0
+
+    async def snapshot(self):
+        self.snapshots += 1
+        return {"role": "WebArea", "name": f"Snapshot {self.snapshots}"}
+
+
+class FakeLocator:
+    async def count(self):
+        return 1
+
+
+class FakeFrame:
+    def __init__(self, parent_frame=None):
+        self.parent_frame = parent_frame
+
+
+class FakePage:
+    """
+    Stands in for a Playwright page in the plugin's observations. Any script
+    other than the change counter is answered as the observation script.
+    """
+
+    viewport_size = None
+
+    def __init__(self):
+        self.url = "https://example.com/"
+        self.accessibility = FakeAccessibility()
+        self.html = "<html><body></body></html>"
+        # Element IDs the observation script assigned
+        self.ids = {}
+        # What the change counter script counted
+        self.changes = 0
+        # Seconds the observation script and the screenshot take
+        self.observe_delay = 0
+        self.screenshot_delay = 0
+        self.observations = 0
+        self.screenshots = 0
+        self.clicks = []
+
+    def locator(self, selector):
+        return FakeLocator()
+
+    async def click(self, selector, **kwargs):
+        self.clicks.append(selector)
+
+    async def evaluate(self, expression, arg=None):
+        if expression == CHANGE_COUNT_SCRIPT:
+            return self.changes
+        self.observations += 1
+        # The page is observed as it was when the script started
+        observation = {
+            "html": self.html,
+            "viewport": {"width": 1280, "height": 720},
+            "ids": dict(self.ids),
+        }
+        await asyncio.sleep(self.observe_delay)
+        return observation
+
+    async def screenshot(self, **kwargs):
+        self.screenshots += 1
+        await asyncio.sleep(self.screenshot_delay)
+        return b""
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def page():
+    return FakePage()
+
+
+@pytest.fixture
+def main_frame():
+    return FakeFrame()
+
+
+@pytest.fixture
+def child_frame(main_frame):
+    return FakeFrame(parent_frame=main_frame)
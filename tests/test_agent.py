@@ -1,7 +1,19 @@
+import asyncio
+import json
+import threading
+import time
+
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+import pytest
+import yaml
+
 from ai_powered_qa.components.agent import Agent
-from ai_powered_qa.components.plugin import RandomNumberPlugin
+from ai_powered_qa.components.interaction import Interaction
+from ai_powered_qa.components.plugin import Plugin, RandomNumberPlugin, tool
+from ai_powered_qa.components.utils import count_tokens
 from ai_powered_qa.custom_plugins.playwright_plugin.base import PlaywrightPlugin
 
+
 def test_agent_playwright_response():
     agent = Agent(agent_name="test_agent_with_playwright")
     plugin = PlaywrightPlugin()
@@ -28,6 +40,22 @@ def test_agent_with_rng():
     assert len(agent.history) == 3
 
 
+def test_agent_async_with_rng():
+    agent = Agent(agent_name="test_agent_async_with_rng")
+    agent.add_plugin(RandomNumberPlugin())
+
+    async def run_interaction():
+        interaction = await agent.agenerate_interaction(
+            "Please generate a random number between 1 and 10"
+        )
+        return await agent.acommit_interaction(interaction)
+
+    interaction = asyncio.run(run_interaction())
+    agent_response = interaction.agent_response
+    assert agent_response.tool_calls[0].function.name == "get_random_number"
+    assert len(agent.history) == 3
+
+
 # Flaky with gpt-3.5
 # def test_agent_parallel_tool_call():
 #     agent = Agent(agent_name="test_agent_parallel_tool_call")
@@ -44,6 +72,61 @@ def test_agent_init():
     assert agent.agent_name == "test_agent_init"
 
 
+def test_tool_name_collision():
+    agent = Agent(agent_name="test_tool_name_collision")
+    agent.add_plugin(RandomNumberPlugin())
+
+    class OtherRandomNumberPlugin(RandomNumberPlugin):
+        name: str = "OtherRandomNumberPlugin"
+
+    with pytest.raises(ValueError):
+        agent.add_plugin(OtherRandomNumberPlugin())
+    assert list(agent.plugins) == ["RandomNumberPlugin"]
+
+    # Re-adding a plugin under the same name replaces it
+    agent.add_plugin(RandomNumberPlugin())
+    assert len(agent.get_tools_from_plugins()) == 2
+
+    # Assigning colliding plugins leaves the agent as it was
+    plugin = agent.plugins["RandomNumberPlugin"]
+    other_plugin = OtherRandomNumberPlugin()
+    with pytest.raises(ValueError):
+        agent.plugins = {plugin.name: plugin, other_plugin.name: other_plugin}
+    assert list(agent.plugins) == ["RandomNumberPlugin"]
+    assert agent._tool_registry["get_random_number"][0] is plugin
+
+
+def test_tools_follow_plugin_configuration():
+    agent = Agent(agent_name="test_tools_follow_plugin_configuration")
+    plugin = PlaywrightPlugin()
+    agent.add_plugin(plugin)
+    tools = agent.get_tools_from_plugins()
+    assert agent.get_tools_from_plugins() is tools
+    assert "click_element_by_id" not in [t["function"]["name"] for t in tools]
+
+    plugin.element_ids = True
+    tools = agent.get_tools_from_plugins()
+    assert "click_element_by_id" in [t["function"]["name"] for t in tools]
+
+
+def test_agent_version_computed_on_read():
+    agent = Agent(agent_name="test_agent_version_computed_on_read")
+
+    # Several changes between reads produce a single new version
+    agent.system_message = "You are a super helpful assistant"
+    agent.model = "gpt-4-1106-preview"
+    assert agent.version == 1
+
+    # Changing the configuration back to a known state is still a new version
+    agent.model = "gpt-3.5-turbo-1106"
+    assert agent.version == 2
+
+    # Saved configuration keeps the version
+    loaded_agent = Agent(**json.loads(agent.model_dump_json()))
+    assert loaded_agent.version == 2
+    assert loaded_agent.hash == agent.hash
+
+
 def test_agent_version_number():
     # Initialize agent
     agent = Agent(agent_name="test_agent_get_completion")
@@ -67,3 +150,214 @@ def test_agent_version_number():
     agent.system_message = "You are a super helpful assistant"
     assert agent.version == 2
     assert agent.hash == hash_before
+
+
+def test_history_window_keeps_tool_calls_together():
+    agent = Agent(agent_name="test_history_window")
+    agent.history = [
+        {"role": "user", "content": "Please generate two random numbers"},
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": "call_1",
+                    "type": "function",
+                    "function": {"name": "get_random_number", "arguments": "{}"},
+                },
+                {
+                    "id": "call_2",
+                    "type": "function",
+                    "function": {"name": "get_random_number", "arguments": "{}"},
+                },
+            ],
+        },
+        {"role": "tool", "content": "4", "tool_call_id": "call_1"},
+        {"role": "tool", "content": "2", "tool_call_id": "call_2"},
+        {"role": "assistant", "content": "The numbers are 4 and 2."},
+    ]
+    model = "gpt-3.5-turbo-1106"
+
+    messages = agent._get_messages_for_completion(None, model, 100_000)
+    assert messages[1:-1] == agent.history
+
+    # The tool responses would fit, but they can't be sent without the
+    # assistant message that requested them
+    base_tokens = count_tokens(agent.system_message, model)
+    budget = base_tokens + sum(
+        count_tokens(yaml.dump(message), model) for message in agent.history[2:]
+    )
+    messages = agent._get_messages_for_completion(None, model, budget)
+    assert messages[1:-1] == agent.history[4:]
+
+
+class SleepPlugin(Plugin):
+    name: str = "SleepPlugin"
+
+    @tool
+    def sleep(self, seconds: float):
+        """
+        Sleeps for the given number of seconds
+
+        :param float seconds: Number of seconds to sleep
+        """
+        time.sleep(seconds)
+        return f"Slept {seconds}s in {threading.current_thread().name}"
+
+    @tool(serial=True)
+    def sleep_serial(self, seconds: float):
+        """
+        Sleeps for the given number of seconds, never concurrently
+
+        :param float seconds: Number of seconds to sleep
+        """
+        time.sleep(seconds)
+        return f"Slept serially {seconds}s"
+
+
+def _interaction_with_tool_calls(*tool_calls):
+    agent_response = ChatCompletionMessage(
+        role="assistant",
+        content=None,
+        tool_calls=[
+            {
+                "id": f"call_{index}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)},
+            }
+            for index, (name, arguments) in enumerate(tool_calls)
+        ],
+    )
+    return Interaction(
+        request_params={}, user_prompt=None, agent_response=agent_response
+    )
+
+
+def test_concurrent_tool_calls():
+    agent = Agent(agent_name="test_concurrent_tool_calls", concurrent_tool_calls=True)
+    agent.add_plugin(SleepPlugin())
+    interaction = _interaction_with_tool_calls(
+        ("sleep", {"seconds": 0.3}),
+        ("sleep", {"seconds": 0.1}),
+        ("sleep", {"seconds": 0.2}),
+    )
+
+    start = time.perf_counter()
+    agent.commit_interaction(interaction)
+    assert time.perf_counter() - start < 0.5
+
+    # Tool responses keep the order of the tool calls
+    assert [r["tool_call_id"] for r in interaction.tool_responses] == [
+        "call_0",
+        "call_1",
+        "call_2",
+    ]
+    assert interaction.tool_responses[1]["content"].startswith("Slept 0.1s")
+
+
+def test_serial_tool_calls_are_not_interleaved():
+    agent = Agent(
+        agent_name="test_serial_tool_calls_are_not_interleaved",
+        concurrent_tool_calls=True,
+    )
+    agent.add_plugin(SleepPlugin())
+    interaction = _interaction_with_tool_calls(
+        ("sleep_serial", {"seconds": 0.2}),
+        ("sleep_serial", {"seconds": 0.2}),
+        ("sleep", {"seconds": 0.3}),
+    )
+
+    start = time.perf_counter()
+    asyncio.run(agent.acommit_interaction(interaction))
+    elapsed = time.perf_counter() - start
+    assert 0.4 <= elapsed < 0.6
+    assert len(interaction.tool_responses) == 3
+
+
+class SlowContextPlugin(Plugin):
+    delay: float = 0.3
+
+    @property
+    def context_message(self) -> str:
+        time.sleep(self.delay)
+        return f"Context of {self.name}"
+
+    async def acontext_message(self) -> str:
+        await asyncio.sleep(self.delay)
+        return f"Context of {self.name}"
+
+
+def test_concurrent_context_messages():
+    agent = Agent(agent_name="test_concurrent_context_messages")
+    for name in ["browser", "todo", "files"]:
+        agent.add_plugin(SlowContextPlugin(name=name))
+
+    start = time.perf_counter()
+    context_message = agent._generate_context_message()
+    assert time.perf_counter() - start < 0.6
+    # The context messages keep the order of the plugins
+    assert context_message.index("browser") < context_message.index("files")
+
+    start = time.perf_counter()
+    assert asyncio.run(agent._agenerate_context_message()) == context_message
+    assert time.perf_counter() - start < 0.6
+
+
+def test_context_message_timeout():
+    agent = Agent(agent_name="test_context_message_timeout")
+    agent.add_plugin(SlowContextPlugin(name="fast", delay=0.01))
+    agent.add_plugin(SlowContextPlugin(name="slow", delay=1, context_timeout=0.2))
+
+    for context_message in [
+        agent._generate_context_message(),
+        asyncio.run(agent._agenerate_context_message()),
+    ]:
+        assert "Context of fast" in context_message
+        assert "Context of slow" not in context_message
+        assert "slow plugin is not available" in context_message
+
+
+class TodoPlugin(Plugin):
+    name: str = "TodoPlugin"
+    context_ttl: float | None = 60
+    todos: list[str] = []
+
+    @property
+    def context_message(self) -> str:
+        return f"Todos: {', '.join(self.todos)}"
+
+    @tool
+    def add_todo(self, todo: str):
+        """
+        Adds a todo
+
+        :param str todo: The todo
+        """
+        self.todos.append(todo)
+        return f"Added {todo}"
+
+
+def test_memoized_context_message_after_commit():
+    agent = Agent(
+        agent_name="test_memoized_context_message_after_commit",
+        concurrent_tool_calls=True,
+    )
+    agent.add_plugin(TodoPlugin())
+    assert agent._generate_context_message() == "Todos: "
+
+    agent.commit_interaction(_interaction_with_tool_calls(("add_todo", {"todo": "a"})))
+    assert agent._generate_context_message() == "Todos: a"
+
+    agent.commit_interaction(
+        _interaction_with_tool_calls(
+            ("add_todo", {"todo": "b"}), ("add_todo", {"todo": "c"})
+        )
+    )
+    assert agent._generate_context_message() == "Todos: a, b, c"
+
+    asyncio.run(
+        agent.acommit_interaction(
+            _interaction_with_tool_calls(("add_todo", {"todo": "d"}))
+        )
+    )
+    assert asyncio.run(agent._agenerate_context_message()) == "Todos: a, b, c, d"
@@ -0,0 +1,85 @@
+import asyncio
+
+from ai_powered_qa.custom_plugins.playwright_plugin.browser_pool import BrowserPool
+
+
+class FakeContext:
+    def __init__(self):
+        self.handlers = []
+
+    def on(self, event, handler):
+        self.handlers.append(handler)
+
+    async def close(self):
+        for handler in self.handlers:
+            handler(self)
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self):
+        return FakeContext()
+
+    async def close(self):
+        self.connected = False
+
+
+class FakeRuntime:
+    def __init__(self):
+        self.launched = []
+
+    async def get_playwright(self):
+        return self
+
+    @property
+    def chromium(self):
+        return self
+
+    async def launch(self, **options):
+        self.launched.append(FakeBrowser())
+        return self.launched[-1]
+
+
+def test_browser_pool():
+    async def main():
+        runtime = FakeRuntime()
+        pool = BrowserPool(
+            runtime,
+            max_browsers=2,
+            warm_browsers=1,
+            max_contexts_per_browser=2,
+            max_sessions_per_browser=3,
+            idle_timeout=0,
+        )
+        await pool.start()
+        assert len(runtime.launched) == 1
+
+        # Contexts share a browser until it's full
+        contexts = [await pool.new_context() for _ in range(4)]
+        assert len(runtime.launched) == 2
+        assert pool.stats == {"browsers": 2, "contexts": 4, "sessions": 4}
+
+        # All browsers are full, wait for a released context
+        waiting = asyncio.create_task(pool.new_context())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        await pool.release(contexts[0])
+        contexts[0] = await waiting
+
+        # A disconnected browser is replaced
+        runtime.launched[1].connected = False
+        await pool.new_context()
+        assert len(runtime.launched) == 3
+
+        # The first browser served 3 sessions, it's recycled when released
+        for context in contexts[:2]:
+            await pool.release(context)
+        assert not runtime.launched[0].is_connected()
+        assert pool.stats["browsers"] == 1
+
+    asyncio.run(main())
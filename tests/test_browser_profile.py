@@ -0,0 +1,17 @@
+from ai_powered_qa.custom_plugins.playwright_plugin.browser_profile import (
+    HTML_ONLY_PROFILE,
+    BrowserProfile,
+)
+
+
+def test_browser_profile():
+    assert BrowserProfile().context_options == {}
+    assert not BrowserProfile().should_block("https://example.com/a.png", "image")
+
+    profile = HTML_ONLY_PROFILE
+    assert profile.headless
+    assert profile.context_options["viewport"] == {"width": 1280, "height": 720}
+    assert profile.should_block("https://example.com/logo.png", "image")
+    assert profile.should_block("https://www.google-analytics.com/g/collect", "xhr")
+    assert not profile.should_block("https://example.com/app.js", "script")
+    assert not profile.should_block("https://notdoubleclick.net/", "document")
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletion
+import pytest
+
+from ai_powered_qa.components.completion_cache import (
+    MODE_RECORD,
+    MODE_REPLAY,
+    CachedClient,
+    CompletionCacheMiss,
+    request_key,
+)
+from ai_powered_qa.components.lru_store import SqliteLruStore
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **request_params):
+        self.calls += 1
+        return ChatCompletion.model_validate(
+            {
+                "id": f"chatcmpl-{self.calls}",
+                "object": "chat.completion",
+                "created": 0,
+                "model": request_params["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": "Hello!"},
+                    }
+                ],
+            }
+        )
+
+
+def _fake_client():
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+
+
+REQUEST_PARAMS = {
+    "model": "gpt-3.5-turbo-1106",
+    "messages": [{"role": "user", "content": "Hi"}],
+    "temperature": 0.2,
+}
+
+
+def test_record_and_replay(tmp_path):
+    store = SqliteLruStore(str(tmp_path / "completions.sqlite3"))
+    client = _fake_client()
+    recording_client = CachedClient(client, store, MODE_RECORD)
+
+    completion = recording_client.chat.completions.create(**REQUEST_PARAMS)
+    assert recording_client.chat.completions.create(**REQUEST_PARAMS) == completion
+    assert client.chat.completions.calls == 1
+
+    replaying_client = CachedClient(_fake_client(), store, MODE_REPLAY)
+    replayed = replaying_client.chat.completions.create(
+        **REQUEST_PARAMS, langsmith_extra={"metadata": {"operation": "test"}}
+    )
+    assert replayed.choices[0].message.content == "Hello!"
+
+    with pytest.raises(CompletionCacheMiss):
+        replaying_client.chat.completions.create(**{**REQUEST_PARAMS, "temperature": 1})
+
+
+def test_request_key_is_canonical():
+    reordered = dict(reversed(list(REQUEST_PARAMS.items())))
+    assert request_key(reordered) == request_key(REQUEST_PARAMS)
+    assert request_key({**REQUEST_PARAMS, "model": "gpt-4"}) != request_key(
+        REQUEST_PARAMS
+    )
+
+
+def test_lru_eviction(tmp_path):
+    store = SqliteLruStore(str(tmp_path / "store.sqlite3"), max_size_bytes=30)
+    store.put("a", "x" * 10)
+    store.put("b", "x" * 10)
+    store.get("a")
+    store.put("c", "x" * 15)
+
+    # "b" was used least recently
+    assert store.get("b") is None
+    assert store.get("a") is not None
+    assert store.get("c") is not None
+    assert store.size() == 25
@@ -0,0 +1,24 @@
+from ai_powered_qa.components.lru_store import SqliteLruStore
+from ai_powered_qa.custom_plugins.playwright_plugin.description_cache import (
+    DescriptionCache,
+)
+
+
+def test_description_cache_tiers(tmp_path):
+    store = SqliteLruStore(str(tmp_path / "descriptions.sqlite3"))
+    cache = DescriptionCache(max_entries=1, store=store)
+    key = DescriptionCache.key("<html></html>", "gpt-4", "Describe", 0.0)
+
+    assert key != DescriptionCache.key("<html></html>", "gpt-3.5", "Describe", 0.0)
+    assert cache.get(key) is None
+    cache.put(key, "An empty page")
+    assert cache.get(key) == "An empty page"
+
+    # Pushes the first description out of memory, but not out of the store
+    other_key = DescriptionCache.key("<p></p>", "gpt-4", "Describe", 0.0)
+    cache.put(other_key, "A paragraph")
+    assert cache.get(key) == "An empty page"
+    assert cache.stats == {"hits": 2, "disk_hits": 1, "misses": 1, "entries": 1}
+
+    # A new cache (a new session) only has the store
+    assert DescriptionCache(store=store).get(other_key) == "A paragraph"
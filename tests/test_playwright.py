@@ -34,6 +34,17 @@ def test_playwright_click_incorrect():
     plugin.close()
 
 
+def test_playwright_prewarm():
+    plugin = PlaywrightPlugin(prewarm=True)
+    # The page is opened in the background
+    plugin.ready.result(timeout=30)
+    assert plugin._page is not None
+    plugin.call_tool("navigate_to_url", url="https://opinionet.swarm.svana.name/")
+    plugin.context_message
+    assert "time_to_first_observation" in plugin.observation_timings
+    plugin.close()
+
+
 def test_clean_attributes():
     example_html = """
         <html>
@@ -0,0 +1,57 @@
+from ai_powered_qa.custom_plugins.playwright_plugin.accessibility import (
+    format_accessibility_tree,
+)
+from ai_powered_qa.custom_plugins.playwright_plugin.only_keyboard import (
+    PlaywrightPluginOnlyKeyboard,
+)
+
+SNAPSHOT = {
+    "role": "WebArea",
+    "name": "Sign up",
+    "children": [
+        {"role": "heading", "name": "Sign up", "level": 1},
+        {
+            "role": "generic",
+            "name": "",
+            "children": [
+                {
+                    "role": "textbox",
+                    "name": "Email",
+                    "value": "a@b.cz",
+                    "focused": True,
+                },
+                {"role": "checkbox", "name": "I agree", "checked": False},
+                {"role": "checkbox", "name": "Newsletter", "checked": "mixed"},
+            ],
+        },
+        {"role": "text", "name": "Already registered?"},
+        {"role": "button", "name": "Send", "disabled": True},
+    ],
+}
+
+
+def test_format_accessibility_tree():
+    assert format_accessibility_tree(SNAPSHOT) == (
+        'document "Sign up"\n'
+        ' heading "Sign up" level=1\n'
+        ' textbox "Email" value="a@b.cz" focused\n'
+        ' checkbox "I agree" checked=false\n'
+        ' checkbox "Newsletter" checked=mixed\n'
+        ' "Already registered?"\n'
+        ' button "Send" disabled'
+    )
+    assert format_accessibility_tree(None) == "The page has no accessible content."
+
+
+def test_accessibility_observation_mode():
+    plugin = PlaywrightPluginOnlyKeyboard(observation_mode="accessibility")
+    plugin.navigate_to_url("https://opinionet.swarm.svana.name/")
+    context_message = plugin.context_message
+    timings = plugin.observation_timings
+    plugin.close()
+
+    assert "accessibility tree" in context_message
+    assert 'document "' in context_message
+    # The page isn't described by an LLM
+    assert "description" not in timings
+    assert "accessibility_tree" in timings
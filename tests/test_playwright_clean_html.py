@@ -0,0 +1,136 @@
+import pytest
+
+from ai_powered_qa.custom_plugins.playwright_plugin.clean_html import (
+    clean_with_beautifulsoup,
+)
+from ai_powered_qa.custom_plugins.playwright_plugin.html_cleaner import clean_html
+
+EXAMPLE_HTML = """<!DOCTYPE html>
+<html>
+    <head>
+        <title>Test</title>
+        <meta charset="utf-8">
+        <script>if (a < b) document.write("<p>")</script>
+        <style>.a { color: red }</style>
+    </head>
+    <body>
+        <!-- This is a comment -->
+        <nav class="  top   nav " data-playwright-visible="true">
+            <a href="/?a=1&amp;b=2" style="color: red">Home &amp; away</a>
+            <svg><path d="M0 0"/></svg>
+        </nav>
+        <div id="root">
+            <span title='say "hi"' data-playwright-visible>Hello<br>world</div>
+            <p>Not <b>visible</b> <!-- inline comment --></p>
+            <pre data-playwright-visible>  keep
+   this &lt;whitespace&gt;  <!-- pre comment --></pre>
+            <img src="a.png"><input value='a "quoted" value' disabled>
+            <br/><div/></br></nonexistent>
+            <textarea data-playwright-focused> typed </textarea>
+            <ul><li data-playwright-visible>One<li>Two</ul>
+        </div>
+        <noscript><p data-playwright-visible>Enable JavaScript</p></noscript>
+    </body>
+</html>
+"""
+
+
+@pytest.mark.parametrize("only_visible", [False, True])
+def test_clean_html_same_as_beautifulsoup(only_visible):
+    cleaned = clean_html(EXAMPLE_HTML, only_visible=only_visible)
+    assert cleaned == clean_with_beautifulsoup(EXAMPLE_HTML, only_visible)
+    assert "comment" not in cleaned
+    assert "script" not in cleaned
+    assert 'class="top nav"' in cleaned
+    assert "style" not in cleaned
+
+
+def test_clean_html_lxml():
+    pytest.importorskip("lxml")
+    cleaned = clean_html(EXAMPLE_HTML, only_visible=True, parser="lxml")
+    assert '<nav class="top nav">' in cleaned
+    assert "Enable JavaScript" not in cleaned
+    assert "Not" not in cleaned
+
+
+FORM_HTML = """
+<form id="signup">
+    <h2>Sign up</h2>
+    <input id="email" name="email" type="email" data-playwright-value="a@b.cz">
+    <select name="country"><option>Czechia</option></select>
+    <button type="submit">Send <b>now</b></button>
+    <p>Read the <a href="/terms">terms</a></p>
+</form>
+"""
+
+
+def test_clean_html_minified():
+    cleaned = clean_html(EXAMPLE_HTML, output_format="minified")
+    assert '<nav class="top nav"><a href="/?a=1&amp;b=2">Home &amp; away</a>' in cleaned
+    assert "<p>Not <b>visible</b></p>" in cleaned
+    assert "<pre>  keep\n   this &lt;whitespace&gt;  </pre>" in cleaned
+    assert len(cleaned) < len(clean_html(EXAMPLE_HTML))
+
+
+def test_clean_html_outline():
+    cleaned = clean_html(FORM_HTML, output_format="outline")
+    assert cleaned == (
+        "form#signup\n"
+        ' h2 "Sign up"\n'
+        ' input#email name="email" type="email" value="a@b.cz"\n'
+        ' select name="country"\n'
+        '  option "Czechia"\n'
+        ' button type="submit"\n'
+        '  "Send"\n'
+        '  b "now"\n'
+        " p\n"
+        '  "Read the"\n'
+        '  a href="/terms" "terms"\n'
+    )
+
+
+def test_clean_html_markdown():
+    cleaned = clean_html(FORM_HTML, output_format="markdown")
+    assert cleaned == (
+        "## Sign up\n"
+        "\n"
+        '[input#email type="email" name="email" value="a@b.cz"]'
+        ' [select name="country": Czechia]'
+        ' [button type="submit": Send **now**]\n'
+        "\n"
+        "Read the [terms](/terms)\n"
+    )
+
+
+INLINE_HTML = """
+<div>
+    <p><span>Total:</span> <span>5 USD</span></p>
+    <nav> <a href="/a">Home</a> <a href="/b">About <b>us</b></a> </nav>
+</div>
+"""
+
+
+@pytest.mark.parametrize(
+    "output_format, expected",
+    [
+        ("pretty", ["   Total:\n  </span>\n  <span>\n   5 USD\n"]),
+        (
+            "minified",
+            [
+                "<p><span>Total:</span> <span>5 USD</span></p><nav>",
+                '<a href="/a">Home</a> <a href="/b">About <b>us</b></a></nav>',
+            ],
+        ),
+        ("outline", [' span "Total:"\n span "5 USD"\n']),
+        ("markdown", ["Total: 5 USD\n", "[Home](/a) [About **us**](/b)\n"]),
+    ],
+)
+def test_clean_html_inline_siblings(output_format, expected):
+    cleaned = clean_html(INLINE_HTML, output_format=output_format)
+    for text in expected:
+        assert text in cleaned
+
+
+def test_clean_html_unknown_output_format():
+    with pytest.raises(ValueError):
+        clean_html(EXAMPLE_HTML, output_format="yaml")
@@ -0,0 +1,84 @@
+import json
+
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+
+from ai_powered_qa.components.agent import Agent
+from ai_powered_qa.components.interaction import Interaction
+from ai_powered_qa.custom_plugins.playwright_plugin.base import PlaywrightPlugin
+from ai_powered_qa.custom_plugins.playwright_plugin.html_cleaner import clean_html
+from ai_powered_qa.custom_plugins.playwright_plugin.html_paging import (
+    PlaywrightPluginHtmlPaging,
+)
+
+
+PAGE_HTML = clean_html(
+    "<html><body><ul>"
+    + "".join(f"<li>Item number {i}</li>" for i in range(200))
+    + "</ul></body></html>"
+)
+
+
+def test_memoized_context_message(page, main_frame):
+    agent = Agent(agent_name="test_memoized_context_message")
+    plugin = PlaywrightPlugin(observation_mode="accessibility")
+    agent.add_plugin(plugin)
+    plugin._page = page
+
+    # Regenerating an interaction doesn't observe the page again
+    assert 'document "Snapshot 1"' in agent._generate_context_message()
+    assert 'document "Snapshot 1"' in agent._generate_context_message()
+    assert page.accessibility.snapshots == 1
+
+    # The DOM changed
+    page.changes += 1
+    assert 'document "Snapshot 2"' in agent._generate_context_message()
+
+    # The page navigated
+    plugin._on_frame_navigated(main_frame)
+    assert 'document "Snapshot 3"' in agent._generate_context_message()
+
+    # A tool ran
+    plugin.call_tool("expand_folded_elements", fold=1)
+    assert 'document "Snapshot 4"' in agent._generate_context_message()
+    assert 'document "Snapshot 4"' in agent._generate_context_message()
+
+
+def test_memoized_context_message_disabled(page):
+    plugin = PlaywrightPlugin(observation_mode="accessibility", context_ttl=None)
+    plugin._page = page
+
+    assert 'document "Snapshot 1"' in plugin.memoized_context_message()
+    assert 'document "Snapshot 2"' in plugin.memoized_context_message()
+
+
+class HtmlPagingPlugin(PlaywrightPluginHtmlPaging):
+    def _get_html_description(self, html, **kwargs):
+        return "A list"
+
+
+def test_memoized_context_message_after_agent_tool_call(page):
+    agent = Agent(agent_name="test_memoized_context_message_after_agent_tool_call")
+    plugin = HtmlPagingPlugin(html_part_tokens=300, take_screenshot=False)
+    agent.add_plugin(plugin)
+    page.html = PAGE_HTML
+    plugin._page = page
+
+    assert "HTML part 1 of" in agent._generate_context_message()
+    agent_response = ChatCompletionMessage(
+        role="assistant",
+        content=None,
+        tool_calls=[
+            {
+                "id": "call_1",
+                "type": "function",
+                "function": {
+                    "name": "move_to_html_part",
+                    "arguments": json.dumps({"part": 3}),
+                },
+            }
+        ],
+    )
+    agent.commit_interaction(
+        Interaction(request_params={}, user_prompt=None, agent_response=agent_response)
+    )
+    assert "HTML part 3 of" in agent._generate_context_message()
@@ -0,0 +1,155 @@
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from pydantic import ValidationError
+import pytest
+
+from ai_powered_qa.components.agent import Agent
+from ai_powered_qa.components.constants import MODEL_TOKEN_LIMITS
+from ai_powered_qa.components.interaction import Interaction
+from ai_powered_qa.components.utils import count_tokens
+from ai_powered_qa.custom_plugins.playwright_plugin.base import PlaywrightPlugin
+from ai_powered_qa.custom_plugins.playwright_plugin.dom_diff import diff_html
+from ai_powered_qa.custom_plugins.playwright_plugin.html_cleaner import clean_html
+
+OLD_HTML = clean_html(
+    """
+    <html><body>
+        <p>Loading</p>
+        <form id="signup">
+            <select name="country" data-playwright-value=""><option>CZ</option></select>
+        </form>
+        <div class="modal">Cookies</div>
+    </body></html>
+    """
+)
+NEW_HTML = clean_html(
+    """
+    <html><body>
+        <p>Done</p>
+        <form id="signup">
+            <select name="country" data-playwright-value="CZ"><option>CZ</option></select>
+            <ul><li>Czechia</li></ul>
+        </form>
+    </body></html>
+    """
+)
+
+
+def test_diff_html():
+    assert diff_html(OLD_HTML, NEW_HTML) == [
+        '~ html > body > p: text "Loading" -> "Done"',
+        '~ html > body > form#signup > select[name=country]: data-playwright-value "" -> "CZ"',
+        "+ html > body > form#signup: <ul><li>Czechia</li></ul>",
+        "- html > body > div.modal",
+    ]
+    assert diff_html(NEW_HTML, NEW_HTML) == []
+
+
+def test_diff_context_messages():
+    plugin = PlaywrightPlugin(
+        context_mode="diff", keyframe_interval=3, max_diff_ratio=1.0
+    )
+    agent = Agent(agent_name="test_diff_context_messages", persist_context_message=True)
+    agent.add_plugin(plugin)
+    url = "https://example.com/"
+
+    def commit(context_message):
+        agent_response = ChatCompletionMessage(role="assistant", content="OK")
+        interaction = Interaction(
+            request_params={},
+            user_prompt=None,
+            context_message=context_message,
+            agent_response=agent_response,
+        )
+        agent.commit_interaction(interaction)
+
+    # Nothing committed yet, the whole HTML is sent
+    first = plugin._format_diff_context_message(url, OLD_HTML, "A form")
+    assert "<form" in first
+    assert plugin._format_diff_context_message(url, NEW_HTML, "A form") != first
+    commit(first)
+    assert agent.history[0] == {"role": "user", "content": first}
+
+    # Only the changes since the committed HTML
+    second = plugin._format_diff_context_message(url, NEW_HTML, "A form")
+    assert "<form" not in second
+    assert "<ul><li>Czechia</li></ul>" in second
+    commit(second)
+    third = plugin._format_diff_context_message(url, NEW_HTML, "A form")
+    assert "No changes" in third
+    commit(third)
+
+    # Keyframe every 3 turns and after navigation
+    assert "<form" in plugin._format_diff_context_message(url, NEW_HTML, "A form")
+    assert "<form" in plugin._format_diff_context_message(
+        url + "next", NEW_HTML, "A form"
+    )
+
+
+def test_diff_context_mode_needs_persisted_context():
+    plugin = PlaywrightPlugin(context_mode="diff")
+    agent = Agent(agent_name="test_diff_context_mode_needs_persisted_context")
+    with pytest.raises(ValueError):
+        agent.add_plugin(plugin)
+    assert not agent.plugins
+    with pytest.raises(ValueError):
+        Agent(agent_name="test_diff_context_mode", plugins={plugin.name: plugin})
+
+    agent.persist_context_message = True
+    agent.add_plugin(plugin)
+    with pytest.raises(ValueError):
+        agent.persist_context_message = False
+
+
+def test_diff_context_mode_needs_html():
+    with pytest.raises(ValidationError):
+        PlaywrightPlugin(context_mode="diff", observation_mode="accessibility")
+    for html_format in ["outline", "markdown"]:
+        with pytest.raises(ValidationError):
+            PlaywrightPlugin(context_mode="diff", html_format=html_format)
+    PlaywrightPlugin(context_mode="diff", html_format="minified")
+
+
+def test_diff_without_keyframe_in_history():
+    plugin = PlaywrightPlugin(context_mode="diff", max_diff_ratio=1.0)
+    agent = Agent(
+        agent_name="test_diff_without_keyframe_in_history",
+        persist_context_message=True,
+    )
+    agent.add_plugin(plugin)
+    url = "https://example.com/"
+
+    first = plugin._format_diff_context_message(url, OLD_HTML, "A form")
+    agent.commit_interaction(
+        Interaction(
+            request_params={},
+            user_prompt=None,
+            context_message=first,
+            agent_response=ChatCompletionMessage(role="assistant", content="OK"),
+        )
+    )
+    second = plugin._format_diff_context_message(url, NEW_HTML, "A form")
+    assert "<form" not in second
+
+    # The whole HTML is in the history window
+    assert agent._fit_context_message(second, None, None, 1000) == second
+
+    # Only the system and the context message fit, the diff is replaced
+    model = agent.model
+    budget = count_tokens(agent.system_message, model) + count_tokens(second, model)
+    fitted = agent._fit_context_message(
+        second, None, None, MODEL_TOKEN_LIMITS[model] - budget
+    )
+    assert "<form" in fitted
+    assert "<ul>" in fitted
+
+    # Once committed, the whole HTML is the base of the next diffs
+    agent.commit_interaction(
+        Interaction(
+            request_params={},
+            user_prompt=None,
+            context_message=fitted,
+            agent_response=ChatCompletionMessage(role="assistant", content="OK"),
+        )
+    )
+    assert plugin._keyframe_message == fitted
+    assert plugin._turns_since_keyframe == 0
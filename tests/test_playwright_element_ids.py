@@ -0,0 +1,64 @@
+from ai_powered_qa.custom_plugins.playwright_plugin.base import PlaywrightPlugin
+
+PAGE_HTML = """
+<html><body>
+    <form class="signup-form form--large">
+        <input class="input input--email" name="email" data-playwright-id="1">
+        <button class="btn btn-primary btn-lg" data-playwright-id="2">Send</button>
+    </form>
+</body></html>
+"""
+
+
+def test_element_ids_context():
+    plugin = PlaywrightPlugin(element_ids=True)
+    html = plugin._clean_html(PAGE_HTML, **plugin._clean_options())
+
+    assert '<button data-playwright-id="2">' in html
+    assert "class=" not in html
+    assert "_by_id" in plugin.system_message
+    assert "click_element_by_id" in [tool["function"]["name"] for tool in plugin.tools]
+
+
+def test_element_ids_disabled():
+    plugin = PlaywrightPlugin()
+
+    assert "class=" in plugin._clean_html(PAGE_HTML, **plugin._clean_options())
+    assert not any(tool["function"]["name"].endswith("_by_id") for tool in plugin.tools)
+
+
+def test_unknown_element_id():
+    plugin = PlaywrightPlugin(element_ids=True)
+    plugin._set_element_handles({"1": "input", "2": "button"})
+
+    # Answered from the handle map, without asking the page
+    assert plugin.click_element_by_id(3) == "There is no element with ID 3 on the page."
+    assert plugin.fill_element_by_id(7, "a@b.cz") == (
+        "There is no element with ID 7 on the page."
+    )
+
+
+def test_element_ids_after_navigation(main_frame, child_frame):
+    plugin = PlaywrightPlugin(element_ids=True)
+    plugin._set_element_handles({"1": "input", "2": "button"})
+
+    # An iframe navigating keeps the IDs of the page
+    plugin._on_frame_navigated(child_frame)
+    assert plugin._element_handles == {1: "input", 2: "button"}
+
+    plugin._on_frame_navigated(main_frame)
+    assert plugin._element_handles == {}
+    assert plugin.click_element_by_id(2) == "There is no element with ID 2 on the page."
+
+
+def test_click_element_by_id():
+    plugin = PlaywrightPlugin(element_ids=True)
+    plugin.navigate_to_url("https://bazos.cz/")
+    plugin.context_message
+    element_id = next(
+        element_id for element_id, tag in plugin._element_handles.items() if tag == "a"
+    )
+    response = plugin.click_element_by_id(element_id)
+    plugin.close()
+
+    assert response == "Element clicked successfully."
@@ -0,0 +1,77 @@
+from pydantic import ValidationError
+import pytest
+
+from ai_powered_qa.custom_plugins.playwright_plugin.base import PlaywrightPlugin
+from ai_powered_qa.custom_plugins.playwright_plugin.html_cleaner import clean_html
+from ai_powered_qa.custom_plugins.playwright_plugin.html_folding import fold_html
+
+PRODUCTS = "".join(
+    f'<li class="product"><a href="/p/{i}">Product {i}</a><span>${i}</span></li>'
+    for i in range(20)
+)
+STORIES = "".join(
+    f'<tr class="story"><td>Story {i}</td></tr><tr><td><a href="/u/{i}">by</a></td></tr>'
+    for i in range(10)
+)
+EXAMPLE_HTML = clean_html(
+    f"""<html><body>
+    <ul>{PRODUCTS}</ul>
+    <table>{STORIES}</table>
+    <pre>keep
+  this</pre>
+    <nav><a href="/1">1</a><a href="/2">2</a><a href="/3">3</a></nav>
+    </body></html>"""
+)
+
+
+def test_fold_html():
+    folded, folds = fold_html(EXAMPLE_HTML, keep=3)
+
+    assert "Product 2" in folded
+    assert "/p/3" not in folded
+    assert (
+        '   ... 17 more <li> like the above (fold 1): "Product 3", "Product 4",'
+        ' "Product 5", ...'
+    ) in folded
+    assert folds[1].startswith('<li class="product">\n <a href="/p/3">')
+    assert folds[1].count("<li") == 17
+    # Rows of two repeat together
+    assert "7 more groups of <tr>, <tr> like the above (fold 2)" in folded
+    assert folds[2].count("<tr") == 14
+    # Short runs and everything around the runs are left as they are
+    assert "<pre>keep\n  this</pre>" in folded
+    assert '<a href="/3">' in folded
+    assert folded.endswith("  </nav>\n </body>\n</html>\n")
+
+
+def test_fold_html_without_runs():
+    html = clean_html("<div><p>One</p><p>Two</p><h1>Three</h1></div>")
+
+    assert fold_html(html) == (html, {})
+
+
+def test_expand_folded_elements():
+    plugin = PlaywrightPlugin(fold_repeated=True)
+    folded = plugin._fold(EXAMPLE_HTML)
+
+    assert "(fold 1)" in folded
+    assert "expand_folded_elements" in plugin.system_message
+    assert "expand_folded_elements" in [t["function"]["name"] for t in plugin.tools]
+    assert plugin.expand_folded_elements(1).count("<li") == 17
+    assert plugin.expand_folded_elements(3) == (
+        "There is no fold 3 in the current HTML content."
+    )
+
+    plugin.fold_repeated = False
+    assert plugin._fold(EXAMPLE_HTML) == EXAMPLE_HTML
+
+
+def test_folding_is_opt_in():
+    plugin = PlaywrightPlugin()
+    assert plugin._fold(EXAMPLE_HTML) == EXAMPLE_HTML
+    assert "expand_folded_elements" not in plugin.system_message
+    assert "expand_folded_elements" not in [t["function"]["name"] for t in plugin.tools]
+
+    # Only the pretty-printed HTML can be folded
+    with pytest.raises(ValidationError):
+        PlaywrightPlugin(fold_repeated=True, html_format="minified")
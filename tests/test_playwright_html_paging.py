@@ -1,4 +1,11 @@
+from pydantic import ValidationError
+import pytest
+
+from ai_powered_qa import config
+from ai_powered_qa.components.utils import count_tokens
+from ai_powered_qa.custom_plugins.playwright_plugin.html_cleaner import clean_html
 from ai_powered_qa.custom_plugins.playwright_plugin.html_paging import (
+    HtmlPageIndex,
     PlaywrightPluginHtmlPaging,
 )
 
@@ -24,3 +31,58 @@ def test_move_to_html_part():
     # The HTML content is too long to display in one go
     assert "HTML part 2 of" in context_message
     assert context_message_before != context_message
+
+
+def _page_html():
+    items = "".join(f'<li id="item-{i}">Item number {i}</li>' for i in range(200))
+    return clean_html(
+        f'<html><body><main><ul class="items">{items}</ul></main></body></html>'
+    )
+
+
+def test_html_page_index():
+    html = _page_html()
+    index = HtmlPageIndex(html, max_tokens=300)
+
+    assert len(index) > 1
+    for number in range(1, len(index) + 1):
+        part = index.part(number)
+        # Every part keeps the elements it's nested in
+        assert part.startswith('<html>\n <body>\n  <main>\n   <ul class="items">')
+        assert part.endswith("   </ul>\n  </main>\n </body>\n</html>")
+        assert count_tokens(part, config.MODEL_DEFAULT) < 400
+    # Parts are split between elements
+    assert all(
+        index.part(n).count("<li") == index.part(n).count("</li>") for n in (1, 2)
+    )
+
+    last = index.find("#item-199")
+    assert last == len(index)
+    assert "Item number 199" in index.part(last)
+    assert index.find("#missing") is None
+
+
+def test_html_paging_reuses_index():
+    plugin = PlaywrightPluginHtmlPaging(html_part_tokens=300)
+    html = _page_html()
+    index = plugin._get_index(html)
+
+    assert plugin._get_index(html) is index
+    assert plugin._get_index(html.replace("Item", "Entry")) is not index
+
+
+def test_html_paging_needs_pretty_html():
+    with pytest.raises(ValidationError):
+        PlaywrightPluginHtmlPaging(html_format="minified")
+
+    # Minified HTML is a single line, it can't be split between lines
+    minified = clean_html(_page_html(), output_format="minified")
+    assert len(HtmlPageIndex(minified, max_tokens=300)) == 1
+    assert len(HtmlPageIndex(_page_html(), max_tokens=300)) > 1
+
+
+def test_html_part_length():
+    with pytest.warns(DeprecationWarning):
+        plugin = PlaywrightPluginHtmlPaging(html_part_length=15000)
+    assert plugin.html_part_tokens == 3750
+    assert "html_part_length" not in plugin.model_dump()
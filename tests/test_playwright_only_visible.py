@@ -25,3 +25,28 @@ def test_scroll():
 
     # The link should be visible after scrolling
     assert '<a href="newsguidelines.html">' in context_message
+
+
+def test_in_browser_extraction():
+    plugin = PlaywrightPluginOnlyVisible(in_browser_extraction=True)
+    plugin.navigate_to_url("https://news.ycombinator.com/")
+    context_message = plugin.context_message
+    plugin.close()
+
+    assert '<a href="news">' in context_message
+    assert '<a href="newsguidelines.html">' not in context_message
+
+
+def test_observation_timings():
+    plugin = PlaywrightPluginOnlyVisible()
+    plugin.navigate_to_url("https://news.ycombinator.com/")
+    plugin.context_message
+    timings = plugin.observation_timings
+    plugin.close()
+
+    assert plugin._buffer is not None
+    assert timings.keys() >= {"page_content", "screenshot", "description", "total"}
+    # The screenshot is taken while the content is extracted and described
+    assert timings["total"] < sum(
+        timings[step] for step in ("page_content", "screenshot", "description")
+    )
@@ -0,0 +1,104 @@
+import asyncio
+from graphlib import CycleError
+import time
+
+import pytest
+
+from ai_powered_qa.custom_plugins.playwright_plugin.base import PlaywrightPlugin
+from ai_powered_qa.custom_plugins.playwright_plugin.pipeline import (
+    Stage,
+    run_pipeline,
+)
+
+PAGE_HTML = "<html><body><h1>Sign up</h1><button>Send</button></body></html>"
+
+
+def test_run_pipeline():
+    async def wait(value):
+        await asyncio.sleep(0.1)
+        return value
+
+    async def join(first, second):
+        return f"{first} {second}"
+
+    stages = {
+        "joined": Stage(join, ("first", "second")),
+        "first": Stage(lambda: wait("a")),
+        "second": Stage(lambda: wait("b")),
+    }
+    timings = {}
+    start = time.perf_counter()
+    results = asyncio.run(run_pipeline(stages, timings))
+
+    assert results == {"first": "a", "second": "b", "joined": "a b"}
+    # The independent stages ran concurrently
+    assert time.perf_counter() - start < 0.18
+    assert timings.keys() == stages.keys()
+    assert timings["first"] >= 0.1
+    # The wait for the dependencies isn't counted
+    assert timings["joined"] < 0.05
+
+
+async def collect(**results):
+    return results
+
+
+def test_run_pipeline_failure():
+    cancelled = []
+
+    async def fail():
+        raise RuntimeError("Failed")
+
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    stages = {"fail": Stage(fail), "slow": Stage(slow)}
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_pipeline(stages, {}))
+    assert cancelled
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_pipeline({"a": Stage(slow, ("b",))}, {}))
+    with pytest.raises(CycleError):
+        asyncio.run(run_pipeline({"a": Stage(collect, ("a",))}, {}))
+
+
+class SlowDescriptionPlugin(PlaywrightPlugin):
+    def _get_html_description(self, html, **kwargs):
+        time.sleep(0.1)
+        return "A sign up form"
+
+
+def test_observation_pipeline(page):
+    plugin = SlowDescriptionPlugin()
+    page.html = PAGE_HTML
+    page.screenshot_delay = 0.1
+    plugin._page = page
+
+    context_message = plugin.context_message
+    timings = plugin.observation_timings
+    assert "<h1>" in context_message
+    assert "A sign up form" in context_message
+    assert timings.keys() >= {"page_content", "clean_html", "description"}
+    # The screenshot is taken while the HTML is cleaned and described
+    assert page.screenshots == 1
+    assert timings["total"] < timings["screenshot"] + timings["description"]
+
+
+def test_observation_pipeline_skipped_stages(page):
+    plugin = SlowDescriptionPlugin(take_screenshot=False, describers=())
+    page.html = PAGE_HTML
+    page.screenshot_delay = 0.1
+    plugin._page = page
+
+    context_message = plugin.context_message
+    timings = plugin.observation_timings
+    assert "<h1>" in context_message
+    assert "A sign up form" not in context_message
+    assert page.screenshots == 0
+    assert "screenshot" not in timings
+    assert "description" not in timings
@@ -0,0 +1,118 @@
+import time
+
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from openai.types.chat.chat_completion_message_tool_call import (
+    ChatCompletionMessageToolCall,
+    Function,
+)
+
+from ai_powered_qa.components.agent import Agent
+from ai_powered_qa.components.interaction import Interaction
+from ai_powered_qa.custom_plugins.playwright_plugin.base import PlaywrightPlugin
+
+
+def commit(plugin):
+    interaction = Interaction(
+        request_params={},
+        user_prompt=None,
+        agent_response=ChatCompletionMessage(role="assistant", content="OK"),
+    )
+    plugin.on_commit(interaction)
+
+
+def test_prefetch_context(page):
+    plugin = PlaywrightPlugin(observation_mode="accessibility", prefetch_context=True)
+    plugin._page = page
+
+    # The next context message is prepared as soon as the interaction is
+    # committed
+    commit(plugin)
+    plugin._prefetched[2].result(timeout=5)
+    assert page.accessibility.snapshots == 1
+    assert 'document "Snapshot 1"' in plugin.context_message
+    assert "prefetch_wait" in plugin.observation_timings
+    # It's used only once
+    assert 'document "Snapshot 2"' in plugin.context_message
+
+
+def test_prefetch_context_after_dom_change(page):
+    plugin = PlaywrightPlugin(observation_mode="accessibility", prefetch_context=True)
+    plugin._page = page
+
+    commit(plugin)
+    plugin._prefetched[2].result(timeout=5)
+    # The page changed without navigating
+    page.changes += 1
+    assert 'document "Snapshot 2"' in plugin.memoized_context_message()
+    assert plugin._context_memo[1] == ("https://example.com/", 0, 1)
+
+
+def test_prefetch_context_memoized(page):
+    plugin = PlaywrightPlugin(observation_mode="accessibility", prefetch_context=True)
+    plugin._page = page
+
+    commit(plugin)
+    started, state, _ = plugin._prefetched[2].result(timeout=5)
+    assert 'document "Snapshot 1"' in plugin.memoized_context_message()
+    # Memoized with the state and the time the prefetch captured
+    assert plugin._context_memo[:2] == (started, state)
+    assert 'document "Snapshot 1"' in plugin.memoized_context_message()
+
+
+def test_prefetch_context_after_tool_call(page):
+    plugin = PlaywrightPlugin(observation_mode="accessibility", prefetch_context=True)
+    plugin._page = page
+
+    commit(plugin)
+    plugin._prefetched[2].result(timeout=5)
+    # The page may have changed
+    plugin.call_tool("expand_folded_elements", fold=1)
+    assert 'document "Snapshot 2"' in plugin.context_message
+
+
+def test_prefetch_context_after_agent_tool_call(page):
+    agent = Agent(agent_name="test_prefetch_context_after_agent_tool_call")
+    plugin = PlaywrightPlugin(observation_mode="accessibility", prefetch_context=True)
+    agent.add_plugin(plugin)
+    plugin._page = page
+
+    commit(plugin)
+    plugin._prefetched[2].result(timeout=5)
+    # The agent clicks, the page keeps its URL
+    tool_call = ChatCompletionMessageToolCall(
+        id="call_1",
+        type="function",
+        function=Function(name="click_element", arguments='{"selector": "#send"}'),
+    )
+    agent._call_tool(tool_call)
+    assert page.clicks == ["#send"]
+    assert 'document "Snapshot 2"' in agent._generate_context_message()
+
+
+def test_discarded_prefetch(page):
+    plugin = PlaywrightPlugin(
+        prefetch_context=True, element_ids=True, take_screenshot=False, describers=()
+    )
+    page.html = '<button data-playwright-id="1">Send</button>'
+    page.ids = {"1": "button"}
+    page.observe_delay = 0.2
+    plugin._page = page
+
+    commit(plugin)
+    future = plugin._prefetched[2]
+    time.sleep(0.05)
+    # The page navigates while the prefetch is observing it
+    page.url = "https://example.com/next"
+    page.html = '<button data-playwright-id="2">Send</button>'
+    page.ids = {"2": "button"}
+    assert 'data-playwright-id="2"' in plugin.context_message
+    assert future.cancelled()
+    time.sleep(0.3)
+    # The discarded observation doesn't replace the IDs of the new one
+    assert plugin._element_handles == {2: "button"}
+
+    commit(plugin)
+    future = plugin._prefetched[2]
+    plugin.close()
+    assert future.cancelled()
+    assert plugin._prefetched is None
@@ -0,0 +1,77 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from ai_powered_qa.custom_plugins.playwright_plugin.runtime import PlaywrightRuntime
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+async def slow_echo(value):
+    await asyncio.sleep(0.2)
+    return value, request_id.get(), threading.current_thread().name
+
+
+def test_runtime_runs_sessions_concurrently():
+    runtime = PlaywrightRuntime()
+
+    def session(value):
+        request_id.set(value)
+        return runtime.run(slow_echo(value))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(session, range(4)))
+    elapsed = time.perf_counter() - start
+    runtime.stop()
+
+    assert results == [(i, i, "playwright-runtime") for i in range(4)]
+    # The sessions share one loop without waiting for each other
+    assert elapsed < 0.6
+
+
+def test_runtime_async_api():
+    runtime = PlaywrightRuntime()
+
+    async def main():
+        results = await asyncio.gather(runtime.arun(slow_echo(1)), asyncio.sleep(0))
+        with pytest.raises(ValueError):
+            await runtime.arun(asyncio.to_thread(int, "not a number"))
+        return results[0]
+
+    assert asyncio.run(main()) == (1, None, "playwright-runtime")
+
+    # Blocking on the runtime loop from the loop itself would deadlock
+    async def nested():
+        return runtime.run(slow_echo(2))
+
+    with pytest.raises(RuntimeError):
+        runtime.run(nested())
+    runtime.stop()
+
+
+def test_runtime_cancel():
+    runtime = PlaywrightRuntime()
+    events = []
+
+    async def record(value, delay):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            events.append(f"{value} cancelled")
+            raise
+        events.append(value)
+
+    future = runtime.submit(record("first", 0.2))
+    time.sleep(0.05)
+    assert future.cancel()
+    # The cancellation reaches the coroutine before the next one starts
+    runtime.run(record("second", 0))
+    runtime.stop()
+
+    assert future.cancelled()
+    assert events == ["first cancelled", "second"]
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from ai_powered_qa.custom_plugins.playwright_plugin.settle import (
+    PageSettler,
+    SettleOptions,
+)
+
+
+class FakeRequest:
+    resource_type = "fetch"
+
+
+class FakePage:
+    def __init__(self):
+        self.handlers = {}
+        self.quiet_after = 0.0
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    async def evaluate(self, expression, arg):
+        # The DOM is quiet once quiet_after has passed, or at the deadline
+        wait = min(max(self.quiet_after - time.monotonic(), 0), arg["timeoutMs"] / 1000)
+        await asyncio.sleep(wait + arg["quietMs"] / 1000)
+        return {"quiet": time.monotonic() >= self.quiet_after, "mutations": 0}
+
+
+def test_page_settler():
+    async def main():
+        page = FakePage()
+        settler = PageSettler(page)
+        options = SettleOptions(
+            network_idle_ms=100, quiet_window_ms=50, timeout_ms=1000
+        )
+
+        # A request finishing after 200ms, then 100ms of network idle
+        request = FakeRequest()
+        page.handlers["request"](request)
+        asyncio.get_running_loop().call_later(
+            0.2, page.handlers["requestfinished"], request
+        )
+        timings = await settler.wait(options)
+        assert 0.3 <= timings["settle_network"] < 0.5
+        assert timings["settle"] < 0.6
+
+        # The DOM never gets quiet, the wait gives up at the deadline
+        page.quiet_after = time.monotonic() + 10
+        timings = await settler.wait(options)
+        assert 1.0 <= timings["settle"] < 1.2
+
+    asyncio.run(main())
@@ -1,4 +1,7 @@
-from ai_powered_qa.components.plugin import RandomNumberPlugin
+import asyncio
+import time
+
+from ai_powered_qa.components.plugin import Plugin, RandomNumberPlugin, tool
 
 
 def test_automatic_tool_description():
@@ -65,3 +68,52 @@ def test_custom_tool_description():
     )
     assert properties["mean"]["type"] == "number"
     assert properties["standard_deviation"]["type"] == "number"
+
+
+class CountingPlugin(Plugin):
+    name: str = "CountingPlugin"
+    context_ttl: float | None = 60
+    state: int = 0
+    computed: int = 0
+
+    @property
+    def context_message(self) -> str:
+        self.computed += 1
+        return f"Context {self.computed}"
+
+    def context_state(self):
+        return self.state
+
+    @tool
+    def do_something(self):
+        """
+        Does something
+        """
+        return "Done"
+
+
+def test_memoized_context_message():
+    plugin = CountingPlugin()
+    assert plugin.memoized_context_message() == "Context 1"
+    assert plugin.memoized_context_message() == "Context 1"
+    assert asyncio.run(plugin.amemoized_context_message()) == "Context 1"
+
+    # A tool of the plugin ran
+    plugin.call_tool("do_something")
+    assert plugin.memoized_context_message() == "Context 2"
+    asyncio.run(plugin.acall_tool("do_something"))
+    assert asyncio.run(plugin.amemoized_context_message()) == "Context 3"
+
+    # Something else changed
+    plugin.state = 1
+    assert plugin.memoized_context_message() == "Context 4"
+
+    # It's too old
+    plugin.context_ttl = 0.01
+    time.sleep(0.02)
+    assert plugin.memoized_context_message() == "Context 5"
+
+    # Memoization is off
+    plugin.context_ttl = None
+    assert plugin.memoized_context_message() == "Context 6"
+    assert plugin.memoized_context_message() == "Context 7"
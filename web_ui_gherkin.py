@@ -99,6 +99,8 @@ def load_agent():
     st.session_state["agent_instance"] = _agent
     st.session_state[AGENT_MODEL_KEY] = _agent.model
     st.session_state[SYSTEM_MESSAGE_KEY] = _agent.system_message
+    # Start the browser while the user is typing the first message
+    _agent.warm_up()
 
 
 agent_name = sidebar.text_input(